@@ -14,6 +14,10 @@ elif [[ "${1}" == "app" ]]; then
   python manage.py collectstatic --noinput
   python manage.py makemigrations
   python manage.py migrate
+  python manage.py rebuild_product_listing
+  python manage.py rebuild_search_index
+  python manage.py sweep_discounts
+  python manage.py rebuild_effective_prices
 
   echo "Creating superuser..."
   python manage.py shell << EOF
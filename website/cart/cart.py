@@ -1,20 +1,25 @@
-from decimal import Decimal
+from dataclasses import replace
 
 from catalog.models import Price
-from catalog.models import Product
-from catalog.models import Seller
-from django.contrib.sessions.models import Session
+from django.db.models import Q
 from django.http import HttpRequest
+from django.utils.translation import gettext_lazy as _
 from rest_framework.request import Request
 
-from website import settings
+from .hydration import hydrate_lines
+from .lines import CartLine
+from .lines import from_minor
+from .lines import to_minor
+from .storage import get_cart_storage
 
 
 class Cart:
     """
-    Модель корзины, которая хранит в себе информацию о товарах в сессии.
-    Для работы с корзиной необходимо создавать объект корзины для получения информации
-    из сессии пользователя.
+    Модель корзины. Строки корзины хранятся в хранилище из настройки CART_STORAGE_BACKEND
+    (cart.storage): в Redis или в сессии пользователя. Для работы с корзиной необходимо
+    создавать объект корзины для получения информации по запросу пользователя.
+    Цены строк хранятся в копейках (cart.lines), итоги корзины обновляются при каждом
+    изменении строки, а не пересчитываются по всей корзине.
     """
 
     def __init__(self, request: Request | HttpRequest):
@@ -22,25 +27,55 @@ class Cart:
         Создание корзины
 
         Атрибуты:
-            request (Request): запрос в котором хранится сессия с корзиной.
+            request (Request): запрос, по которому определяется корзина пользователя.
         """
-        self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            cart = self.session[settings.CART_SESSION_ID] = {
-                "total_quantity": 0,
-                "total_cost": "0",
-            }
-        self.cart: dict = cart
+        self.storage = get_cart_storage(request)
+        self.reload()
 
-    def save(self) -> None:
+    def reload(self) -> None:
         """
-        Обновляет кол-во, стоимость товаров в корзине и сохраняет корзину в сессии
+        Загружает строки корзины из хранилища и пересчитывает итоги
         """
-        self.__update_total_values_cart()
-        self.session[settings.CART_SESSION_ID] = self.cart
-        # Отметить, что сессия изменена
-        self.session.modified = True
+        self.lines: dict[int, CartLine] = {}
+        self.__total_quantity = 0
+        self.__total_cost = 0
+        for line in self.storage.get_lines().values():
+            self.__put(CartLine.from_storage(line))
+
+    def __put(self, line: CartLine) -> None:
+        """
+        Добавляет или заменяет строку корзины, итоги меняются на разницу со старой строкой
+        """
+        old = self.lines.get(line.product_id)
+        if old is not None:
+            self.__total_quantity -= old.quantity
+            self.__total_cost -= old.cost
+        self.lines[line.product_id] = line
+        self.__total_quantity += line.quantity
+        self.__total_cost += line.cost
+
+    def __drop(self, product_id: int) -> None:
+        """
+        Удаляет строку корзины и вычитает её из итогов
+        """
+        line = self.lines.pop(product_id, None)
+        if line is not None:
+            self.__total_quantity -= line.quantity
+            self.__total_cost -= line.cost
+
+    @staticmethod
+    def __make_line(price: Price, quantity: int = 0, to_order: bool = True) -> CartLine:
+        """
+        Строка корзины для цены продавца
+        """
+        return CartLine(
+            product_id=price.product_id,
+            seller_id=price.seller_id,
+            seller_name=str(price.seller),
+            price=to_minor(price.price),
+            quantity=quantity,
+            to_order=to_order,
+        )
 
     def add(
         self,
@@ -49,48 +84,31 @@ class Cart:
         quantity: int = 1,
     ) -> None:
         """
-        Добавление товара в сессию.
+        Добавление товара в корзину.
 
         Атрибуты:
             product_id (str) - id модели товара
             price_product_id (str) - id модели цены товара который добавляется
             quantity (int = 1) - кол-во добавляемого товара
         """
-        price_product = Price.objects.get(pk=int(price_product_id))
-        product_key = f"product{product_id}"
-        if product_key not in self.cart:
-            self.cart[product_key] = {
-                "quantity": 0,
-                "product_id": int(product_id),
-                "price": float(price_product.price),
-                "seller_id": price_product.seller.pk,
-                "seller_name": str(price_product.seller),
-                "to_order": True,
-                "cost_product": "0.00",
-            }
-        self.cart[product_key]["quantity"] += quantity
-        self.cart[product_key]["cost_product"] = self.__get_cost_product(product_id, self.cart[product_key]["quantity"])
-        self.save()
+        price_product = Price.objects.select_related("seller").get(pk=int(price_product_id))
+        line = self.lines.get(int(product_id)) or self.__make_line(price_product)
+        new_quantity = self.storage.add_line(int(product_id), line.to_storage(), int(quantity))
+        self.__put(replace(line, quantity=new_quantity))
 
     @property
-    def products(self) -> dict:
+    def cart(self) -> dict:
         """
-        Возвращает словарь только с товарами
+        Корзина в формате API: строки товаров по ключам "product<id>" и итоги
         """
-        return {
-            product_key: product_info
-            for product_key, product_info in self.cart.items()
-            if isinstance(product_info, dict)
-        }
+        return {**self.products, "total_quantity": self.total_quantity, "total_cost": self.total_cost}
 
-    def __get_cost_product(self, product_id: str, quantity: int) -> float:
+    @property
+    def products(self) -> dict:
         """
-        Возвращает общую стоимость товара
+        Возвращает словарь только с товарами
         """
-        if quantity != 0:
-            cost = float(round(Decimal(self.cart[f"product{product_id}"]["price"]) * quantity, 2))
-            return cost
-        return 0.00
+        return {f"product{product_id}": line.as_dict() for product_id, line in self.lines.items()}
 
     def update_product(self, product_id: str, new_seller_id: int, new_quantity: int) -> None:
         """
@@ -101,14 +119,12 @@ class Cart:
             new_seller_id (int) - id продавца товара
             new_quantity (int) - новое кол-во товара в корзине
         """
-        if f"product{product_id}" in self.cart:
-            self.cart[f"product{product_id}"]["quantity"] = new_quantity
-            self.cart[f"product{product_id}"]["seller_id"] = new_seller_id
-            self.cart[f"product{product_id}"]["seller_name"] = str(Seller.objects.get(pk=new_seller_id))
-            new_price_product = float(Price.objects.get(seller=new_seller_id, product=product_id).price)
-            self.cart[f"product{product_id}"]["price"] = new_price_product
-            self.cart[f"product{product_id}"]["cost_product"] = self.__get_cost_product(product_id, new_quantity)
-            self.save()
+        line = self.lines.get(int(product_id))
+        if line is not None:
+            new_price_product = Price.objects.select_related("seller").get(seller=new_seller_id, product=product_id)
+            line = self.__make_line(new_price_product, int(new_quantity), line.to_order)
+            self.storage.set_line(line.product_id, line.to_storage())
+            self.__put(line)
 
     def remove(self, product_id: str) -> None:
         """
@@ -117,49 +133,87 @@ class Cart:
         Атрибуты:
             product_id (str) - id модели товара, который нужно удалить
         """
-        if f"product{product_id}" in self.cart:
-            del self.cart[f"product{product_id}"]
-            self.save()
+        if int(product_id) in self.lines:
+            self.storage.remove_line(int(product_id))
+            self.__drop(int(product_id))
 
-    @property
-    def total_quantity(self) -> int:
-        """
-        Возвращает общее кол-во товаров в корзине
+    def apply(self, operations: list[dict]) -> dict[int, list[str]]:
         """
-        return self.cart["total_quantity"]
+        Применяет список операций с корзиной за один раз. Цены всех товаров загружаются
+        одним запросом, корзина сохраняется один раз. Если хотя бы одна операция
+        некорректна, корзина не изменяется.
 
-    @property
-    def total_cost(self) -> str:
-        """
-        Возвращает общую стоимость товаров в корзине
-        """
-        return self.cart["total_cost"]
+        Атрибуты:
+            operations (list[dict]) - операции:
+                {"op": "add", "product_id", "price_id", "quantity"}
+                {"op": "update", "product_id", "seller_id", "quantity"}
+                {"op": "remove", "product_id"}
 
-    def __update_total_values_cart(self):
+        Возвращает:
+            dict[int, list[str]] - ошибки по номерам операций (пустой, если операции применены)
         """
-        Обновляет общую информацию о корзине (кол-во и стоимость товаров)
-        """
-        self.cart["total_quantity"] = self.__get_total_quantity()
-        self.cart["total_cost"] = self.__get_total_cost()
+        price_ids = {operation["price_id"] for operation in operations if operation["op"] == "add"}
+        pairs = {
+            (operation["product_id"], operation["seller_id"]) for operation in operations if operation["op"] == "update"
+        }
+        condition = Q(pk__in=price_ids)
+        if pairs:
+            condition |= Q(product_id__in={pair[0] for pair in pairs}, seller_id__in={pair[1] for pair in pairs})
+        prices = list(Price.objects.select_related("seller").filter(condition)) if price_ids or pairs else []
+        by_pk = {price.pk: price for price in prices}
+        by_pair = {(price.product_id, price.seller_id): price for price in prices}
+
+        errors = {}
+        storage_operations = []
+        in_cart = set(self.lines)
+        for index, operation in enumerate(operations):
+            product_id = operation["product_id"]
+            if operation["op"] == "add":
+                price = by_pk.get(operation["price_id"])
+                if price is None or price.product_id != product_id:
+                    errors[index] = [_("Price not found")]
+                    continue
+                line = self.lines.get(product_id) or self.__make_line(price)
+                storage_operations.append(("add", product_id, line.to_storage(), operation["quantity"]))
+                in_cart.add(product_id)
+            elif operation["op"] == "update":
+                price = by_pair.get((product_id, operation["seller_id"]))
+                if price is None:
+                    errors[index] = [_("Price not found")]
+                    continue
+                if product_id not in in_cart:
+                    continue
+                to_order = self.lines[product_id].to_order if product_id in self.lines else True
+                line = self.__make_line(price, operation["quantity"], to_order)
+                storage_operations.append(("set", product_id, line.to_storage()))
+            else:
+                storage_operations.append(("remove", product_id))
+                in_cart.discard(product_id)
+
+        if errors:
+            return errors
+        self.storage.apply(storage_operations)
+        self.reload()
+        return {}
 
-    def __get_total_quantity(self) -> int:
+    @property
+    def total_quantity(self) -> int:
         """
         Возвращает общее кол-во товаров в корзине
         """
-        return sum(item["quantity"] for item in self.cart.values() if isinstance(item, dict))
+        return self.__total_quantity
 
-    def __get_total_cost(self) -> str:
+    @property
+    def total_cost(self) -> str:
         """
         Возвращает общую стоимость товаров в корзине
         """
-        total_cost = round(
-            sum(Decimal(item["price"]) * item["quantity"] for item in self.cart.values() if isinstance(item, dict)), 2
-        )
-        return str(total_cost)
+        return str(from_minor(self.__total_cost))
 
     def get_context_info(self) -> list[dict]:
         """
-        Возвращает информацию для отображения страницы корзины
+        Возвращает информацию для отображения страницы корзины. Данные всех строк
+        загружаются пакетно (cart.hydration), число запросов не зависит от размера корзины.
         Структура возвращаемых данных:
             [
                 {'product_id': {'price': цена товара (str),
@@ -171,26 +225,13 @@ class Cart:
                 }
             ]
         """
-        info_cart = list()
-        for product in self.cart.values():
-            if isinstance(product, dict):
-                info_product = {
-                    "price": product["price"],
-                    "product": Product.objects.get(pk=product["product_id"]),
-                    "quantity": product["quantity"],
-                    "seller": Seller.objects.get(pk=product["seller_id"]),
-                    "sellers_product": Seller.objects.prefetch_related("products").filter(
-                        products=product["product_id"]
-                    ),
-                    "total_cost": product["cost_product"],
-                    "to_order": product["to_order"],
-                }
-                info_cart.append(info_product)
-        return info_cart
+        return hydrate_lines(line.as_dict() for line in self.lines.values())
 
     def clear(self) -> None:
         """
         Полностью очищает корзину
         """
-        del self.session[settings.CART_SESSION_ID]
-        self.session.modified = True
+        self.storage.clear()
+        self.lines = {}
+        self.__total_quantity = 0
+        self.__total_cost = 0
@@ -0,0 +1,47 @@
+"""
+Загрузка данных для страницы корзины.
+
+Товары всех строк корзины загружаются одним запросом (теги — ещё одним),
+продавцы и их предложения берутся из таблиц предложений товаров (catalog.offer_table),
+которые читаются из кэша пакетно, поэтому число запросов не зависит от размера корзины.
+"""
+
+from typing import Iterable
+
+from catalog.models import Product
+from catalog.models import Seller
+from catalog.offer_table import get_offer_tables
+
+
+def hydrate_lines(lines: Iterable[dict]) -> list[dict]:
+    """
+    Возвращает данные строк корзины для шаблона:
+        [{"price", "product", "quantity", "seller", "sellers_product", "total_cost", "to_order"}, ...]
+    Продавцы — несохранённые объекты Seller только с id и названием.
+    """
+
+    lines = list(lines)
+    product_ids = [line["product_id"] for line in lines]
+    products = (
+        Product.objects.only("id", "name", "preview", "short_description").prefetch_related("tags").in_bulk(product_ids)
+    )
+    offer_tables = get_offer_tables(product_ids)
+
+    info_cart = []
+    for line in lines:
+        product = products.get(line["product_id"])
+        if product is None:
+            continue
+        offers = offer_tables[product.pk].offers
+        info_cart.append(
+            {
+                "price": line["price"],
+                "product": product,
+                "quantity": line["quantity"],
+                "seller": Seller(pk=line["seller_id"], name=line["seller_name"]),
+                "sellers_product": [Seller(pk=offer.seller_id, name=offer.seller_name) for offer in offers],
+                "total_cost": line["cost_product"],
+                "to_order": line["to_order"],
+            }
+        )
+    return info_cart
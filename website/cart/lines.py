@@ -0,0 +1,77 @@
+"""
+Строки корзины.
+
+Цена хранится целым числом минимальных единиц валюты (копеек), поэтому стоимость строки
+и итоги корзины считаются точно в целых числах; в Decimal они переводятся только при выводе.
+"""
+
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP
+from decimal import Decimal
+
+MINOR_UNITS = 100
+CENT = Decimal("0.01")
+
+
+def to_minor(value: Decimal | float | str) -> int:
+    """Переводит сумму в минимальные единицы валюты"""
+    return int((Decimal(str(value)) * MINOR_UNITS).to_integral_value(ROUND_HALF_UP))
+
+
+def from_minor(value: int) -> Decimal:
+    """Переводит минимальные единицы валюты в сумму с двумя знаками после запятой"""
+    return (Decimal(value) / MINOR_UNITS).quantize(CENT)
+
+
+@dataclass(slots=True)
+class CartLine:
+    """Строка корзины: товар, продавец, цена в минимальных единицах и количество"""
+
+    product_id: int
+    seller_id: int
+    seller_name: str
+    price: int
+    quantity: int
+    to_order: bool = True
+
+    @property
+    def cost(self) -> int:
+        return self.price * self.quantity
+
+    @classmethod
+    def from_storage(cls, line: dict) -> "CartLine":
+        """
+        Строка из хранилища корзины. Строки, сохранённые до перехода на минимальные единицы,
+        содержат цену в поле price.
+        """
+        price = line["price_minor"] if "price_minor" in line else to_minor(line["price"])
+        return cls(
+            product_id=int(line["product_id"]),
+            seller_id=int(line["seller_id"]),
+            seller_name=line["seller_name"],
+            price=int(price),
+            quantity=int(line["quantity"]),
+            to_order=line["to_order"],
+        )
+
+    def to_storage(self) -> dict:
+        return {
+            "product_id": self.product_id,
+            "price_minor": self.price,
+            "seller_id": self.seller_id,
+            "seller_name": self.seller_name,
+            "to_order": self.to_order,
+            "quantity": self.quantity,
+        }
+
+    def as_dict(self) -> dict:
+        """Строка в формате API корзины"""
+        return {
+            "quantity": self.quantity,
+            "product_id": self.product_id,
+            "price": str(from_minor(self.price)),
+            "seller_id": self.seller_id,
+            "seller_name": self.seller_name,
+            "to_order": self.to_order,
+            "cost_product": str(from_minor(self.cost)),
+        }
@@ -0,0 +1,24 @@
+from rest_framework import serializers
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """
+    Операция с корзиной в пакетном запросе
+    """
+
+    op = serializers.ChoiceField(choices=["add", "update", "remove"])
+    product_id = serializers.IntegerField()
+    price_id = serializers.IntegerField(required=False)
+    seller_id = serializers.IntegerField(required=False)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+    def validate(self, attrs: dict) -> dict:
+        if attrs["op"] == "add" and "price_id" not in attrs:
+            raise serializers.ValidationError({"price_id": serializers.Field.default_error_messages["required"]})
+        if attrs["op"] == "update" and "seller_id" not in attrs:
+            raise serializers.ValidationError({"seller_id": serializers.Field.default_error_messages["required"]})
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False)
@@ -0,0 +1,13 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .storage import get_cart_storage
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart(sender, request, user, **kwargs):
+    """
+    Переносит корзину анонимного пользователя в корзину вошедшего пользователя
+    """
+    if request is not None and hasattr(request, "session"):
+        get_cart_storage(request).merge_anonymous()
@@ -0,0 +1,283 @@
+"""
+Хранилища строк корзины.
+
+Строка корзины — словарь с ключами quantity, product_id, price_minor (цена в копейках), seller_id,
+seller_name и to_order, ключ строки — id товара. SessionCartStorage хранит корзину в сессии (как раньше),
+RedisCartStorage — в хэше Redis, отдельно от сессии: каждое изменение затрагивает только
+поля своей строки, а количество меняется атомарно (HINCRBY).
+"""
+
+import json
+import uuid
+from functools import lru_cache
+
+from core.redis_client import get_redis
+from django.http import HttpRequest
+from django.utils.module_loading import import_string
+from rest_framework.request import Request
+
+from website import settings
+
+from .lines import CartLine
+
+LINE_FIELDS = ("product_id", "price_minor", "seller_id", "seller_name", "to_order")
+
+
+def normalize_line(line: dict) -> dict:
+    """Приводит строку, сохранённую в прежнем формате (цена в поле price), к текущему"""
+    return line if "price_minor" in line else CartLine.from_storage(line).to_storage()
+
+
+class BaseCartStorage:
+    """Базовый класс хранилища корзины пользователя (сессии) из запроса"""
+
+    def __init__(self, request: Request | HttpRequest):
+        self.request = request
+
+    def get_lines(self) -> dict[int, dict]:
+        """Возвращает строки корзины {id товара: строка}"""
+        raise NotImplementedError
+
+    def add_line(self, product_id: int, line: dict, quantity: int) -> int:
+        """
+        Увеличивает количество товара в корзине. Если товара в корзине нет, строка
+        создаётся из line, иначе данные строки (продавец, цена) не меняются.
+        Возвращает новое количество товара.
+        """
+        raise NotImplementedError
+
+    def set_line(self, product_id: int, line: dict) -> None:
+        """Заменяет строку корзины вместе с количеством"""
+        raise NotImplementedError
+
+    def remove_line(self, product_id: int) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def merge_anonymous(self) -> None:
+        """
+        Переносит корзину анонимного пользователя в корзину пользователя. Вызывается при входе
+        в систему (cart.signals); корзина в сессии переносится вместе с сессией, поэтому по
+        умолчанию ничего не делает.
+        """
+
+    def apply(self, operations: list[tuple]) -> None:
+        """
+        Применяет операции по порядку: ("add", id товара, строка, количество),
+        ("set", id товара, строка) и ("remove", id товара).
+        """
+
+        for operation, product_id, *args in operations:
+            if operation == "add":
+                self.add_line(product_id, *args)
+            elif operation == "set":
+                self.set_line(product_id, *args)
+            elif operation == "remove":
+                self.remove_line(product_id)
+            else:
+                raise ValueError(f"Unknown cart operation {operation!r}")
+
+
+class SessionCartStorage(BaseCartStorage):
+    """Корзина в сессии: {"product<id>": строка, ...}"""
+
+    def __init__(self, request: Request | HttpRequest):
+        super().__init__(request)
+        self.session = request.session
+
+    @property
+    def data(self) -> dict:
+        cart = self.session.get(settings.CART_SESSION_ID)
+        if not isinstance(cart, dict):
+            cart = self.session[settings.CART_SESSION_ID] = {}
+        return cart
+
+    def save(self) -> None:
+        self.session.modified = True
+
+    def get_lines(self) -> dict[int, dict]:
+        return {
+            int(line["product_id"]): normalize_line({key: line[key] for key in line if key != "cost_product"})
+            for line in self.data.values()
+            if isinstance(line, dict)
+        }
+
+    def add_line(self, product_id: int, line: dict, quantity: int) -> int:
+        stored = self.data.setdefault(f"product{product_id}", {**line, "quantity": 0})
+        stored["quantity"] += quantity
+        self.save()
+        return stored["quantity"]
+
+    def set_line(self, product_id: int, line: dict) -> None:
+        self.data[f"product{product_id}"] = dict(line)
+        self.save()
+
+    def remove_line(self, product_id: int) -> None:
+        if self.data.pop(f"product{product_id}", None) is not None:
+            self.save()
+
+    def clear(self) -> None:
+        self.session.pop(settings.CART_SESSION_ID, None)
+        self.save()
+
+
+class RedisCartStorage(BaseCartStorage):
+    """
+    Корзина в хэше Redis: поле "<id товара>" — данные строки (JSON), поле "<id товара>:q" — количество.
+    Корзина авторизованного пользователя хранится по его id, анонимного — по случайному
+    id, который записывается в сессию при первом добавлении товара. Анонимная корзина
+    переносится в корзину пользователя при входе (merge_anonymous), корзина
+    старого формата из сессии — при первом обращении к корзине.
+    """
+
+    def __init__(self, request: Request | HttpRequest):
+        super().__init__(request)
+        self.session = request.session
+        user = getattr(request, "user", None)
+        self.key = None
+        if user is not None and user.is_authenticated:
+            self.key = self.make_key(f"user_{user.pk}")
+        elif settings.CART_ID_SESSION_KEY in self.session:
+            self.key = self.make_key(f"session_{self.session[settings.CART_ID_SESSION_KEY]}")
+        self.import_session_cart()
+
+    @staticmethod
+    def make_key(owner: str) -> str:
+        return settings.CART_KEY.format(owner=owner)
+
+    @staticmethod
+    def get_client():
+        return get_redis()
+
+    @staticmethod
+    def quantity_field(product_id: int) -> str:
+        return f"{product_id}:q"
+
+    @staticmethod
+    def dump_line(line: dict) -> str:
+        return json.dumps({key: line[key] for key in LINE_FIELDS})
+
+    @classmethod
+    def read_lines(cls, key: str | None) -> dict[int, dict]:
+        if key is None:
+            return {}
+        data = {field.decode(): value for field, value in cls.get_client().hgetall(key).items()}
+        lines = {}
+        for field, value in data.items():
+            if field.endswith(":q"):
+                continue
+            quantity = int(data.get(cls.quantity_field(field), 0))
+            if quantity > 0:
+                lines[int(field)] = normalize_line({**json.loads(value), "quantity": quantity})
+        return lines
+
+    def get_write_key(self) -> str:
+        """Ключ корзины для записи; анонимной корзине id назначается при первой записи"""
+
+        if self.key is None:
+            cart_id = self.session[settings.CART_ID_SESSION_KEY] = uuid.uuid4().hex
+            self.key = self.make_key(f"session_{cart_id}")
+        return self.key
+
+    def get_lines(self) -> dict[int, dict]:
+        return self.read_lines(self.key)
+
+    def add_line(self, product_id: int, line: dict, quantity: int) -> int:
+        key = self.get_write_key()
+        pipeline = self.get_client().pipeline()
+        pipeline.hsetnx(key, product_id, self.dump_line(line))
+        pipeline.hincrby(key, self.quantity_field(product_id), quantity)
+        pipeline.expire(key, settings.CART_TIMEOUT)
+        _, new_quantity, _ = pipeline.execute()
+        return new_quantity
+
+    def set_line(self, product_id: int, line: dict) -> None:
+        key = self.get_write_key()
+        pipeline = self.get_client().pipeline()
+        pipeline.hset(
+            key, mapping={product_id: self.dump_line(line), self.quantity_field(product_id): line["quantity"]}
+        )
+        pipeline.expire(key, settings.CART_TIMEOUT)
+        pipeline.execute()
+
+    def remove_line(self, product_id: int) -> None:
+        if self.key is not None:
+            self.get_client().hdel(self.key, product_id, self.quantity_field(product_id))
+
+    def clear(self) -> None:
+        if self.key is not None:
+            self.get_client().delete(self.key)
+
+    def apply(self, operations: list[tuple]) -> None:
+        """Применяет операции одной транзакцией Redis (MULTI/EXEC)"""
+
+        if not operations:
+            return
+        key = self.get_write_key()
+        pipeline = self.get_client().pipeline(transaction=True)
+        for operation, product_id, *args in operations:
+            if operation == "add":
+                line, quantity = args
+                pipeline.hsetnx(key, product_id, self.dump_line(line))
+                pipeline.hincrby(key, self.quantity_field(product_id), quantity)
+            elif operation == "set":
+                (line,) = args
+                pipeline.hset(
+                    key, mapping={product_id: self.dump_line(line), self.quantity_field(product_id): line["quantity"]}
+                )
+            elif operation == "remove":
+                pipeline.hdel(key, product_id, self.quantity_field(product_id))
+            else:
+                raise ValueError(f"Unknown cart operation {operation!r}")
+        pipeline.expire(key, settings.CART_TIMEOUT)
+        pipeline.execute()
+
+    def add_lines(self, lines: dict[int, dict]) -> None:
+        """Добавляет строки одним запросом к Redis (перенос корзин)"""
+
+        if not lines:
+            return
+        key = self.get_write_key()
+        pipeline = self.get_client().pipeline()
+        for product_id, line in lines.items():
+            pipeline.hsetnx(key, product_id, self.dump_line(line))
+            pipeline.hincrby(key, self.quantity_field(product_id), line["quantity"])
+        pipeline.expire(key, settings.CART_TIMEOUT)
+        pipeline.execute()
+
+    def merge(self, source_key: str) -> None:
+        """Переносит строки корзины source_key в эту корзину и удаляет source_key"""
+
+        if source_key == self.key:
+            return
+        self.add_lines(self.read_lines(source_key))
+        self.get_client().delete(source_key)
+
+    def merge_anonymous(self) -> None:
+        if self.key is None:
+            return
+        anonymous_id = self.session.pop(settings.CART_ID_SESSION_KEY, None)
+        if anonymous_id is not None:
+            self.merge(self.make_key(f"session_{anonymous_id}"))
+
+    def import_session_cart(self) -> None:
+        """Переносит корзину, сохранённую в сессии до перехода на Redis"""
+
+        legacy = self.session.get(settings.CART_SESSION_ID)
+        if legacy is None:
+            return
+        if isinstance(legacy, dict):
+            self.add_lines(SessionCartStorage(self.request).get_lines())
+        del self.session[settings.CART_SESSION_ID]
+
+
+@lru_cache(maxsize=None)
+def get_cart_storage_class() -> type[BaseCartStorage]:
+    """Возвращает класс хранилища корзины из настройки CART_STORAGE_BACKEND"""
+    return import_string(settings.CART_STORAGE_BACKEND)
+
+
+def get_cart_storage(request: Request | HttpRequest) -> BaseCartStorage:
+    return get_cart_storage_class()(request)
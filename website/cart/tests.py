@@ -1,3 +1,289 @@
+from decimal import Decimal
+from unittest import mock
+
+from catalog.models import Price
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.signals import user_logged_in
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
+
+from website import settings
+
+from .cart import Cart
+from .lines import CartLine
+from .lines import from_minor
+from .lines import to_minor
+from .storage import RedisCartStorage
+from .storage import get_cart_storage_class
+
+
+class FakeRedis:
+    """Хэши Redis в памяти для проверки RedisCartStorage без сервера Redis"""
+
+    def __init__(self):
+        self.data: dict[str, dict[bytes, bytes]] = {}
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hsetnx(self, key, field, value):
+        fields = self.data.setdefault(key, {})
+        if str(field).encode() in fields:
+            return 0
+        fields[str(field).encode()] = str(value).encode()
+        return 1
+
+    def hincrby(self, key, field, amount):
+        fields = self.data.setdefault(key, {})
+        value = int(fields.get(str(field).encode(), 0)) + amount
+        fields[str(field).encode()] = str(value).encode()
+        return value
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update({str(f).encode(): str(v).encode() for f, v in mapping.items()})
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.data.get(key, {}).pop(str(field).encode(), None)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def expire(self, key, timeout):
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class CartTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        get_cart_storage_class.cache_clear()
+        self.addCleanup(get_cart_storage_class.cache_clear)
+        self.price = Price.objects.filter(product_id=1).first()
+        self.other = Price.objects.exclude(product_id=1).first()
+        with translation.override("en"):
+            self.url = reverse("cart:api")
+
+    def add(self, price: Price, quantity: int = 1):
+        return self.client.post(
+            self.url,
+            {"product_id": price.product_id, "price_id": price.pk, "quantity": quantity},
+            content_type="application/json",
+        )
+
+    def test_session_cart_api(self):
+        self.add(self.price, 2)
+        self.add(self.price)
+        self.add(self.other)
+        cart = self.client.get(self.url).json()
+        self.assertEqual(cart[f"product{self.price.product_id}"]["quantity"], 3)
+        self.assertEqual(cart["total_quantity"], 4)
+        self.assertEqual(Decimal(cart["total_cost"]), self.price.price * 3 + self.other.price)
+
+        self.client.delete(self.url, {"product_id": self.price.product_id}, content_type="application/json")
+        cart = self.client.get(self.url).json()
+        self.assertNotIn(f"product{self.price.product_id}", cart)
+        self.assertEqual(cart["total_quantity"], 1)
+
+    def batch(self, operations: list[dict]):
+        with translation.override("en"):
+            url = reverse("cart:api_batch")
+        return self.client.post(url, {"operations": operations}, content_type="application/json")
+
+    def test_running_totals_match_stored_cart(self):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        request.user = AnonymousUser()
+        cart = Cart(request)
+        cart.add(self.price.product_id, self.price.pk, 2)
+        cart.add(self.other.product_id, self.other.pk)
+        cart.add(self.price.product_id, self.price.pk)
+        cart.update_product(self.other.product_id, self.other.seller_id, 4)
+        cart.remove(self.price.product_id)
+        self.assertEqual(cart.total_quantity, 4)
+        self.assertEqual(Decimal(cart.total_cost), self.other.price * 4)
+
+        stored = Cart(request)
+        self.assertEqual(stored.total_quantity, cart.total_quantity)
+        self.assertEqual(stored.total_cost, cart.total_cost)
+        self.assertEqual(stored.cart, cart.cart)
+
+    def test_batch_applies_operations(self):
+        self.add(self.other)
+        prices = list(Price.objects.exclude(product_id__in=[self.price.product_id, self.other.product_id])[:1])
+        response = self.batch(
+            [
+                {"op": "add", "product_id": self.price.product_id, "price_id": self.price.pk, "quantity": 2},
+                {"op": "add", "product_id": prices[0].product_id, "price_id": prices[0].pk},
+                {"op": "update", "product_id": self.price.product_id, "seller_id": self.price.seller_id, "quantity": 5},
+                {"op": "remove", "product_id": self.other.product_id},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        cart = self.client.get(self.url).json()
+        self.assertEqual(cart[f"product{self.price.product_id}"]["quantity"], 5)
+        self.assertNotIn(f"product{self.other.product_id}", cart)
+        self.assertEqual(cart["total_quantity"], 6)
+
+    def test_batch_with_invalid_operation_is_not_applied(self):
+        response = self.batch(
+            [
+                {"op": "add", "product_id": self.price.product_id, "price_id": self.price.pk},
+                {"op": "add", "product_id": self.price.product_id, "price_id": self.other.pk},
+            ]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("1", response.json()["operations"])
+        self.assertEqual(self.client.get(self.url).json()["total_quantity"], 0)
+
+    def test_batch_queries_do_not_depend_on_size(self):
+        prices = {price.product_id: price for price in Price.objects.all()}
+        operations = [{"op": "add", "product_id": price.product_id, "price_id": price.pk} for price in prices.values()]
+        self.batch(operations[:1])
+        with CaptureQueriesContext(connection) as one_line:
+            self.batch(operations[1:2])
+        with CaptureQueriesContext(connection) as many_lines:
+            self.batch(operations[2:6])
+        self.assertEqual(len(many_lines), len(one_line))
+        self.assertEqual(self.client.get(self.url).json()["total_quantity"], 6)
+
+    def test_cart_page_queries_do_not_depend_on_size(self):
+        with translation.override("en"):
+            url = reverse("cart:detail")
+        self.add(self.price)
+        self.client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as one_line:
+            response = self.client.get(url)
+        self.assertContains(response, self.price.product.name)
+
+        prices = {price.product_id: price for price in Price.objects.exclude(product_id=self.price.product_id)}
+        for price in list(prices.values())[:4]:
+            self.add(price)
+        self.assertEqual(self.client.get(self.url).json()["total_quantity"], 5)
+        self.client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as five_lines:
+            self.client.get(url)
+        self.assertEqual(len(five_lines), len(one_line))
+
+
+class CartLineTestCase(TestCase):
+    def test_minor_units_are_exact(self):
+        self.assertEqual(to_minor(Decimal("19.99")), 1999)
+        self.assertEqual(to_minor(0.1), 10)
+        line = CartLine(product_id=1, seller_id=1, seller_name="seller", price=to_minor("0.10"), quantity=3)
+        self.assertEqual(line.as_dict()["cost_product"], "0.30")
+        self.assertEqual(from_minor(line.cost), Decimal("0.30"))
+
+    def test_legacy_line_is_converted(self):
+        line = CartLine.from_storage(
+            {"product_id": 1, "price": 12.3, "seller_id": 2, "seller_name": "seller", "to_order": True, "quantity": 2}
+        )
+        self.assertEqual(line.price, 1230)
+        self.assertEqual(CartLine.from_storage(line.to_storage()), line)
+
+
+@mock.patch.object(settings, "CART_STORAGE_BACKEND", "cart.storage.RedisCartStorage")
+class RedisCartStorageTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        get_cart_storage_class.cache_clear()
+        self.addCleanup(get_cart_storage_class.cache_clear)
+        self.redis = FakeRedis()
+        patcher = mock.patch.object(RedisCartStorage, "get_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.price = Price.objects.filter(product_id=1).first()
+
+    def make_request(self, session: SessionStore, user=None):
+        request = RequestFactory().get("/")
+        request.session = session
+        request.user = user or AnonymousUser()
+        return request
+
+    def test_lines_are_kept_outside_session(self):
+        session = SessionStore()
+        cart = Cart(self.make_request(session))
+        cart.add(self.price.product_id, self.price.pk, 2)
+        Cart(self.make_request(session)).add(self.price.product_id, self.price.pk)
+
+        cart = Cart(self.make_request(session))
+        self.assertEqual(cart.total_quantity, 3)
+        self.assertEqual(Decimal(cart.total_cost), self.price.price * 3)
+        self.assertNotIn(settings.CART_SESSION_ID, session)
+        self.assertIn(settings.CART_ID_SESSION_KEY, session)
+
+    def test_reading_empty_cart_does_not_create_it(self):
+        session = SessionStore()
+        self.assertEqual(Cart(self.make_request(session)).total_quantity, 0)
+        self.assertTrue(session.is_empty())
+
+    def test_session_cart_is_imported(self):
+        session = SessionStore()
+        session[settings.CART_SESSION_ID] = {
+            f"product{self.price.product_id}": {
+                "quantity": 2,
+                "product_id": self.price.product_id,
+                "price": float(self.price.price),
+                "seller_id": self.price.seller_id,
+                "seller_name": "seller",
+                "to_order": True,
+                "cost_product": "0",
+            },
+            "total_quantity": 2,
+            "total_cost": "0",
+        }
+        cart = Cart(self.make_request(session))
+        self.assertEqual(cart.total_quantity, 2)
+        self.assertNotIn(settings.CART_SESSION_ID, session)
+
+    def test_batch_is_one_transaction(self):
+        session = SessionStore()
+        cart = Cart(self.make_request(session))
+        other = Price.objects.exclude(product_id=self.price.product_id).first()
+        with mock.patch.object(self.redis, "pipeline", wraps=self.redis.pipeline) as pipeline:
+            errors = cart.apply(
+                [
+                    {"op": "add", "product_id": self.price.product_id, "price_id": self.price.pk, "quantity": 2},
+                    {"op": "add", "product_id": other.product_id, "price_id": other.pk, "quantity": 1},
+                    {"op": "remove", "product_id": other.product_id},
+                ]
+            )
+        self.assertEqual(errors, {})
+        pipeline.assert_called_once_with(transaction=True)
+        self.assertEqual(cart.total_quantity, 2)
+        self.assertEqual(Cart(self.make_request(session)).total_quantity, 2)
 
-# Create your tests here.
+    def test_anonymous_cart_moves_to_user(self):
+        session = SessionStore()
+        Cart(self.make_request(session)).add(self.price.product_id, self.price.pk, 2)
+        user = mock.Mock(pk=1, is_authenticated=True)
+        request = self.make_request(session, user)
+        user_logged_in.send(sender=user.__class__, request=request, user=user)
+        cart = Cart(request)
+        self.assertEqual(cart.total_quantity, 2)
+        self.assertNotIn(settings.CART_ID_SESSION_KEY, session)
+        self.assertEqual(Cart(self.make_request(SessionStore(), user)).total_quantity, 2)
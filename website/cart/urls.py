@@ -1,6 +1,7 @@
 from django.urls import path
 
 from .views import APICart
+from .views import APICartBatch
 from .views import DetailCart
 
 app_name = "cart"
@@ -8,4 +9,5 @@ app_name = "cart"
 urlpatterns = [
     path("detail/", DetailCart.as_view(), name="detail"),
     path("api/", APICart.as_view(), name="api"),
+    path("api/batch/", APICartBatch.as_view(), name="api_batch"),
 ]
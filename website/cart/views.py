@@ -1,13 +1,16 @@
 from django.views.generic import TemplateView
+from drf_spectacular.utils import extend_schema
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.status import HTTP_200_OK
+from rest_framework.status import HTTP_400_BAD_REQUEST
 from rest_framework.status import HTTP_201_CREATED
 from rest_framework.status import HTTP_204_NO_CONTENT
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 
 from .cart import Cart
+from .serializers import CartBatchSerializer
 
 
 class DetailCart(TemplateView):
@@ -42,7 +45,7 @@ class APICart(APIView):
             "product1": {
                     "quantity": "кол-во товара (int)",
                     "product_id": "id товара (int)",
-                    "price": "цена товара (float)",
+                    "price": "цена товара (str)",
                     "seller_id": "id продавца (int)",
                     "seller_name": "имя продавца (str)",
                     "to_order": "в заказе товара или нет (bool)",
@@ -89,3 +92,27 @@ class APICart(APIView):
         product_id = request.data["product_id"]
         cart.remove(product_id)
         return Response(status=HTTP_204_NO_CONTENT)
+
+
+class APICartBatch(APIView):
+    """
+    API для изменения нескольких товаров в корзине одним запросом
+    """
+    permission_classes = [AllowAny]
+
+    @extend_schema(
+        request=CartBatchSerializer,
+        description="Применяет список операций add/update/remove к корзине. Если хотя бы одна операция "
+        "некорректна, корзина не изменяется и возвращаются ошибки по номерам операций.",
+    )
+    def post(self, request: Request) -> Response:
+        """
+        Применяет операции с корзиной и возвращает корзину в формате APICart.get
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = Cart(request)
+        errors = cart.apply(serializer.validated_data["operations"])
+        if errors:
+            return Response({"operations": errors}, status=HTTP_400_BAD_REQUEST)
+        return Response(cart.cart, status=HTTP_200_OK)
@@ -1,10 +1,9 @@
+from core.cache import CATEGORIES
+from core.cache import invalidate_tags
 from django.contrib import admin
-from django.core.cache import cache
 from django.db.models import QuerySet
 from django.http import HttpRequest
 
-from website.settings import CATEGORY_KEY
-
 from .models import Category
 from .models import Delivery
 from .models import NameSpecification
@@ -21,7 +20,8 @@ from .models import Viewed
 
 @admin.action(description="Delete cache")
 def delete_cache(model_admin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
-    cache.delete(CATEGORY_KEY)
+    CATEGORIES.delete()
+    invalidate_tags(*(f"category:{pk}" for pk in queryset.values_list("pk", flat=True)))
 
 
 @admin.register(Category)
@@ -0,0 +1,143 @@
+"""
+Буферизованный счётчик просмотров товаров.
+
+Просмотры накапливаются вне базы данных (хэш Redis или словарь в памяти процесса)
+и периодически переносятся в Product.views пакетными UPDATE ... SET views = views + n,
+поэтому просмотр товара не блокирует строку товара и не вызывает сигналы его сохранения.
+Значение Product.views отстаёт от реального на время между сбросами.
+"""
+
+import threading
+import time
+import uuid
+from functools import lru_cache
+from itertools import groupby
+
+from core.redis_client import get_redis
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from website import settings
+
+from .models import Product
+
+
+class BaseViewCounter:
+    """Базовый класс счётчика просмотров"""
+
+    def increment(self, product_id: int, amount: int = 1) -> None:
+        raise NotImplementedError
+
+    def pending(self, product_id: int) -> int:
+        """Возвращает количество просмотров товара, ещё не перенесённых в базу"""
+        raise NotImplementedError
+
+    def drain(self) -> dict[int, int]:
+        """Забирает накопленные просмотры {id товара: количество} и обнуляет буфер"""
+        raise NotImplementedError
+
+    def restore(self, counts: dict[int, int]) -> None:
+        """Возвращает просмотры в буфер, если перенести их в базу не удалось"""
+        for product_id, amount in counts.items():
+            self.increment(product_id, amount)
+
+    def flush(self, batch_size: int = 500) -> int:
+        """
+        Переносит накопленные просмотры в Product.views. Товары с одинаковым приростом
+        обновляются одним запросом. Возвращает количество обновлённых товаров.
+        """
+
+        counts = self.drain()
+        if not counts:
+            return 0
+        try:
+            updated = 0
+            by_amount = sorted(counts.items(), key=lambda item: item[1])
+            for amount, group in groupby(by_amount, key=lambda item: item[1]):
+                product_ids = [product_id for product_id, _ in group]
+                for start in range(0, len(product_ids), batch_size):
+                    updated += Product.objects.filter(pk__in=product_ids[start : start + batch_size]).update(
+                        views=F("views") + amount
+                    )
+        except Exception:
+            self.restore(counts)
+            raise
+        return updated
+
+
+class RedisViewCounter(BaseViewCounter):
+    """
+    Счётчик в хэше Redis (HINCRBY). Для сброса хэш атомарно переименовывается,
+    поэтому просмотры, пришедшие во время сброса, попадают в новый хэш и не теряются.
+    """
+
+    def get_client(self):
+        return get_redis()
+
+    def increment(self, product_id: int, amount: int = 1) -> None:
+        self.get_client().hincrby(settings.VIEW_COUNTER_KEY, product_id, amount)
+
+    def pending(self, product_id: int) -> int:
+        return int(self.get_client().hget(settings.VIEW_COUNTER_KEY, product_id) or 0)
+
+    def drain(self) -> dict[int, int]:
+        client = self.get_client()
+        flushing_key = f"{settings.VIEW_COUNTER_KEY}:{uuid.uuid4().hex}"
+        if not client.exists(settings.VIEW_COUNTER_KEY):
+            return {}
+        client.rename(settings.VIEW_COUNTER_KEY, flushing_key)
+        pipeline = client.pipeline()
+        pipeline.hgetall(flushing_key)
+        pipeline.delete(flushing_key)
+        counts, _ = pipeline.execute()
+        return {int(product_id): int(amount) for product_id, amount in counts.items()}
+
+    def restore(self, counts: dict[int, int]) -> None:
+        pipeline = self.get_client().pipeline()
+        for product_id, amount in counts.items():
+            pipeline.hincrby(settings.VIEW_COUNTER_KEY, product_id, amount)
+        pipeline.execute()
+
+
+class LocalViewCounter(BaseViewCounter):
+    """
+    Счётчик в памяти процесса (разработка без Redis, тесты). Процесс сам переносит
+    просмотры в базу, когда их накопилось flush_threshold или прошло flush_interval секунд.
+    """
+
+    flush_threshold = 100
+    flush_interval = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: dict[int, int] = {}
+        self._flushed_at = time.monotonic()
+
+    def increment(self, product_id: int, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[product_id] = self._counts.get(product_id, 0) + amount
+            total = sum(self._counts.values())
+            due = total >= self.flush_threshold or time.monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def pending(self, product_id: int) -> int:
+        with self._lock:
+            return self._counts.get(product_id, 0)
+
+    def drain(self) -> dict[int, int]:
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            self._flushed_at = time.monotonic()
+        return counts
+
+    def restore(self, counts: dict[int, int]) -> None:
+        with self._lock:
+            for product_id, amount in counts.items():
+                self._counts[product_id] = self._counts.get(product_id, 0) + amount
+
+
+@lru_cache(maxsize=None)
+def get_view_counter() -> BaseViewCounter:
+    """Возвращает счётчик просмотров из настройки VIEW_COUNTER_BACKEND"""
+    return import_string(settings.VIEW_COUNTER_BACKEND)()
@@ -0,0 +1,182 @@
+from typing import Iterable
+
+from core.cache import CATEGORY_FACETS
+
+from .models import Price
+from .models import Product
+from .models import Specification
+
+SELLER = "seller"
+MANUFACTURE = "manufacture"
+SPECIFICATION = "specification"
+TAG = "tag"
+LIMITED_EDITION = "limited_edition"
+
+FACETS = (SELLER, MANUFACTURE, SPECIFICATION, TAG, LIMITED_EDITION)
+
+
+class CategoryFacetIndex:
+    """
+    Индекс фасетов (фильтров) категории каталога.
+
+    Для каждого значения фасета хранится битовая карта товаров категории (int, где
+    бит i означает товар product_ids[i]). Фильтрация сводится к OR внутри фасета и
+    AND между фасетами, а количество товаров для боковой панели — к подсчёту бит.
+
+    Attributes:
+        category_id: id категории
+        product_ids: id не архивных товаров категории (позиция в списке — номер бита)
+        postings: {фасет: {значение: битовая карта}}
+        labels: {фасет: {значение: подпись}} для продавцов и тегов
+        specification_names: {название характеристики: [значения]} для группировки в шаблоне
+    """
+
+    def __init__(
+        self,
+        category_id: int,
+        product_ids: list[int],
+        postings: dict[str, dict],
+        labels: dict[str, dict],
+        specification_names: dict[str, list[str]],
+    ):
+        self.category_id = category_id
+        self.product_ids = product_ids
+        self.postings = postings
+        self.labels = labels
+        self.specification_names = specification_names
+        self.all_products = (1 << len(product_ids)) - 1
+
+    @classmethod
+    def build(cls, category_id: int) -> "CategoryFacetIndex":
+        """Строит индекс категории четырьмя запросами без JOIN-ов по всем фасетам сразу"""
+
+        products = list(
+            Product.objects.filter(category_id=category_id, archived=False)
+            .order_by("pk")
+            .values_list("pk", "manufacture", "limited_edition")
+        )
+        product_ids = [pk for pk, _, _ in products]
+        positions = {pk: 1 << position for position, pk in enumerate(product_ids)}
+
+        postings = {facet: {} for facet in FACETS}
+        labels = {SELLER: {}, TAG: {}}
+        specification_names = {}
+
+        def add(facet: str, value, product_id: int) -> None:
+            postings[facet][value] = postings[facet].get(value, 0) | positions[product_id]
+
+        for pk, manufacture, limited_edition in products:
+            add(MANUFACTURE, manufacture, pk)
+            if limited_edition:
+                add(LIMITED_EDITION, True, pk)
+
+        for product_id, name, value in Specification.objects.filter(product_id__in=positions).values_list(
+            "product_id", "name__name", "value"
+        ):
+            add(SPECIFICATION, value, product_id)
+            values = specification_names.setdefault(name, [])
+            if value not in values:
+                values.append(value)
+
+        for product_id, seller_id, seller_name in Price.objects.filter(product_id__in=positions).values_list(
+            "product_id", "seller_id", "seller__name"
+        ):
+            add(SELLER, seller_id, product_id)
+            labels[SELLER][seller_id] = seller_name
+
+        for product_id, tag_id, tag_name in Product.tags.through.objects.filter(product_id__in=positions).values_list(
+            "product_id", "tag_id", "tag__name"
+        ):
+            add(TAG, tag_id, product_id)
+            labels[TAG][tag_id] = tag_name
+
+        return cls(category_id, product_ids, postings, labels, specification_names)
+
+    @classmethod
+    def get(cls, category_id: int) -> "CategoryFacetIndex":
+        """
+        Возвращает индекс категории из кэша или строит его. Запись кэша зависит
+        от тега категории и тегов продавцов, тегов товаров и названий характеристик.
+        """
+
+        return CATEGORY_FACETS.get_or_set(lambda: cls.build(category_id), category_id=category_id)
+
+    def normalize(self, facet: str, values: Iterable) -> list:
+        """Приводит значения из формы к ключам индекса (id продавцов и тегов — целые числа)"""
+
+        if facet in (SELLER, TAG):
+            normalized = []
+            for value in values:
+                try:
+                    normalized.append(int(value))
+                except (TypeError, ValueError):
+                    continue
+            return normalized
+        return list(values)
+
+    def facet_bitmap(self, facet: str, values: Iterable) -> int:
+        """Возвращает объединение (OR) битовых карт выбранных значений фасета"""
+
+        bitmap = 0
+        for value in self.normalize(facet, values):
+            bitmap |= self.postings[facet].get(value, 0)
+        return bitmap
+
+    def match(self, selected: dict[str, list], exclude: str | None = None) -> int:
+        """
+        Возвращает битовую карту товаров, подходящих под выбранные значения
+        (OR внутри фасета, AND между фасетами). Фасет exclude не учитывается,
+        это нужно для подсчёта количества по самому фасету.
+        """
+
+        bitmap = self.all_products
+        for facet, values in selected.items():
+            if facet == exclude or not values:
+                continue
+            bitmap &= self.facet_bitmap(facet, values)
+        return bitmap
+
+    def product_ids_for(self, bitmap: int) -> list[int]:
+        """Возвращает id товаров, соответствующих битовой карте"""
+
+        product_ids = []
+        while bitmap:
+            lowest = bitmap & -bitmap
+            product_ids.append(self.product_ids[lowest.bit_length() - 1])
+            bitmap ^= lowest
+        return product_ids
+
+    def counts(self, selected: dict[str, list] | None = None) -> dict[str, dict]:
+        """
+        Возвращает количество товаров для каждого значения каждого фасета.
+        Для фасета учитываются выбранные значения всех остальных фасетов.
+        """
+
+        selected = selected or {}
+        counts = {}
+        for facet, values in self.postings.items():
+            base = self.match(selected, exclude=facet)
+            counts[facet] = {value: (base & bitmap).bit_count() for value, bitmap in values.items()}
+        return counts
+
+    def sidebar(self, selected: dict[str, list] | None = None) -> dict:
+        """Возвращает данные для боковой панели фильтров с количеством товаров"""
+
+        counts = self.counts(selected)
+        return {
+            "sellers": [
+                {"id": seller_id, "name": name, "count": counts[SELLER][seller_id]}
+                for seller_id, name in sorted(self.labels[SELLER].items(), key=lambda item: item[1])
+            ],
+            "manufactures": [
+                {"name": manufacture, "count": count} for manufacture, count in sorted(counts[MANUFACTURE].items())
+            ],
+            "grouped_specifications": [
+                (name, [{"value": value, "count": counts[SPECIFICATION][value]} for value in values])
+                for name, values in sorted(self.specification_names.items())
+            ],
+            "tags": [
+                {"id": tag_id, "name": name, "count": counts[TAG][tag_id]}
+                for tag_id, name in sorted(self.labels[TAG].items(), key=lambda item: item[1])
+            ],
+        }
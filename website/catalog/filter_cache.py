@@ -0,0 +1,56 @@
+import hashlib
+import json
+from typing import Callable
+from typing import Iterable
+
+from core.cache import CATALOG_FILTER
+
+
+class CatalogFilterCache:
+    """
+    Кэш результатов фильтрации каталога.
+
+    Для набора фильтров (продавцы, производители, диапазон цен, название, характеристики,
+    теги, ограниченная серия и сортировка) хранится упорядоченный список id товаров.
+    Ключ состоит из id категории и хэша нормализованного набора фильтров, а запись
+    зависит от тега категории: при изменении её товаров все результаты фильтрации
+    категории становятся недействительными, остальные категории не затрагиваются.
+    """
+
+    @staticmethod
+    def normalize(filters: dict) -> dict:
+        """
+        Приводит фильтры к каноническому виду: пустые значения отбрасываются,
+        списки сортируются и избавляются от повторов, строки — от регистра и лишних пробелов.
+        """
+
+        normalized = {}
+        for name, value in filters.items():
+            if isinstance(value, (list, tuple, set)):
+                value = sorted({str(item) for item in value})
+            elif isinstance(value, str):
+                value = " ".join(value.lower().split())
+            if value is None or value is False or value in ("", []):
+                continue
+            normalized[name] = value
+        return normalized
+
+    @classmethod
+    def signature(cls, filters: dict) -> str:
+        """Возвращает хэш нормализованного набора фильтров"""
+
+        payload = json.dumps(cls.normalize(filters), sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    @classmethod
+    def get_product_ids(cls, category_id: int, filters: dict, compute: Callable[[], Iterable[int]]) -> list[int]:
+        """
+        Возвращает упорядоченный список id товаров для набора фильтров из кэша
+        или вычисляет его функцией compute и сохраняет в кэш.
+        """
+
+        return CATALOG_FILTER.get_or_set(
+            lambda: list(compute()),
+            category_id=category_id,
+            signature=cls.signature(filters),
+        )
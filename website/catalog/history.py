@@ -0,0 +1,235 @@
+"""
+Отложенная запись истории просмотров авторизованных пользователей.
+
+Просмотр товара не пишет в базу на странице товара: событие кладётся в очередь
+(список Redis или список в памяти процесса), а периодическая задача переносит
+накопленные события в Viewed пакетным bulk_create(update_conflicts=True).
+Последние просмотры пользователя хранятся в кэше, поэтому история в личном
+кабинете отображается без запросов к базе.
+"""
+
+import json
+import threading
+import time
+import uuid
+from datetime import datetime
+from functools import lru_cache
+
+from core.redis_client import get_redis
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from website import settings
+
+from .counters import get_view_counter
+from .models import Product
+from .models import Viewed
+
+
+def recent_key(user_id: int) -> str:
+    return settings.VIEWED_RECENT_KEY.format(user_id=user_id)
+
+
+def get_recent(user_id: int) -> list[tuple[int, str, datetime]] | None:
+    """Возвращает последние просмотры пользователя [(id товара, название, время)] или None"""
+    return cache.get(recent_key(user_id))
+
+
+def set_recent(user_id: int, recent: list[tuple[int, str, datetime]]) -> None:
+    cache.set(recent_key(user_id), recent[: settings.VIEWED_RECENT_LIMIT], timeout=settings.VIEWED_RECENT_TIMEOUT)
+
+
+def build_recent(user_id: int) -> list[tuple[int, str, datetime]]:
+    """Строит список последних просмотров пользователя по базе и сохраняет его в кэш"""
+    recent = list(
+        Viewed.objects.filter(user_id=user_id)
+        .order_by("-created_at")
+        .values_list("product_id", "product__name", "created_at")[: settings.VIEWED_RECENT_LIMIT]
+    )
+    set_recent(user_id, recent)
+    return recent
+
+
+def push_recent(user_id: int, product_id: int, product_name: str, viewed_at: datetime) -> None:
+    """Добавляет просмотр в начало списка последних просмотров пользователя"""
+    recent = get_recent(user_id)
+    if recent is None:
+        recent = build_recent(user_id)
+    recent = [item for item in recent if item[0] != product_id]
+    recent.insert(0, (product_id, product_name, viewed_at))
+    set_recent(user_id, recent)
+
+
+def remove_recent(user_id: int, product_id: int) -> bool:
+    """Убирает товар из последних просмотров пользователя. Возвращает True, если товар там был"""
+    recent = get_recent(user_id)
+    if recent is None or all(item[0] != product_id for item in recent):
+        return False
+    set_recent(user_id, [item for item in recent if item[0] != product_id])
+    return True
+
+
+def removed_key(user_id: int, product_id: int) -> str:
+    return settings.VIEWED_REMOVED_KEY.format(user_id=user_id, product_id=product_id)
+
+
+def mark_removed(user_id: int, product_id: int) -> None:
+    """
+    Запоминает время удаления товара из истории пользователя. Просмотры из очереди,
+    сделанные до удаления, при записи в базу отбрасываются.
+    """
+    cache.set(removed_key(user_id, product_id), timezone.now().timestamp(), timeout=settings.VIEWED_REMOVED_TIMEOUT)
+
+
+class BaseViewedQueue:
+    """Базовый класс очереди просмотров; событие — (id пользователя, id товара, время в секундах)"""
+
+    def push(self, user_id: int, product_id: int, viewed_at: float) -> None:
+        raise NotImplementedError
+
+    def drain(self) -> list[tuple[int, int, float]]:
+        """Забирает все накопленные события и очищает очередь"""
+        raise NotImplementedError
+
+    def restore(self, events: list[tuple[int, int, float]]) -> None:
+        """Возвращает события в очередь, если записать их в базу не удалось"""
+        for event in events:
+            self.push(*event)
+
+    def flush(self, batch_size: int = 500) -> int:
+        """
+        Записывает накопленные просмотры в Viewed. Повторные просмотры одного товара
+        пользователем схлопываются, записи удалённых пользователей и товаров отбрасываются,
+        как и просмотры, сделанные до удаления товара из истории (mark_removed).
+        Для впервые просмотренных пользователем товаров увеличивается счётчик просмотров.
+        Записи выполняются по очереди под блокировкой в кэше: иначе два одновременных сброса
+        могли бы оба посчитать первый просмотр товара. Если блокировку держит другой сброс,
+        события остаются в очереди до следующего сброса.
+        Возвращает количество записанных пар (пользователь, товар).
+        """
+
+        if not cache.add(settings.VIEWED_FLUSH_LOCK_KEY, True, timeout=settings.VIEWED_FLUSH_LOCK_TIMEOUT):
+            return 0
+        try:
+            return self.write(self.drain(), batch_size)
+        finally:
+            cache.delete(settings.VIEWED_FLUSH_LOCK_KEY)
+
+    def write(self, events: list[tuple[int, int, float]], batch_size: int) -> int:
+        if not events:
+            return 0
+
+        latest: dict[tuple[int, int], float] = {}
+        for user_id, product_id, viewed_at in events:
+            latest[(user_id, product_id)] = max(viewed_at, latest.get((user_id, product_id), viewed_at))
+        removed = cache.get_many([removed_key(*pair) for pair in latest])
+        if removed:
+            latest = {
+                pair: viewed_at for pair, viewed_at in latest.items() if viewed_at > removed.get(removed_key(*pair), 0)
+            }
+
+        try:
+            user_ids = {user_id for user_id, _ in latest}
+            product_ids = {product_id for _, product_id in latest}
+            user_ids &= set(get_user_model().objects.filter(pk__in=user_ids).values_list("pk", flat=True))
+            product_ids &= set(Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True))
+            pairs = [pair for pair in latest if pair[0] in user_ids and pair[1] in product_ids]
+
+            existing = set(
+                Viewed.objects.filter(user_id__in=user_ids, product_id__in=product_ids).values_list(
+                    "user_id", "product_id"
+                )
+            )
+            # created_at (auto_now) получает время записи, поэтому время просмотра сдвигается
+            # не больше чем на интервал сброса очереди
+            Viewed.objects.bulk_create(
+                [Viewed(user_id=user_id, product_id=product_id) for user_id, product_id in pairs],
+                update_conflicts=True,
+                unique_fields=["user", "product"],
+                update_fields=["created_at"],
+                batch_size=batch_size,
+            )
+        except Exception:
+            self.restore(events)
+            raise
+
+        counter = get_view_counter()
+        for user_id, product_id in pairs:
+            if (user_id, product_id) not in existing:
+                counter.increment(product_id)
+        return len(pairs)
+
+
+class RedisViewedQueue(BaseViewedQueue):
+    """Очередь в списке Redis (RPUSH). Для сброса список атомарно переименовывается."""
+
+    def get_client(self):
+        return get_redis()
+
+    def push(self, user_id: int, product_id: int, viewed_at: float) -> None:
+        self.get_client().rpush(settings.VIEWED_QUEUE_KEY, json.dumps([user_id, product_id, viewed_at]))
+
+    def drain(self) -> list[tuple[int, int, float]]:
+        client = self.get_client()
+        if not client.exists(settings.VIEWED_QUEUE_KEY):
+            return []
+        flushing_key = f"{settings.VIEWED_QUEUE_KEY}:{uuid.uuid4().hex}"
+        client.rename(settings.VIEWED_QUEUE_KEY, flushing_key)
+        pipeline = client.pipeline()
+        pipeline.lrange(flushing_key, 0, -1)
+        pipeline.delete(flushing_key)
+        events, _ = pipeline.execute()
+        return [tuple(json.loads(event)) for event in events]
+
+    def restore(self, events: list[tuple[int, int, float]]) -> None:
+        if events:
+            self.get_client().rpush(settings.VIEWED_QUEUE_KEY, *(json.dumps(list(event)) for event in events))
+
+
+class LocalViewedQueue(BaseViewedQueue):
+    """
+    Очередь в памяти процесса (разработка без Redis, тесты). Процесс сам записывает
+    события в базу, когда их накопилось flush_threshold или прошло flush_interval секунд.
+    """
+
+    flush_threshold = 100
+    flush_interval = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events: list[tuple[int, int, float]] = []
+        self._flushed_at = time.monotonic()
+
+    def push(self, user_id: int, product_id: int, viewed_at: float) -> None:
+        with self._lock:
+            self._events.append((user_id, product_id, viewed_at))
+            due = (
+                len(self._events) >= self.flush_threshold or time.monotonic() - self._flushed_at >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def drain(self) -> list[tuple[int, int, float]]:
+        with self._lock:
+            events, self._events = self._events, []
+            self._flushed_at = time.monotonic()
+        return events
+
+    def restore(self, events: list[tuple[int, int, float]]) -> None:
+        with self._lock:
+            self._events[:0] = events
+
+
+@lru_cache(maxsize=None)
+def get_viewed_queue() -> BaseViewedQueue:
+    """Возвращает очередь просмотров из настройки VIEWED_QUEUE_BACKEND"""
+    return import_string(settings.VIEWED_QUEUE_BACKEND)()
+
+
+def add_viewed_product(user_id: int, product_id: int, product_name: str) -> None:
+    """Ставит просмотр товара в очередь записи и обновляет последние просмотры в кэше"""
+    viewed_at = timezone.now()
+    get_viewed_queue().push(user_id, product_id, viewed_at.timestamp())
+    push_recent(user_id, product_id, product_name, viewed_at)
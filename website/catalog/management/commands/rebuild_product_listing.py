@@ -0,0 +1,18 @@
+from catalog.models import ProductListing
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Полная перестройка витрины каталога ProductListing.
+    Запускается после деплоя/миграций; дальше витрина поддерживается сигналами.
+    """
+
+    help = "Rebuild the denormalized product listing table used by the catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Products per batch")
+
+    def handle(self, *args, **options):
+        total = ProductListing.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Product listing rebuilt for {total} products"))
@@ -0,0 +1,14 @@
+from catalog.search import get_search_backend
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Полная пересборка документов полнотекстового поиска товаров.
+    """
+
+    help = "Rebuild product full-text search documents"
+
+    def handle(self, *args, **options):
+        total = get_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt for {total} products"))
@@ -1,5 +1,15 @@
-from django.db import models, transaction
+from typing import Iterable
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import OpClass
+from django.contrib.postgres.search import SearchVector
+from django.db import models
+from django.db.models import Count
+from django.db.models import F
 from django.db.models import ManyToManyField, QuerySet
+from django.db.models import Max
+from django.db.models import Min
+from django.db.models import Sum
 from django.db.models.constraints import UniqueConstraint
 from django.http import HttpRequest
 from django.urls import reverse
@@ -365,6 +375,283 @@ class Review(models.Model):
         verbose_name_plural = _("Reviews")
 
 
+class ProductListing(models.Model):
+    """
+    Денормализованная витрина товара для списка каталога (одна строка на товар).
+    Хранит заранее посчитанные агрегаты, чтобы список категории отдавался
+    простым индексированным ORDER BY/LIMIT без GROUP BY по ценам и отзывам.
+
+    Attributes:
+        product: товар, к которому относится строка витрины
+        category: категория товара (копия Product.category)
+        archived: статус архива товара (копия Product.archived)
+        min_price: минимальная цена товара среди продавцов
+        price_pk: id самой дешёвой цены товара (Price)
+        sold_total: общее количество проданного товара
+        last_price_date: дата последней добавленной цены
+        review_count: количество отзывов о товаре
+        sorting_index: индекс сортировки товара (копия Product.sorting_index)
+    """
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="listing",
+        verbose_name=_("Product"),
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="listings",
+        verbose_name=_("Category"),
+    )
+    archived = models.BooleanField(default=False, verbose_name=_("Archived status"))
+    min_price = models.DecimalField(
+        null=True,
+        blank=True,
+        max_digits=10,
+        decimal_places=2,
+        verbose_name=_("Price"),
+    )
+    price_pk = models.PositiveBigIntegerField(null=True, blank=True, verbose_name=_("Price"))
+    sold_total = models.PositiveIntegerField(default=0, verbose_name=_("Sold Quantity"))
+    last_price_date = models.DateField(null=True, blank=True, verbose_name=_("Created at"))
+    review_count = models.PositiveIntegerField(default=0, verbose_name=_("Reviews"))
+    sorting_index = models.PositiveIntegerField(default=0, verbose_name=_("Sorting Index"))
+
+    class Meta:
+        verbose_name = _("Product listing")
+        verbose_name_plural = _("Product listings")
+        indexes = [
+            models.Index(fields=["category", "archived", "min_price"], name="listing_category_price_idx"),
+            models.Index(fields=["category", "archived", "sold_total"], name="listing_category_sold_idx"),
+            models.Index(fields=["category", "archived", "last_price_date"], name="listing_category_date_idx"),
+            models.Index(fields=["category", "archived", "review_count"], name="listing_category_review_idx"),
+            models.Index(fields=["archived", "sorting_index", "-sold_total", "product"], name="listing_top_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"ProductListing(product_id={self.product_id}, min_price={self.min_price})"
+
+    @classmethod
+    def refresh(cls, product_ids: Iterable[int]) -> None:
+        """
+        Пересчитывает строки витрины для указанных товаров.
+        Агрегаты считаются только по ценам и отзывам этих товаров, поэтому
+        метод дешёвый для одного товара и годится для полной перестройки витрины.
+        """
+
+        product_ids = set(product_ids)
+        if not product_ids:
+            return
+
+        products = Product.objects.filter(pk__in=product_ids).values_list(
+            "pk", "category_id", "archived", "sorting_index"
+        )
+
+        aggregates = {
+            row["product_id"]: row
+            for row in Price.objects.filter(product_id__in=product_ids)
+            .values("product_id")
+            .annotate(min_price=Min("price"), sold_total=Sum("sold_quantity"), last_price_date=Max("created_at"))
+            .order_by()
+        }
+
+        cheapest_prices = {}
+        for product_id, price_pk in (
+            Price.objects.filter(product_id__in=product_ids)
+            .order_by("product_id", "price", "pk")
+            .values_list("product_id", "pk")
+        ):
+            cheapest_prices.setdefault(product_id, price_pk)
+
+        review_counts = dict(
+            Review.objects.filter(product_id__in=product_ids)
+            .values("product_id")
+            .annotate(review_count=Count("pk"))
+            .order_by()
+            .values_list("product_id", "review_count")
+        )
+
+        listings = []
+        for product_id, category_id, archived, sorting_index in products:
+            aggregate = aggregates.get(product_id, {})
+            listings.append(
+                cls(
+                    product_id=product_id,
+                    category_id=category_id,
+                    archived=archived,
+                    min_price=aggregate.get("min_price"),
+                    price_pk=cheapest_prices.get(product_id),
+                    sold_total=aggregate.get("sold_total") or 0,
+                    last_price_date=aggregate.get("last_price_date"),
+                    review_count=review_counts.get(product_id, 0),
+                    sorting_index=sorting_index,
+                )
+            )
+
+        cls.objects.bulk_create(
+            listings,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=[
+                "category",
+                "archived",
+                "min_price",
+                "price_pk",
+                "sold_total",
+                "last_price_date",
+                "review_count",
+                "sorting_index",
+            ],
+        )
+
+    @classmethod
+    def change_review_count(cls, product_id: int, delta: int) -> None:
+        """
+        Инкрементально изменяет количество отзывов товара в витрине
+        """
+
+        cls.objects.filter(product_id=product_id).update(review_count=F("review_count") + delta)
+
+    @classmethod
+    def top(cls, limit: int) -> list[tuple[int, int, int]]:
+        """
+        Возвращает первые limit не архивных товаров по индексу сортировки и продажам
+        в виде (id товара, индекс сортировки, продано). Запрос идёт по индексу listing_top_idx.
+        """
+
+        return list(
+            cls.objects.filter(archived=False)
+            .order_by("sorting_index", "-sold_total", "product_id")
+            .values_list("product_id", "sorting_index", "sold_total")[:limit]
+        )
+
+    @classmethod
+    def rebuild(cls, batch_size: int = 1000) -> int:
+        """
+        Полностью перестраивает витрину по всем товарам пачками.
+        Возвращает количество обработанных товаров.
+        """
+
+        product_ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+        for start in range(0, len(product_ids), batch_size):
+            cls.refresh(product_ids[start : start + batch_size])
+        return len(product_ids)
+
+
+def product_search_vector() -> SearchVector:
+    """
+    Взвешенный tsvector документа поиска (PostgreSQL).
+    Одно и то же выражение используется в GIN-индексе и в запросе, иначе индекс не применится.
+    """
+
+    config = settings.SEARCH_TEXT_CONFIG
+    return (
+        SearchVector("title", weight="A", config=config)
+        + SearchVector("keywords", weight="B", config=config)
+        + SearchVector("body", weight="C", config=config)
+    )
+
+
+def search_document_indexes() -> list[GinIndex]:
+    """
+    GIN-индексы документов поиска для PostgreSQL. Их нет в Meta.indexes, чтобы миграции,
+    которые создаёт makemigrations, не зависели от СУБД: индексы и расширение pg_trgm
+    создаются после migrate (catalog.search.backends.create_postgres_search_schema).
+    """
+
+    return [
+        GinIndex(product_search_vector(), name="search_document_vector_idx"),
+        GinIndex(OpClass("title", name="gin_trgm_ops"), name="search_document_title_trgm_idx"),
+    ]
+
+
+class ProductSearchDocument(models.Model):
+    """
+    Документ полнотекстового поиска товара: индексируемые поля товара, собранные
+    в одну строку без JOIN-ов, поддерживается сигналами.
+
+    Attributes:
+        product: товар, к которому относится документ
+        category: категория товара (для поиска внутри категории)
+        archived: статус архива товара
+        title: название товара
+        keywords: производитель и теги товара
+        body: краткое и полное описание товара
+    """
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+        verbose_name=_("Product"),
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="search_documents",
+        verbose_name=_("Category"),
+    )
+    archived = models.BooleanField(default=False, verbose_name=_("Archived status"))
+    title = models.CharField(max_length=100, verbose_name=_("Name"))
+    keywords = models.TextField(blank=True, default="", verbose_name=_("Keywords"))
+    body = models.TextField(blank=True, default="", verbose_name=_("Description"))
+
+    class Meta:
+        verbose_name = _("Product search document")
+        verbose_name_plural = _("Product search documents")
+
+    def __str__(self) -> str:
+        return f"ProductSearchDocument(product_id={self.product_id}, title={self.title[:20]})"
+
+    @classmethod
+    def refresh(cls, product_ids: Iterable[int]) -> None:
+        """Пересобирает документы поиска для указанных товаров"""
+
+        product_ids = set(product_ids)
+        if not product_ids:
+            return
+
+        tags = {}
+        for product_id, tag_name in Product.tags.through.objects.filter(product_id__in=product_ids).values_list(
+            "product_id", "tag__name"
+        ):
+            tags.setdefault(product_id, []).append(tag_name)
+
+        documents = [
+            cls(
+                product_id=product.pk,
+                category_id=product.category_id,
+                archived=product.archived,
+                title=product.name,
+                keywords=" ".join([product.manufacture, *tags.get(product.pk, [])]),
+                body=" ".join(filter(None, [product.short_description, product.description])),
+            )
+            for product in Product.objects.filter(pk__in=product_ids).only(
+                "pk", "category_id", "archived", "name", "manufacture", "short_description", "description"
+            )
+        ]
+
+        cls.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=["category", "archived", "title", "keywords", "body"],
+        )
+
+    @classmethod
+    def rebuild(cls, batch_size: int = 1000) -> int:
+        """Полностью пересобирает документы поиска пачками. Возвращает количество товаров."""
+
+        product_ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+        for start in range(0, len(product_ids), batch_size):
+            cls.refresh(product_ids[start : start + batch_size])
+        return len(product_ids)
+
+
 class NameSpecification(models.Model):
     """
     Модель названия характеристики
@@ -449,34 +736,47 @@ class Viewed(models.Model):
         constraints = [UniqueConstraint(fields=["user", "product"], name="user_product_unique")]
 
     @classmethod
-    def add_viewed_product(cls, product_id: int, user: settings.AUTH_USER_MODEL) -> None:
+    def add_viewed_product(
+        cls, product_id: int, user: settings.AUTH_USER_MODEL, product_name: str | None = None
+    ) -> None:
         """
         Добавляет или обновляет товар в списке просмотренных текущим пользователем.
-        Если товар просматривается текущим пользователем в первый раз,
-        то увеличивается его количество просмотров.
+        Запись в базу выполняется отложенно (catalog.history), а последние просмотры
+        сразу обновляются в кэше. Если товар просматривается текущим пользователем
+        в первый раз, то при записи увеличивается его количество просмотров.
         """
 
-        with transaction.atomic():
-            new_view, created = Viewed.objects.update_or_create(user=user, product_id=product_id)
+        from .history import add_viewed_product
 
-            if created:
-                product = Product.objects.select_for_update().get(id=product_id)
-                product.views += 1
-                product.save()
+        if product_name is None:
+            product_name = Product.objects.values_list("name", flat=True).get(pk=product_id)
+        add_viewed_product(user.pk, product_id, product_name)
 
     @classmethod
-    def viewed_list(cls, user: settings.AUTH_USER_MODEL, limit=20) -> QuerySet:
+    def viewed_list(cls, user: settings.AUTH_USER_MODEL, limit=20) -> list["Viewed"]:
         """
-        Возвращает список просмотренных текущим пользователем товаров (по умолчанию 20)
+        Возвращает список просмотренных текущим пользователем товаров (по умолчанию 20).
+        Последние просмотры берутся из кэша, без запроса к базе.
         """
 
-        return (
-            Viewed.objects.filter(user=user)
-            .select_related("product")
-            .only("product_id", "product__name")
-            .order_by("-created_at")[:limit]
-            .all()
-        )
+        from .history import build_recent
+        from .history import get_recent
+
+        if limit > settings.VIEWED_RECENT_LIMIT:
+            return list(
+                Viewed.objects.filter(user=user)
+                .select_related("product")
+                .only("product_id", "product__name", "created_at")
+                .order_by("-created_at")[:limit]
+            )
+
+        recent = get_recent(user.pk)
+        if recent is None:
+            recent = build_recent(user.pk)
+        return [
+            Viewed(user=user, product=Product(pk=product_id, name=name), created_at=created_at)
+            for product_id, name, created_at in recent[:limit]
+        ]
 
     @classmethod
     def viewed_count(cls, user: settings.AUTH_USER_MODEL) -> int:
@@ -493,16 +793,28 @@ class Viewed(models.Model):
         Проверяет есть ли указанный товар в списке просмотренных
         текущим пользователем
         """
+        from .history import get_recent
+
+        recent = get_recent(user.pk)
+        if recent is not None and any(item[0] == product_id for item in recent):
+            return True
         return Viewed.objects.filter(user=user, product_id=product_id).exists()
 
     @classmethod
     def remove(cls, product_id: int, user: settings.AUTH_USER_MODEL) -> bool:
         """
         Удаляет товар из списка просмотренных текущим пользователем.
+        Просмотры товара, ещё ожидающие в очереди записи, отбрасываются при её записи
+        по отметке об удалении, поэтому отложенная запись не вернёт товар в историю.
         Возвращает логическое значение результата операции.
         """
+        from .history import mark_removed
+        from .history import remove_recent
+
+        mark_removed(user.pk, product_id)
+        removed_recent = remove_recent(user.pk, product_id)
         deleted_rows, deleted_dict = Viewed.objects.filter(user=user, product_id=product_id).delete()
-        return deleted_rows != 0
+        return deleted_rows != 0 or removed_recent
 
 
 class ViewedSession:
@@ -523,16 +835,15 @@ class ViewedSession:
         """
         Добавляет или обновляет товар в списке просмотренных неавторизованным пользователем.
         Если товар просматривается неавторизованным пользователем в первый раз,
-        то увеличивается его количество просмотров.
+        то увеличивается его количество просмотров (через буферизованный счётчик).
         """
 
+        from .counters import get_view_counter
+
         if str(product_id) not in self.viewed:
-            with transaction.atomic():
-                product = Product.objects.select_for_update().get(id=product_id)
-                product.views += 1
-                product.save()
+            get_view_counter().increment(product_id)
 
-        self.viewed[product_id] = timezone.now().__str__()
+        self.viewed[str(product_id)] = timezone.now().__str__()
         self.__save()
 
     def __save(self) -> None:
@@ -0,0 +1,143 @@
+"""
+Таблица предложений продавцов для страницы товара.
+
+Предложения (продавец, цена, остаток, способы доставки и оплаты) строятся одним
+запросом к базе, уже отсортированными по цене, и кэшируются с тегом товара,
+поэтому шаблон выводит готовые значения без перебора цен продавцов. Таблицы
+нескольких товаров (корзина) читаются и строятся пакетно.
+"""
+
+from dataclasses import dataclass
+from dataclasses import field
+from decimal import Decimal
+from typing import Iterable
+
+from core.cache import OFFER_TABLE
+from core.cache import get_tag_versions
+
+from .models import Delivery
+from .models import Payment
+from .models import Price
+from .models import Seller
+
+
+@dataclass
+class Offer:
+    """Предложение продавца. Способы доставки и оплаты хранятся кодами, чтобы кэш не зависел от языка."""
+
+    seller_id: int
+    seller_name: str
+    image_url: str
+    price: Decimal
+    quantity: int
+    delivery_codes: list[str] = field(default_factory=list)
+    payment_codes: list[str] = field(default_factory=list)
+
+    @property
+    def in_stock(self) -> bool:
+        return self.quantity > 0
+
+    @property
+    def delivery_methods(self) -> list[str]:
+        choices = dict(Delivery.DELIVERY_CHOICES)
+        return [str(choices.get(code, code)) for code in self.delivery_codes]
+
+    @property
+    def payment_methods(self) -> list[str]:
+        choices = dict(Payment.PAYMENT_CHOICES)
+        return [str(choices.get(code, code)) for code in self.payment_codes]
+
+
+@dataclass
+class OfferTable:
+    """Предложения продавцов товара, отсортированные по возрастанию цены"""
+
+    product_id: int
+    offers: list[Offer]
+
+    @property
+    def min_price(self) -> Decimal | None:
+        return self.offers[0].price if self.offers else None
+
+    @property
+    def total_quantity(self) -> int:
+        return sum(offer.quantity for offer in self.offers)
+
+    @property
+    def in_stock(self) -> bool:
+        return any(offer.in_stock for offer in self.offers)
+
+
+def build_offer_tables(product_ids: Iterable[int]) -> dict[int, OfferTable]:
+    """
+    Строит таблицы предложений товаров одним запросом. Способы доставки и оплаты
+    присоединяются к ценам, поэтому строка запроса соответствует сочетанию
+    (продавец, способ доставки, способ оплаты) и повторы схлопываются здесь.
+    """
+
+    product_ids = list(product_ids)
+    rows = (
+        Price.objects.filter(product_id__in=product_ids)
+        .order_by("product_id", "price", "seller_id", "seller__delivery_methods__id", "seller__payment_methods__id")
+        .values_list(
+            "product_id",
+            "seller_id",
+            "seller__name",
+            "seller__image",
+            "price",
+            "quantity",
+            "seller__delivery_methods__name",
+            "seller__payment_methods__name",
+        )
+    )
+
+    storage = Seller._meta.get_field("image").storage
+    offers: dict[int, dict[int, Offer]] = {product_id: {} for product_id in product_ids}
+    for product_id, seller_id, name, image, price, quantity, delivery, payment in rows:
+        offer = offers[product_id].get(seller_id)
+        if offer is None:
+            offer = offers[product_id][seller_id] = Offer(
+                seller_id=seller_id,
+                seller_name=name,
+                image_url=storage.url(image) if image else "",
+                price=price,
+                quantity=quantity,
+            )
+        if delivery is not None and delivery not in offer.delivery_codes:
+            offer.delivery_codes.append(delivery)
+        if payment is not None and payment not in offer.payment_codes:
+            offer.payment_codes.append(payment)
+    return {
+        product_id: OfferTable(product_id=product_id, offers=list(product_offers.values()))
+        for product_id, product_offers in offers.items()
+    }
+
+
+def build_offer_table(product_id: int) -> OfferTable:
+    return build_offer_tables([product_id])[product_id]
+
+
+def get_offer_table(product_id: int) -> OfferTable:
+    """Возвращает таблицу предложений товара из кэша или строит её"""
+    return OFFER_TABLE.get_or_set(lambda: build_offer_table(product_id), pk=product_id)
+
+
+def get_offer_tables(product_ids: Iterable[int]) -> dict[int, OfferTable]:
+    """
+    Возвращает таблицы предложений нескольких товаров: найденные в кэше читаются
+    одним запросом к кэшу, недостающие строятся одним запросом к базе.
+    """
+
+    product_ids = list(dict.fromkeys(product_ids))
+    tables = {}
+    for product_id, (hit, table) in zip(product_ids, OFFER_TABLE.lookup_many([{"pk": pk} for pk in product_ids])):
+        if hit:
+            tables[product_id] = table
+
+    missing = [product_id for product_id in product_ids if product_id not in tables]
+    if missing:
+        versions = {product_id: get_tag_versions(OFFER_TABLE.make_tags(pk=product_id)) for product_id in missing}
+        for product_id, table in build_offer_tables(missing).items():
+            OFFER_TABLE.store(table, versions[product_id], pk=product_id)
+            tables[product_id] = table
+    return tables
@@ -0,0 +1,4 @@
+from .backends import get_search_backend
+from .backends import tokenize
+
+__all__ = ["get_search_backend", "tokenize"]
@@ -0,0 +1,259 @@
+import bisect
+import math
+import re
+import threading
+from functools import lru_cache
+from typing import Iterable
+
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.cache import cache
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from website import settings
+
+from ..models import ProductSearchDocument
+from ..models import product_search_vector
+from ..models import search_document_indexes
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str | None) -> list[str]:
+    """Разбивает текст на нормализованные слова (нижний регистр, "ё" -> "е")"""
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower().replace("ё", "е"))
+
+
+class BaseSearchBackend:
+    """
+    Базовый класс поискового бэкенда товаров.
+    Бэкенд ищет по документам ProductSearchDocument и возвращает id товаров,
+    отсортированные по релевантности.
+    """
+
+    def search(self, query: str, category_id: int | None = None, limit: int | None = 50) -> list[tuple[int, float]]:
+        """
+        Возвращает список пар (id товара, релевантность) по убыванию релевантности,
+        не больше limit пар (limit=None — без ограничения)
+        """
+        raise NotImplementedError
+
+    def search_ids(self, query: str, category_id: int | None = None, limit: int | None = 50) -> list[int]:
+        """Возвращает только id найденных товаров"""
+        return [product_id for product_id, _ in self.search(query, category_id, limit)]
+
+    def update(self, product_ids: Iterable[int]) -> None:
+        """Пересобирает документы поиска для изменившихся товаров"""
+        ProductSearchDocument.refresh(product_ids)
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Сообщает бэкенду, что документы поиска изменились"""
+
+    def rebuild(self) -> int:
+        """Полностью пересобирает поисковый индекс. Возвращает количество товаров."""
+        total = ProductSearchDocument.rebuild()
+        self.invalidate()
+        return total
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Поиск средствами PostgreSQL: взвешенный tsvector с GIN-индексом и префиксным
+    совпадением слов; если ничего не найдено — триграммный поиск по названию,
+    который допускает опечатки.
+
+    Attributes:
+        trigram_threshold: минимальная схожесть названия при поиске по триграммам
+    """
+
+    trigram_threshold = 0.3
+
+    def search(self, query: str, category_id: int | None = None, limit: int | None = 50) -> list[tuple[int, float]]:
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        documents = ProductSearchDocument.objects.filter(archived=False)
+        if category_id is not None:
+            documents = documents.filter(category_id=category_id)
+
+        # слова состоят только из \w, поэтому их безопасно подставлять в raw-запрос
+        search_query = SearchQuery(
+            " & ".join(f"{term}:*" for term in terms),
+            search_type="raw",
+            config=settings.SEARCH_TEXT_CONFIG,
+        )
+        vector = product_search_vector()
+        results = list(
+            documents.alias(vector=vector)
+            .filter(vector=search_query)
+            .annotate(rank=SearchRank(vector, search_query))
+            .order_by("-rank", "pk")
+            .values_list("pk", "rank")[:limit]
+        )
+        if results:
+            return results
+
+        phrase = " ".join(terms)
+        return list(
+            documents.filter(title__trigram_word_similar=phrase)
+            .annotate(rank=TrigramWordSimilarity(phrase, "title"))
+            .filter(rank__gte=self.trigram_threshold)
+            .order_by("-rank", "pk")
+            .values_list("pk", "rank")[:limit]
+        )
+
+
+def create_postgres_search_schema(using: str) -> None:
+    """
+    Включает расширение pg_trgm и создаёт недостающие GIN-индексы документов поиска.
+    На других СУБД ничего не делает.
+    """
+
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    table = ProductSearchDocument._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        existing = connection.introspection.get_constraints(cursor, table)
+    with connection.schema_editor() as schema_editor:
+        for index in search_document_indexes():
+            if index.name not in existing:
+                schema_editor.add_index(ProductSearchDocument, index)
+
+
+class InvertedIndex:
+    """
+    Инвертированный индекс в памяти: слово -> {id товара: вес}.
+    Отсортированный словарь используется для поиска по префиксу, а словарь удалений
+    (все варианты слова без одной буквы) — для поиска с одной опечаткой.
+    """
+
+    FIELD_WEIGHTS = {"title": 3.0, "keywords": 2.0, "body": 1.0}
+    MAX_EXPANSIONS = 50
+    PREFIX_FACTOR = 0.8
+    TYPO_FACTOR = 0.5
+    MIN_TYPO_LENGTH = 4
+
+    def __init__(self, documents: Iterable[ProductSearchDocument]):
+        self.postings: dict[str, dict[int, float]] = {}
+        self.documents: dict[int, tuple[int, bool]] = {}
+        for document in documents:
+            self.documents[document.pk] = (document.category_id, document.archived)
+            for field, weight in self.FIELD_WEIGHTS.items():
+                for token in tokenize(getattr(document, field)):
+                    postings = self.postings.setdefault(token, {})
+                    postings[document.pk] = postings.get(document.pk, 0) + weight
+
+        self.vocabulary = sorted(self.postings)
+        self.deletions: dict[str, set[str]] = {}
+        for token in self.vocabulary:
+            if len(token) >= self.MIN_TYPO_LENGTH - 1:
+                for variant in {token, *self.deletion_variants(token)}:
+                    self.deletions.setdefault(variant, set()).add(token)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def deletion_variants(token: str) -> tuple[str, ...]:
+        return tuple(token[:position] + token[position + 1 :] for position in range(len(token)))
+
+    def expand(self, term: str) -> list[tuple[str, float]]:
+        """Возвращает слова словаря, подходящие под слово запроса, с коэффициентом совпадения"""
+
+        expansions = []
+        if term in self.postings:
+            expansions.append((term, 1.0))
+
+        position = bisect.bisect_right(self.vocabulary, term)
+        while position < len(self.vocabulary) and len(expansions) < self.MAX_EXPANSIONS:
+            token = self.vocabulary[position]
+            if not token.startswith(term):
+                break
+            expansions.append((token, self.PREFIX_FACTOR))
+            position += 1
+
+        if not expansions and len(term) >= self.MIN_TYPO_LENGTH:
+            candidates = set()
+            for variant in {term, *self.deletion_variants(term)}:
+                candidates |= self.deletions.get(variant, set())
+            expansions = [(token, self.TYPO_FACTOR) for token in sorted(candidates)[: self.MAX_EXPANSIONS]]
+        return expansions
+
+    def search(self, query: str, category_id: int | None = None, limit: int | None = 50) -> list[tuple[int, float]]:
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        total = len(self.documents) or 1
+        scores: dict[int, float] | None = None
+        for term in terms:
+            term_scores: dict[int, float] = {}
+            for token, factor in self.expand(term):
+                postings = self.postings[token]
+                idf = math.log(1 + total / len(postings))
+                for product_id, weight in postings.items():
+                    score = weight * idf * factor
+                    if score > term_scores.get(product_id, 0):
+                        term_scores[product_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    product_id: score + term_scores[product_id]
+                    for product_id, score in scores.items()
+                    if product_id in term_scores
+                }
+            if not scores:
+                return []
+
+        results = [
+            (product_id, score)
+            for product_id, score in scores.items()
+            if not self.documents[product_id][1]
+            and (category_id is None or self.documents[product_id][0] == int(category_id))
+        ]
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results[:limit]
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """
+    Поиск по инвертированному индексу в памяти процесса (SQLite, разработка, тесты).
+    Индекс строится из ProductSearchDocument и перестраивается, когда меняется
+    номер версии в кэше, поэтому изменения товаров видны всем процессам.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index: InvertedIndex | None = None
+        self._version = None
+
+    def invalidate(self) -> None:
+        try:
+            cache.incr(settings.SEARCH_INDEX_VERSION_KEY)
+        except ValueError:
+            cache.set(settings.SEARCH_INDEX_VERSION_KEY, 1, timeout=None)
+
+    def get_index(self) -> InvertedIndex:
+        version = cache.get(settings.SEARCH_INDEX_VERSION_KEY, 0)
+        if self._index is None or version != self._version:
+            with self._lock:
+                if self._index is None or version != self._version:
+                    self._index = InvertedIndex(ProductSearchDocument.objects.all())
+                    self._version = version
+        return self._index
+
+    def search(self, query: str, category_id: int | None = None, limit: int | None = 50) -> list[tuple[int, float]]:
+        return self.get_index().search(query, category_id, limit)
+
+
+@lru_cache(maxsize=None)
+def get_search_backend() -> BaseSearchBackend:
+    """Возвращает экземпляр поискового бэкенда из настройки SEARCH_BACKEND"""
+    return import_string(settings.SEARCH_BACKEND)()
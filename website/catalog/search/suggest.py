@@ -0,0 +1,150 @@
+import bisect
+import re
+import threading
+
+from django.core.cache import cache
+
+from website import settings
+
+from ..models import Category
+from ..models import Product
+
+PRODUCT = "product"
+MANUFACTURE = "manufacture"
+CATEGORY = "category"
+
+# порядок типов подсказок при одинаковом совпадении
+KIND_PRIORITY = {CATEGORY: 0, MANUFACTURE: 1, PRODUCT: 2}
+
+SPACES_RE = re.compile(r"\s+")
+
+
+def normalize(text: str | None) -> str:
+    """Приводит строку к виду для сравнения по префиксу (нижний регистр, "ё" -> "е", одиночные пробелы)"""
+    if not text:
+        return ""
+    return SPACES_RE.sub(" ", text.lower().replace("ё", "е")).strip()
+
+
+class AutocompleteIndex:
+    """
+    Индекс подсказок для автодополнения по названиям товаров, производителям и категориям.
+
+    Хранится как отсортированный массив ключей: для каждой подсказки ключами служат
+    её нормализованное название и все его окончания, начинающиеся с нового слова
+    ("apple iphone 15" -> "apple iphone 15", "iphone 15", "15"). Поиск по префиксу —
+    это бинарный поиск начала диапазона и просмотр подряд идущих ключей.
+
+    Attributes:
+        entries: подсказки (тип, id, подпись, вес); id производителя равен None
+        keys: отсортированные ключи
+        refs: для каждого ключа — (номер подсказки, совпадает ли ключ с началом названия)
+        version: версия данных, для которой построен индекс
+    """
+
+    MAX_SCAN = 2000
+
+    def __init__(self, entries: list[tuple], keys: list[str], refs: list[tuple[int, bool]], version=None):
+        self.entries = entries
+        self.keys = keys
+        self.refs = refs
+        self.version = version
+
+    @classmethod
+    def build(cls, version=None) -> "AutocompleteIndex":
+        """Строит индекс двумя запросами по не архивным товарам и категориям"""
+
+        entries = []
+        manufactures = {}
+        for pk, name, manufacture, sold_total in Product.objects.filter(archived=False).values_list(
+            "pk", "name", "manufacture", "listing__sold_total"
+        ):
+            entries.append((PRODUCT, pk, name, sold_total or 0))
+            if manufacture:
+                manufactures[manufacture] = manufactures.get(manufacture, 0) + (sold_total or 0)
+        entries.extend((MANUFACTURE, None, name, weight) for name, weight in manufactures.items())
+        entries.extend(
+            (CATEGORY, pk, name, 0) for pk, name in Category.objects.filter(archived=False).values_list("pk", "name")
+        )
+
+        pairs = []
+        for number, (_, _, label, _) in enumerate(entries):
+            key = normalize(label)
+            if not key:
+                continue
+            pairs.append((key, number, True))
+            for position, char in enumerate(key):
+                if char == " ":
+                    pairs.append((key[position + 1 :], number, False))
+        pairs.sort()
+        return cls(
+            entries,
+            [key for key, _, _ in pairs],
+            [(number, is_start) for _, number, is_start in pairs],
+            version,
+        )
+
+    def suggest(self, query: str, limit: int = 10) -> list[dict]:
+        """
+        Возвращает подсказки, в названии которых есть слово, начинающееся с запроса.
+        Сначала идут подсказки, название которых начинается с запроса, затем — по типу
+        и по весу (количеству продаж).
+        """
+
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        matches: dict[int, bool] = {}
+        position = bisect.bisect_left(self.keys, prefix)
+        end = min(len(self.keys), position + self.MAX_SCAN)
+        while position < end and self.keys[position].startswith(prefix):
+            number, is_start = self.refs[position]
+            matches[number] = matches.get(number, False) or is_start
+            position += 1
+
+        def rank(number: int) -> tuple:
+            kind, _, label, weight = self.entries[number]
+            return not matches[number], KIND_PRIORITY[kind], -weight, label
+
+        return [
+            {"type": kind, "id": pk, "label": label}
+            for kind, pk, label, _ in (self.entries[number] for number in sorted(matches, key=rank)[:limit])
+        ]
+
+
+_lock = threading.Lock()
+_index: AutocompleteIndex | None = None
+
+
+def get_autocomplete_index() -> AutocompleteIndex:
+    """
+    Возвращает индекс подсказок текущего процесса.
+
+    Процесс хранит индекс в памяти и сверяет его версию с номером в кэше. Если версия
+    изменилась, индекс загружается из снимка в кэше, а если снимка актуальной версии
+    нет — строится из базы и сохраняется в кэш для остальных процессов.
+    """
+
+    global _index
+    version = cache.get(settings.SUGGEST_INDEX_VERSION_KEY, 0)
+    if _index is not None and _index.version == version:
+        return _index
+
+    with _lock:
+        if _index is not None and _index.version == version:
+            return _index
+        index = cache.get(settings.SUGGEST_INDEX_KEY)
+        if index is None or index.version != version:
+            index = AutocompleteIndex.build(version)
+            cache.set(settings.SUGGEST_INDEX_KEY, index, timeout=None)
+        _index = index
+    return _index
+
+
+def invalidate_autocomplete_index() -> None:
+    """Увеличивает версию индекса подсказок; процессы перестроят или загрузят его при следующем запросе"""
+    try:
+        cache.incr(settings.SUGGEST_INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(settings.SUGGEST_INDEX_VERSION_KEY, 1, timeout=None)
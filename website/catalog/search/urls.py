@@ -0,0 +1,11 @@
+from django.urls import path
+
+from .views import ProductSearchAPIView
+from .views import SuggestAPIView
+
+app_name = "search"
+
+urlpatterns = [
+    path("", ProductSearchAPIView.as_view(), name="products"),
+    path("suggest/", SuggestAPIView.as_view(), name="suggest"),
+]
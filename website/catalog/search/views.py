@@ -0,0 +1,82 @@
+from discount.models import Discount
+from django.db.models import F
+from django.urls import reverse
+from rest_framework.permissions import AllowAny
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..models import Product
+from ..serializers import ProductSearchSerializer
+from .backends import get_search_backend
+from .suggest import CATEGORY
+from .suggest import PRODUCT
+from .suggest import get_autocomplete_index
+
+
+class LimitMixin:
+    default_limit = 20
+    max_limit = 100
+
+    def get_limit(self, request: Request) -> int:
+        try:
+            limit = int(request.query_params.get("limit", self.default_limit))
+        except ValueError:
+            return self.default_limit
+        return max(1, min(limit, self.max_limit))
+
+
+class ProductSearchAPIView(LimitMixin, APIView):
+    """
+    API поиска товаров с ранжированием по релевантности.
+
+    Параметры запроса:
+        q (str): поисковая строка (поддерживаются префиксы слов и опечатки)
+        category (int): id категории для поиска внутри неё (необязательно)
+        limit (int): максимальное количество результатов (по умолчанию 20, не больше 100)
+    """
+
+    permission_classes = (AllowAny,)
+
+    def get(self, request: Request) -> Response:
+        query = request.query_params.get("q", "")
+        category_id = request.query_params.get("category")
+        if category_id is not None and not category_id.isdigit():
+            category_id = None
+
+        ranks = dict(get_search_backend().search(query, category_id=category_id, limit=self.get_limit(request)))
+        products = Product.objects.filter(pk__in=ranks).annotate(price=F("listing__min_price"))
+        products = sorted(products, key=lambda product: (-ranks[product.pk], product.pk))
+        discounts = Discount.get_priority_discounts_bulk(ranks)
+        for product in products:
+            product.rank = ranks[product.pk]
+            product.discounted_price = discounts.get(product.pk, {}).get("discounted_price")
+
+        serializer = ProductSearchSerializer(products, many=True, context={"request": request})
+        return Response({"query": query, "results": serializer.data})
+
+
+class SuggestAPIView(LimitMixin, APIView):
+    """
+    API автодополнения по всему каталогу: названия товаров, производители и категории.
+    Отвечает из индекса в памяти процесса без запросов к базе данных.
+
+    Параметры запроса:
+        q (str): начало слова или фразы
+        limit (int): максимальное количество подсказок (по умолчанию 10, не больше 20)
+    """
+
+    permission_classes = (AllowAny,)
+    authentication_classes = ()
+    default_limit = 10
+    max_limit = 20
+
+    def get(self, request: Request) -> Response:
+        query = request.query_params.get("q", "")
+        suggestions = get_autocomplete_index().suggest(query, limit=self.get_limit(request))
+        for suggestion in suggestions:
+            if suggestion["type"] == PRODUCT:
+                suggestion["url"] = reverse("catalog:product_detail", kwargs={"pk": suggestion["id"]})
+            elif suggestion["type"] == CATEGORY:
+                suggestion["url"] = reverse("catalog:catalog", kwargs={"pk": suggestion["id"]})
+        return Response({"query": query, "results": suggestions})
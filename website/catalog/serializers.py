@@ -27,3 +27,29 @@ class ViewedSerializer(serializers.ModelSerializer):
     class Meta:
         model = Viewed
         fields = "__all__"
+
+
+class ProductSearchSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор результата поиска товаров
+    """
+
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, allow_null=True)
+    discounted_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, allow_null=True)
+    url = serializers.CharField(source="get_absolute_url", read_only=True)
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            "id",
+            "name",
+            "short_description",
+            "manufacture",
+            "category",
+            "preview",
+            "price",
+            "discounted_price",
+            "url",
+            "rank",
+        ]
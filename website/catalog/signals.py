@@ -1,18 +1,168 @@
-from django.core.cache import cache
+from core.cache import invalidate_tags
+from django.db import transaction
+from django.db.models.signals import m2m_changed
 from django.db.models.signals import post_delete
+from django.db.models.signals import post_migrate
 from django.db.models.signals import post_save
+from django.db.models.signals import pre_save
 from django.dispatch import receiver
 
-from website.settings import CATEGORY_KEY
-
 from .models import Category
+from .models import Price
+from .models import Product
+from .models import ProductListing
+from .models import Review
+from .models import Specification
+from .models import Tag
+from .search import get_search_backend
+from .search.backends import create_postgres_search_schema
+from .search.suggest import invalidate_autocomplete_index
+from .top_products import update_top_products
 
 
-@receiver(post_save, sender=Category)
-def category_post_save_handler(sender, **kwargs):
-    cache.delete(CATEGORY_KEY)
+def refresh_listing(product_ids) -> None:
+    """Пересчитывает витрину каталога и, если нужно, рейтинг топ-товаров"""
+    ProductListing.refresh(product_ids)
+    update_top_products(product_ids)
+
+
+@receiver(post_save, sender=Product)
+def product_listing_post_save_handler(sender, instance: Product, **kwargs):
+    """Создаёт или обновляет строку витрины каталога при сохранении товара"""
+    refresh_listing([instance.pk])
+
+
+@receiver(post_save, sender=Price)
+def price_listing_post_save_handler(sender, instance: Price, **kwargs):
+    """Пересчитывает цены и продажи товара в витрине каталога"""
+    refresh_listing([instance.product_id])
+
+
+@receiver(post_delete, sender=Price)
+def price_listing_post_delete_handler(sender, instance: Price, **kwargs):
+    """
+    Пересчитывает витрину после удаления цены. Пересчёт откладывается до коммита,
+    т.к. цена может удаляться каскадно вместе с самим товаром.
+    """
+    product_id = instance.product_id
+    transaction.on_commit(lambda: refresh_listing([product_id]))
+
+
+@receiver(post_save, sender=Review)
+def review_listing_post_save_handler(sender, instance: Review, created: bool, **kwargs):
+    """Увеличивает количество отзывов товара в витрине каталога"""
+    if created:
+        ProductListing.change_review_count(instance.product_id, 1)
+
+
+@receiver(post_delete, sender=Review)
+def review_listing_post_delete_handler(sender, instance: Review, **kwargs):
+    """Уменьшает количество отзывов товара в витрине каталога"""
+    ProductListing.change_review_count(instance.product_id, -1)
+
+
+def invalidate_categories(category_ids) -> None:
+    """Сбрасывает индексы фасетов и результаты фильтрации категорий"""
+    invalidate_tags(*(f"category:{category_id}" for category_id in set(category_ids)))
+
+
+def invalidate_all_categories() -> None:
+    invalidate_categories(Category.objects.values_list("pk", flat=True))
+
+
+def invalidate_product_facets(product_ids) -> None:
+    """Сбрасывает индексы фасетов и результаты фильтрации категорий, к которым относятся товары"""
+    invalidate_categories(Product.objects.filter(pk__in=product_ids).values_list("category_id", flat=True))
+
+
+@receiver(pre_save, sender=Product)
+def product_category_pre_save_handler(sender, instance: Product, **kwargs):
+    """Запоминает прежнюю категорию товара: при переносе товара сбрасываются обе категории"""
+    if not instance._state.adding:
+        instance._previous_category_id = (
+            Product.objects.filter(pk=instance.pk).values_list("category_id", flat=True).first()
+        )
+
 
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_facets_handler(sender, instance: Product, **kwargs):
+    previous_category_id = getattr(instance, "_previous_category_id", None)
+    invalidate_categories([instance.category_id] + ([previous_category_id] if previous_category_id else []))
 
+
+@receiver(post_save, sender=Price)
+@receiver(post_delete, sender=Price)
+@receiver(post_save, sender=Specification)
+@receiver(post_delete, sender=Specification)
+def product_related_facets_handler(sender, instance: Price | Specification, **kwargs):
+    invalidate_product_facets([instance.product_id])
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_filter_cache_handler(sender, instance: Review, **kwargs):
+    """Количество отзывов влияет на сортировку отфильтрованного каталога"""
+    invalidate_product_facets([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def product_tags_facets_handler(sender, instance: Product | Tag, action: str, reverse: bool, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        invalidate_categories([instance.category_id])
+    elif pk_set:
+        invalidate_product_facets(pk_set)
+    else:
+        invalidate_all_categories()
+
+
+@receiver(post_save, sender=Product)
+def product_search_post_save_handler(sender, instance: Product, **kwargs):
+    """Обновляет документ полнотекстового поиска товара"""
+    get_search_backend().update([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_top_post_delete_handler(sender, instance: Product, **kwargs):
+    """Удалённый товар мог быть в рейтинге топ-товаров"""
+    update_top_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_search_post_delete_handler(sender, instance: Product, **kwargs):
+    get_search_backend().invalidate()
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def product_tags_search_handler(sender, instance: Product | Tag, action: str, reverse: bool, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        get_search_backend().update([instance.pk])
+    else:
+        get_search_backend().update(pk_set or instance.products.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Tag)
+def tag_search_handler(sender, instance: Tag, created: bool, **kwargs):
+    """Название тега входит в документы поиска всех товаров с этим тегом"""
+    if not created:
+        get_search_backend().update(instance.products.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
 @receiver(post_delete, sender=Category)
-def category_post_delete_handler(sender, **kwargs):
-    cache.delete(CATEGORY_KEY)
+def autocomplete_index_handler(sender, **kwargs):
+    """Названия товаров, производителей и категорий входят в индекс подсказок"""
+    invalidate_autocomplete_index()
+
+
+@receiver(post_migrate)
+def search_schema_post_migrate_handler(sender, using: str, **kwargs):
+    """Индексы поиска PostgreSQL создаются после миграций приложения catalog"""
+    if sender.label == "catalog":
+        create_postgres_search_schema(using)
@@ -0,0 +1,28 @@
+from catalog.counters import get_view_counter
+from catalog.history import get_viewed_queue
+
+from website.celery import app
+
+
+@app.task
+def flush_product_views() -> int:
+    """
+    Переносит накопленные просмотры товаров в Product.views.
+    Запускается периодически (CELERY_BEAT_SCHEDULE).
+
+    Возвращает:
+        int: количество обновлённых товаров
+    """
+    return get_view_counter().flush()
+
+
+@app.task
+def flush_viewed_history() -> int:
+    """
+    Записывает очередь просмотров авторизованных пользователей в Viewed.
+    Запускается периодически (CELERY_BEAT_SCHEDULE).
+
+    Возвращает:
+        int: количество записанных пар (пользователь, товар)
+    """
+    return get_viewed_queue().flush()
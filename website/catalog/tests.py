@@ -1,12 +1,49 @@
+import io
+from datetime import timedelta
+from decimal import Decimal
 from http import HTTPStatus
+from unittest import mock
 
+from catalog import facets
+from catalog.counters import LocalViewCounter
+from catalog.facets import CategoryFacetIndex
+from catalog.filter_cache import CatalogFilterCache
+from catalog.history import LocalViewedQueue
+from catalog.models import Category
 from catalog.models import Price
 from catalog.models import Product
+from catalog.models import ProductListing
+from catalog.models import Seller
+from catalog.models import Specification
+from catalog.models import Viewed
+from catalog.offer_table import build_offer_table
+from catalog.offer_table import get_offer_table
+from catalog.search.backends import InMemorySearchBackend
+from catalog.search.suggest import get_autocomplete_index
+from catalog.search.suggest import invalidate_autocomplete_index
+from catalog.views import CatalogListView
+from core.cache import CATALOG_FILTER
+from core.cache import CATEGORY_FACETS
 from custom_auth.models import CustomUser
+from discount import rules
+from discount.models import Discount
+from discount.models import EffectivePrice
+from django.core.cache import cache
+from django.core.management import call_command
 from django.http import HttpResponseNotFound
 from django.template.response import TemplateResponse
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
+from django.utils import translation
+
+from website.settings import SUGGEST_INDEX_KEY
+from website.settings import VIEWED_FLUSH_LOCK_KEY
+
+
+def catalog_url(category_id: int) -> str:
+    with translation.override("en"):
+        return reverse("catalog:catalog", kwargs={"pk": category_id})
 
 
 class ProductDetailTestCase(TestCase):
@@ -72,3 +109,449 @@ class ProductDetailTestCase(TestCase):
     @classmethod
     def tearDownClass(cls):
         CustomUser.objects.all().delete()
+        super().tearDownClass()
+
+
+class ProductListingTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def check_listing(self, product: Product) -> None:
+        prices = Price.objects.filter(product=product)
+        listing = ProductListing.objects.get(product=product)
+        self.assertEqual(listing.min_price, min((price.price for price in prices), default=None))
+        self.assertEqual(listing.sold_total, sum(price.sold_quantity for price in prices))
+        self.assertEqual(listing.review_count, product.review.count())
+        self.assertEqual(listing.category_id, product.category_id)
+
+    def test_listing_built_for_all_products(self):
+        for product in Product.objects.all():
+            self.check_listing(product)
+
+    def test_listing_follows_price_changes(self):
+        price = Price.objects.filter(product_id=1).first()
+        price.price = 1
+        price.sold_quantity = 5
+        price.save()
+        self.check_listing(price.product)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            price.delete()
+        self.check_listing(Product.objects.get(pk=1))
+
+    def test_rebuild_fills_missing_listing(self):
+        ProductListing.objects.filter(product_id=1).delete()
+        category_id = Product.objects.get(pk=1).category_id
+        cache.clear()
+        self.assertNotIn(1, [product.pk for product in self.client.get(catalog_url(category_id)).context["products"]])
+
+        call_command("rebuild_product_listing", stdout=io.StringIO())
+        self.check_listing(Product.objects.get(pk=1))
+        cache.clear()
+        self.assertIn(1, [product.pk for product in self.client.get(catalog_url(category_id)).context["products"]])
+
+    def test_catalog_sorted_by_listing_price(self):
+        category_id = Product.objects.get(pk=1).category_id
+        response = self.client.get(catalog_url(category_id), {"sort": "price"})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        prices = [product.price for product in response.context["products"]]
+        self.assertEqual(prices, sorted(prices))
+
+    @mock.patch.object(rules, "_rules", None)
+    def test_catalog_and_search_show_discounted_prices(self):
+        product = Product.objects.get(pk=1)
+        discount = Discount.objects.create(
+            name="catalog",
+            kind=Discount.PRODUCT,
+            method=Discount.PERCENT,
+            percent=Decimal(50),
+            end_date=timezone.now().date() + timedelta(days=1),
+        )
+        discount.products.add(product)
+        EffectivePrice.refresh([product.pk])
+        discounted_price = EffectivePrice.for_products([product.pk])[product.pk].discounted_price
+
+        response = self.client.get(catalog_url(product.category_id))
+        products = {product.pk: product for product in response.context["products"]}
+        self.assertEqual(products[product.pk].discounted_price, discounted_price)
+        self.assertContains(response, "Card-priceOld")
+
+        with translation.override("en"):
+            url = reverse("search:products")
+        results = self.client.get(url, {"q": "honor"}).json()["results"]
+        self.assertIn(str(discounted_price), [result["discounted_price"] for result in results])
+
+    def test_catalog_cursor_mode(self):
+        category_id = Product.objects.get(pk=1).category_id
+        url = catalog_url(category_id)
+        response = self.client.get(url, {"sort": "-price", "cursor": ""})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.context["keyset_pagination"])
+        self.assertEqual(
+            [product.pk for product in response.context["products"]],
+            [product.pk for product in self.client.get(url, {"sort": "-price"}).context["products"]],
+        )
+
+
+class CategoryFacetIndexTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        self.category_id = Product.objects.get(pk=1).category_id
+        self.products = Product.objects.filter(category_id=self.category_id, archived=False)
+        self.index = CategoryFacetIndex.build(self.category_id)
+
+    def matched(self, selected: dict) -> set[int]:
+        return set(self.index.product_ids_for(self.index.match(selected)))
+
+    def test_match_equals_database_filters(self):
+        seller = Price.objects.filter(product__category_id=self.category_id).first().seller
+        specification = Specification.objects.filter(product__category_id=self.category_id).first()
+
+        expected = set(self.products.filter(prices__seller=seller).values_list("pk", flat=True))
+        self.assertEqual(self.matched({facets.SELLER: [str(seller.pk)]}), expected)
+
+        expected &= set(self.products.filter(specifications__value=specification.value).values_list("pk", flat=True))
+        selected = {facets.SELLER: [str(seller.pk)], facets.SPECIFICATION: [specification.value]}
+        self.assertEqual(self.matched(selected), expected)
+
+    def test_counts_exclude_own_facet(self):
+        manufacture = self.products.first().manufacture
+        counts = self.index.counts({facets.MANUFACTURE: [manufacture]})
+        for value, count in counts[facets.MANUFACTURE].items():
+            self.assertEqual(count, self.products.filter(manufacture=value).count())
+
+    def test_index_invalidated_on_change(self):
+        CategoryFacetIndex.get(self.category_id)
+        Product.objects.filter(category_id=self.category_id).first().save()
+        self.assertIsNone(CATEGORY_FACETS.get(category_id=self.category_id))
+
+    def test_product_moved_between_categories(self):
+        product = self.products.first()
+        other_category = Category.objects.exclude(pk=self.category_id).first()
+        for category_id in (self.category_id, other_category.pk):
+            CategoryFacetIndex.get(category_id)
+            CATALOG_FILTER.set([product.pk], category_id=category_id, signature="all")
+
+        product.category = other_category
+        product.save()
+        for category_id in (self.category_id, other_category.pk):
+            self.assertIsNone(CATEGORY_FACETS.get(category_id=category_id))
+            self.assertIsNone(CATALOG_FILTER.get(category_id=category_id, signature="all"))
+        old_index = CategoryFacetIndex.get(self.category_id)
+        new_index = CategoryFacetIndex.get(other_category.pk)
+        self.assertNotIn(product.pk, old_index.product_ids_for(old_index.match({})))
+        self.assertIn(product.pk, new_index.product_ids_for(new_index.match({})))
+
+    def test_catalog_filter_post(self):
+        manufacture = self.products.first().manufacture
+        self.client.get(catalog_url(self.category_id))
+        response = self.client.post(catalog_url(self.category_id), {"manufacture[]": [manufacture]})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            {product.pk for product in response.context["products"]},
+            set(self.products.filter(manufacture=manufacture).values_list("pk", flat=True)),
+        )
+
+    def test_filter_post_after_cached_page(self):
+        cache.clear()
+        url = catalog_url(self.category_id)
+        self.client.get(url)
+        self.client.get(url, {"sort": "price"})
+
+        visitor = self.client_class()
+        response = visitor.get(url)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        response = visitor.post(url, {"title": ""})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+        response = visitor.get(url, {"sort": "price"})
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertIn("Sort-sortBy_dec", visitor.session["sort_catalog"])
+        self.assertEqual(visitor.post(url, {"title": ""}).status_code, HTTPStatus.OK)
+        self.assertNotContains(self.client.get(url), "Sort-sortBy_dec")
+
+
+class CatalogFilterCacheTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        self.category_id = Product.objects.get(pk=1).category_id
+        self.products = Product.objects.filter(category_id=self.category_id, archived=False)
+
+    def test_signature_is_normalized(self):
+        self.assertEqual(
+            CatalogFilterCache.signature({"seller[]": ["2", "1", "2"], "title": "  Honor  X7 ", "price": None}),
+            CatalogFilterCache.signature({"title": "honor x7", "seller[]": [1, 2], "tags": []}),
+        )
+        self.assertNotEqual(
+            CatalogFilterCache.signature({"sort": "price"}),
+            CatalogFilterCache.signature({"sort": "-price"}),
+        )
+
+    def test_results_invalidated_on_catalog_change(self):
+        other_category_id = Category.objects.exclude(pk=self.category_id).first().pk
+        CATALOG_FILTER.set([1], category_id=self.category_id, signature="test")
+        CATALOG_FILTER.set([2], category_id=other_category_id, signature="test")
+        price = Price.objects.filter(product__category_id=self.category_id).first()
+        price.price += 1
+        price.save()
+        self.assertIsNone(CATALOG_FILTER.get(category_id=self.category_id, signature="test"))
+        self.assertEqual(CATALOG_FILTER.get(category_id=other_category_id, signature="test"), [2])
+
+    def test_catalog_filter_post_uses_cached_ids(self):
+        manufacture = self.products.first().manufacture
+        expected = set(self.products.filter(manufacture=manufacture).values_list("pk", flat=True))
+        self.client.get(catalog_url(self.category_id))
+        self.client.post(catalog_url(self.category_id), {"manufacture[]": [manufacture]})
+
+        calls = []
+        original = CatalogListView.filter_products
+        with mock.patch.object(
+            CatalogListView,
+            "filter_products",
+            lambda view, *args: calls.append(args) or original(view, *args),
+        ):
+            response = self.client.post(catalog_url(self.category_id), {"manufacture[]": [manufacture]})
+        self.assertEqual(calls, [])
+        self.assertEqual({product.pk for product in response.context["products"]}, expected)
+
+
+class InMemorySearchBackendTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        self.backend = InMemorySearchBackend()
+        self.backend.invalidate()
+
+    def test_ranked_word_and_prefix_search(self):
+        found = self.backend.search_ids("geforce 4070")
+        self.assertEqual(set(found), set(Product.objects.filter(name__icontains="RTX 4070").values_list("pk", flat=True)))
+        self.assertEqual(set(self.backend.search_ids("gefo")), set(self.backend.search_ids("geforce")))
+
+    def test_typo_tolerance_and_tags(self):
+        self.assertIn(1, self.backend.search_ids("honr"))
+        self.assertEqual(
+            set(self.backend.search_ids("хит продаж")),
+            set(Product.objects.filter(tags__name="Хит продаж").values_list("pk", flat=True)),
+        )
+
+    def test_category_scope_and_updates(self):
+        product = Product.objects.get(pk=1)
+        self.assertEqual(self.backend.search_ids("honor", category_id=product.category_id + 1), [])
+        product.name = "Совершенно новое название"
+        product.save()
+        self.assertEqual(self.backend.search_ids("совершенно"), [product.pk])
+
+    def test_catalog_title_filter_keeps_relevance(self):
+        cache.clear()
+        category_id = Product.objects.get(pk=8).category_id
+        expected = self.backend.search_ids("rtx", category_id=category_id, limit=None)
+        self.assertNotEqual(expected, sorted(expected))
+
+        response = self.client.post(catalog_url(category_id), {"title": "rtx"})
+        self.assertEqual([product.pk for product in response.context["products"]], expected)
+
+    def test_search_api(self):
+        with translation.override("en"):
+            url = reverse("search:products")
+        response = self.client.get(url, {"q": "iphone"})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual([result["id"] for result in response.json()["results"]], [2])
+
+
+class AutocompleteIndexTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        cache.delete(SUGGEST_INDEX_KEY)
+        invalidate_autocomplete_index()
+
+    def test_prefix_of_any_word(self):
+        index = get_autocomplete_index()
+        product = Product.objects.get(pk=2)
+        word = product.name.split()[-1]
+        found = {(item["type"], item["id"]) for item in index.suggest(word[:3].upper(), limit=50)}
+        self.assertIn(("product", product.pk), found)
+        self.assertEqual(index.suggest("   "), [])
+
+    def test_categories_and_manufactures(self):
+        category = Category.objects.get(name="Видеокарты")
+        suggestions = get_autocomplete_index().suggest("видео")
+        self.assertEqual(suggestions[0], {"type": "category", "id": category.pk, "label": category.name})
+
+        manufacture = Product.objects.values_list("manufacture", flat=True).first()
+        labels = [item["label"] for item in get_autocomplete_index().suggest(manufacture) if item["type"] == "manufacture"]
+        self.assertEqual(labels, [manufacture])
+
+    def test_snapshot_and_refresh(self):
+        index = get_autocomplete_index()
+        self.assertEqual(cache.get(SUGGEST_INDEX_KEY).version, index.version)
+        with self.assertNumQueries(0):
+            get_autocomplete_index().suggest("a")
+
+        Category.objects.filter(name="Видеокарты").get().save()
+        product = Product.objects.get(pk=1)
+        product.name = "Уникальнейший товар"
+        product.save()
+        self.assertEqual(get_autocomplete_index().suggest("уникальн")[0]["id"], product.pk)
+
+    def test_suggest_api(self):
+        with translation.override("en"):
+            url = reverse("search:suggest")
+        response = self.client.get(url, {"q": "телеф"})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        results = response.json()["results"]
+        self.assertEqual([result["type"] for result in results], ["category"])
+        self.assertTrue(results[0]["url"])
+
+
+class ViewCounterTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        self.counter = LocalViewCounter()
+        self.counter.flush_threshold = 10**6
+
+    def views(self, product_id: int) -> int:
+        return Product.objects.get(pk=product_id).views
+
+    def test_flush_adds_buffered_views(self):
+        before = {pk: self.views(pk) for pk in (1, 2, 3)}
+        for product_id, amount in ((1, 3), (2, 3), (3, 1)):
+            self.counter.increment(product_id, amount)
+        self.assertEqual(self.counter.pending(1), 3)
+        self.assertEqual(self.views(1), before[1])
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.counter.flush(), 3)
+        self.assertEqual(self.views(1), before[1] + 3)
+        self.assertEqual(self.views(2), before[2] + 3)
+        self.assertEqual(self.views(3), before[3] + 1)
+        self.assertEqual(self.counter.pending(1), 0)
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_failed_flush_keeps_views(self):
+        self.counter.increment(1, 2)
+        with mock.patch.object(Product.objects, "filter", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.counter.flush()
+        self.assertEqual(self.counter.pending(1), 2)
+
+    def test_product_page_does_not_save_product(self):
+        with translation.override("en"):
+            url = reverse("catalog:product_detail", kwargs={"pk": 1})
+        with mock.patch("catalog.models.Product.save") as save:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        save.assert_not_called()
+
+
+class ViewedHistoryTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username="viewer", email="viewer@example.com", password="viewerpassword")
+        self.queue = LocalViewedQueue()
+        self.queue.flush_threshold = 10**6
+        self.counter = LocalViewCounter()
+        self.counter.flush_threshold = 10**6
+        patcher = mock.patch("catalog.history.get_viewed_queue", return_value=self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("catalog.history.get_view_counter", return_value=self.counter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_flush_writes_history_and_counts_new_views(self):
+        Viewed.objects.create(user=self.user, product_id=1)
+        for product_id in (1, 2, 2, 3):
+            Viewed.add_viewed_product(product_id, self.user)
+        self.assertEqual(Viewed.objects.filter(user=self.user).count(), 1)
+
+        self.assertEqual(self.queue.flush(), 3)
+        self.assertEqual(
+            set(Viewed.objects.filter(user=self.user).values_list("product_id", flat=True)),
+            {1, 2, 3},
+        )
+        self.assertEqual(self.counter.pending(1), 0)
+        self.assertEqual(self.counter.pending(2), 1)
+        self.assertEqual(self.counter.pending(3), 1)
+        self.assertEqual(self.queue.flush(), 0)
+
+    def test_overlapping_flush_waits_for_lock(self):
+        Viewed.add_viewed_product(2, self.user)
+        cache.add(VIEWED_FLUSH_LOCK_KEY, True)
+        self.assertEqual(self.queue.flush(), 0)
+        self.assertFalse(Viewed.objects.filter(user=self.user).exists())
+
+        cache.delete(VIEWED_FLUSH_LOCK_KEY)
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(self.counter.pending(2), 1)
+        self.assertIsNone(cache.get(VIEWED_FLUSH_LOCK_KEY))
+
+    def test_viewed_list_from_cache(self):
+        for product_id in (1, 2, 1):
+            Viewed.add_viewed_product(product_id, self.user)
+        with self.assertNumQueries(0):
+            viewed = Viewed.viewed_list(self.user)
+        self.assertEqual([item.product.pk for item in viewed], [1, 2])
+        self.assertTrue(Viewed.exists(2, self.user))
+
+    def test_remove_drops_queued_view(self):
+        Viewed.add_viewed_product(2, self.user)
+        self.assertTrue(Viewed.remove(2, self.user))
+        self.assertEqual(self.queue.flush(), 0)
+        self.assertFalse(Viewed.exists(2, self.user))
+        self.assertEqual(Viewed.viewed_list(self.user), [])
+
+    def test_remove_does_not_flush_queue(self):
+        Viewed.add_viewed_product(1, self.user)
+        Viewed.add_viewed_product(2, self.user)
+        with mock.patch.object(self.queue, "flush") as flush:
+            self.assertTrue(Viewed.remove(2, self.user))
+        flush.assert_not_called()
+
+        Viewed.add_viewed_product(3, self.user)
+        self.assertEqual(self.queue.flush(), 2)
+        self.assertEqual(set(Viewed.objects.filter(user=self.user).values_list("product_id", flat=True)), {1, 3})
+
+        Viewed.add_viewed_product(2, self.user)
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertTrue(Viewed.objects.filter(user=self.user, product_id=2).exists())
+
+
+class OfferTableTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_build_in_single_query(self):
+        with self.assertNumQueries(1):
+            table = build_offer_table(1)
+        self.assertEqual([offer.seller_id for offer in table.offers], [1, 3, 2])
+        self.assertEqual(table.min_price, Price.objects.get(pk=1).price)
+        self.assertEqual(table.total_quantity, 12 + 23 + 423)
+        cheapest = table.offers[0]
+        self.assertEqual(
+            cheapest.delivery_codes,
+            list(Seller.objects.get(pk=1).delivery_methods.order_by("pk").values_list("name", flat=True)),
+        )
+        self.assertEqual(len(cheapest.payment_codes), 3)
+
+    def test_price_change_invalidates_table(self):
+        self.assertEqual(get_offer_table(1).min_price, Price.objects.get(pk=1).price)
+        with self.assertNumQueries(0):
+            get_offer_table(1)
+        Price.objects.filter(pk=16).update(price=10)
+        Price.objects.get(pk=16).save()
+        table = get_offer_table(1)
+        self.assertEqual(table.min_price, 10)
+        self.assertEqual(table.offers[0].seller_id, 3)
+
+    def test_product_page_renders_offers(self):
+        with translation.override("en"):
+            response = self.client.get(reverse("catalog:product_detail", kwargs={"pk": 1}))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, f"{Price.objects.get(pk=12).price}$")
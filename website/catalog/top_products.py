@@ -0,0 +1,56 @@
+from typing import Iterable
+
+from core.cache import TOP_PRODUCTS
+from core.cache import invalidate_tags
+
+from website.settings import TOP_PRODUCTS_SIZE
+
+from .models import ProductListing
+
+TOP_PRODUCTS_TAG = "top_products"
+
+
+def rank_key(product_id: int, sorting_index: int, sold_total: int) -> tuple[int, int, int]:
+    """Ключ ранжирования: индекс сортировки по возрастанию, затем продажи по убыванию"""
+    return sorting_index, -sold_total, product_id
+
+
+def get_top_products() -> list[tuple[int, int, int]]:
+    """
+    Возвращает рейтинг топ-товаров [(id товара, индекс сортировки, продано)] из кэша
+    или строит его по индексу витрины ProductListing.
+    """
+    return TOP_PRODUCTS.get_or_set(lambda: ProductListing.top(TOP_PRODUCTS_SIZE))
+
+
+def get_top_product_ids() -> list[int]:
+    return [product_id for product_id, _, _ in get_top_products()]
+
+
+def update_top_products(product_ids: Iterable[int]) -> None:
+    """
+    Сбрасывает рейтинг топ-товаров, только если изменение витрины может его изменить:
+    изменившийся товар уже в рейтинге или теперь должен в него попасть.
+    Остальные изменения цен, продаж и товаров рейтинг не затрагивают.
+    """
+
+    top = TOP_PRODUCTS.get()
+    if top is None:
+        return
+
+    product_ids = set(product_ids)
+    if any(product_id in product_ids for product_id, _, _ in top):
+        invalidate_tags(TOP_PRODUCTS_TAG)
+        return
+
+    candidates = ProductListing.objects.filter(product_id__in=product_ids, archived=False).values_list(
+        "product_id", "sorting_index", "sold_total"
+    )
+    if len(top) < TOP_PRODUCTS_SIZE:
+        if candidates.exists():
+            invalidate_tags(TOP_PRODUCTS_TAG)
+        return
+
+    boundary = rank_key(*top[-1])
+    if any(rank_key(*candidate) < boundary for candidate in candidates):
+        invalidate_tags(TOP_PRODUCTS_TAG)
@@ -1,5 +1,7 @@
 import json
 
+SORT_FIELDS = ("price", "rating", "date", "quantity")
+
 
 def category_icon_directory_path(instance: "Category", filename: str) -> str:
     """Путь для сохранения иконки категории"""
@@ -48,6 +50,22 @@ def sort_convert(session, sort):
     Возвращает:
         None
     """
+    session["sort_catalog"] = sort_params(sort)
+
+
+def sort_params(sort):
+    """
+    Генерирует параметры сортировки, в которых выделена сортировка sort.
+
+    Параметры:
+        sort (str): Строка сортировки (например, "price" или "-price"). Если строка пустая,
+            возвращаются начальные параметры сортировки.
+
+    Возвращает:
+        str: JSON-строка в формате generate_sort_param.
+    """
+    if not sort:
+        return generate_sort_param()
     temp = ""
     if "-" in sort:
         sort_param = sort[1:]
@@ -56,11 +74,12 @@ def sort_convert(session, sort):
     else:
         sort_param = f"-{sort}"
         temp = "Sort-sortBy_dec"
-    session["sort_catalog"] = generate_sort_param()
-    session["sort_catalog"][sort] = {
+    sorting = json.loads(generate_sort_param())
+    sorting[sort] = {
         "param": sort_param,
         "style": temp,
     }
+    return json.dumps(sorting)
 
 
 def generate_sort_param():
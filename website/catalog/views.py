@@ -1,19 +1,14 @@
 import json
-from collections import defaultdict
 from itertools import product
 
-from django.core.cache import cache
+from core.cache import PRODUCT
+from core.page_cache import PageCacheMixin
+from core.pagination import KeysetPaginationMixin
+from discount.models import Discount
+from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import (
-    Count,
-    Max,
-    Sum,
-)
-from django.db.models import Min, Q
-from django.db.models import OuterRef
+from django.db.models import F
 from django.db.models import Prefetch
-from django.db.models import Subquery
-from django.db.models.functions import Round
 from django.http import HttpRequest
 from django.shortcuts import render
 from django.utils.translation import gettext_lazy as _
@@ -26,25 +21,29 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from website.settings import PRODUCTS_KEY
-
-from .models import Price
+from . import facets
+from .facets import CategoryFacetIndex
+from .filter_cache import CatalogFilterCache
 from .models import Product
 from .models import ProductImage
-from .models import Seller
 from .models import Specification
 from .models import Tag
 from .models import Viewed
 from .serializers import ViewedSerializer
 from .models import ViewedSession
-from .utils import generate_sort_param, sort_convert
+from .offer_table import get_offer_table
+from .search import get_search_backend
+from .utils import SORT_FIELDS
+from .utils import generate_sort_param
+from .utils import sort_convert
+from .utils import sort_params
 
 
 def catalog_view(request: HttpRequest):
     return render(request, "catalog/catalog.html")
 
 
-class CatalogListView(ListView):
+class CatalogListView(PageCacheMixin, KeysetPaginationMixin, ListView):
     """
     Представление для отображения списка продуктов в каталоге.
 
@@ -57,6 +56,9 @@ class CatalogListView(ListView):
         template_name (str): Путь к шаблону, который будет использоваться для отображения.
         model (Model): Модель, используемая для получения данных (Product).
         context_object_name (str): Имя контекста, под которым будут доступны продукты в шаблоне.
+        keyset_count_limit (int): Предел приблизительного подсчёта товаров в режиме ?cursor=.
+        page_cache (str): Страница в кэше для анонимных посетителей (только GET).
+        search_ranking (dict): Позиции товаров в результатах поиска по названию, если сортировка не выбрана.
 
     """
 
@@ -64,6 +66,16 @@ class CatalogListView(ListView):
     model = Product
     context_object_name = "products"
     paginate_by = 12
+    keyset_count_limit = 1000
+    page_cache = "catalog"
+    search_ranking = None
+
+    @classmethod
+    def page_cache_hit(cls, request: HttpRequest, *args, **kwargs) -> None:
+        """Страница отдана из кэша: сортировка из запроса запоминается в сессии для фильтрации"""
+        sort = request.GET.get("sort")
+        if sort:
+            sort_convert(request.session, sort)
 
     def get_context_data(self, **kwargs):
         """
@@ -80,8 +92,29 @@ class CatalogListView(ListView):
         """
         context = super().get_context_data(**kwargs)
         context.update(self.get_param())
+        context["products"] = self.with_discounts(context["products"])
         return context
 
+    @staticmethod
+    def with_discounts(products):
+        """
+            Добавляет товарам страницы цену со скидкой.
+
+            Приоритетные скидки всех товаров страницы получаются одним запросом
+            (Discount.get_priority_discounts_bulk), а не запросом на карточку.
+
+            Параметры:
+                products (Iterable[Product]): Товары текущей страницы.
+
+            Возвращает:
+                list: Товары с атрибутом discounted_price (None, если у товара нет предложений).
+        """
+        products = list(products)
+        discounts = Discount.get_priority_discounts_bulk(product.pk for product in products)
+        for product in products:
+            product.discounted_price = discounts.get(product.pk, {}).get("discounted_price")
+        return products
+
     def sort_queryset(self, queryset, sort):
         """
             Сортирует набор данных по заданному параметру.
@@ -99,6 +132,21 @@ class CatalogListView(ListView):
         sort_convert(self.request.session, sort)
         return queryset.order_by(sort)
 
+    def get_keyset_ordering(self):
+        """
+            Возвращает ключ сортировки для keyset-пагинации.
+
+            Используется текущий параметр sort (price, rating, date, quantity
+            с необязательным "-"), иначе сортировка по pk.
+
+            Возвращает:
+                str: Поле сортировки.
+        """
+        sort = self.request.GET.get("sort", "")
+        if sort.lstrip("-") in SORT_FIELDS:
+            return sort
+        return "pk"
+
     def get_last_sort(self, session):
         """
             Получает последний использованный параметр сортировки из сессии.
@@ -109,83 +157,65 @@ class CatalogListView(ListView):
             Возвращает:
                 str: Параметр последней сортировки или None, если сортировка не была установлена.
         """
-        sorting = json.loads(session["sort_catalog"])
+        sorting = json.loads(session.get("sort_catalog") or generate_sort_param())
         for key, value in sorting.items():
             if value["style"]:
                 return value["param"]
 
-    def get_param(self):
+    def get_param(self, selected_facets=None):
         """
             Получаем дополнительные параметры для контекста.
 
-            Собирает информацию о продуктах, продавцах, производителях, спецификациях и тегах
-            для текущей категории и возвращает это в виде словаря.
+            Продавцы, производители, характеристики и теги текущей категории берутся
+            из индекса фасетов вместе с количеством товаров для каждого значения.
+            Выделенная сортировка GET-страницы берётся из параметра sort запроса, а не из
+            сессии: страница кэшируется для анонимных посетителей и не должна зависеть от сессии.
+
+            Параметры:
+                selected_facets (dict): Выбранные значения фильтров (для подсчёта количества).
 
             Возвращает:
                 dict: Словарь с дополнительными параметрами для контекста.
         """
 
         category_id = self.kwargs.get("pk")
+        sidebar = CategoryFacetIndex.get(category_id).sidebar(selected_facets)
 
-        products_with_related = Product.objects.prefetch_related("specifications").filter(category__id=category_id)
-
-        sellers = Seller.objects.all()
-        manufactures = products_with_related.values_list("manufacture", flat=True).distinct()
-
-        # Получаем все спецификации для всех продуктов в категории
-        specifications = (
-            Specification.objects.filter(product__in=products_with_related).distinct()
-        )
-
-        # Группируем спецификации по имени
-        grouped_specifications = defaultdict(set)
-        for spec in specifications:
-            grouped_specifications[spec.name.name].add(spec.value)
-
-        # Получить уникальные теги
-        tags = Tag.objects.filter(products__isnull=False).distinct()
-
-        if "sort_catalog" not in self.request.session:
-            self.request.session["sort_catalog"] = generate_sort_param()
-        sorting = json.loads(self.request.session["sort_catalog"])
+        if self.request.method == "GET":
+            sorting = json.loads(sort_params(self.request.GET.get("sort")))
+        else:
+            sorting = json.loads(self.request.session.get("sort_catalog") or generate_sort_param())
 
         return {
-            "sellers": sellers,
-            "manufactures": manufactures,
-            "grouped_specifications": grouped_specifications.items(),
-            "tags": tags,
+            **sidebar,
+            "selected_facets": selected_facets or {},
             "sort": sorting,
             "category_id": category_id,
         }
 
     def get_queryset(self):
         """
-            Получаем список продуктов с учетом кэширования.
+            Получаем список продуктов текущей категории.
 
-            Извлекает список продуктов для текущей категории, используя кэш для
-            повышения производительности. Если кэш пуст, выполняет запрос к базе данных.
+            Цена, продажи, дата и количество отзывов берутся из денормализованной
+            витрины ProductListing, поэтому сортировка и пагинация выполняются
+            индексированным ORDER BY/LIMIT без группировки по ценам и отзывам.
 
             Возвращает:
                 QuerySet: Набор данных с продуктами для текущей категории.
         """
         category_id = self.kwargs.get("pk")
-        cache_key = PRODUCTS_KEY.format(category_id=category_id)
-        queryset = cache.get(cache_key)
-        price_subquery = Price.objects.filter(product=OuterRef("pk")).values("pk")
-        if not queryset:
-            queryset = (
-                Product.objects.filter(category__id=category_id, archived=False)
-                .select_related("category")
-                .annotate(
-                    price=Round(Min("prices__price"), precision=2),
-                    price_pk=Subquery(price_subquery),
-                    quantity=Sum("prices__sold_quantity"),
-                    date=Max("prices__created_at"),
-                    rating=Count("review__created_at"),
-                )
+        queryset = (
+            Product.objects.filter(listing__category_id=category_id, listing__archived=False)
+            .select_related("category")
+            .annotate(
+                price=F("listing__min_price"),
+                price_pk=F("listing__price_pk"),
+                quantity=F("listing__sold_total"),
+                date=F("listing__last_price_date"),
+                rating=F("listing__review_count"),
             )
-
-        cache.set(cache_key, queryset, timeout=60)
+        )
 
         sort = self.request.GET.get("sort")
         if sort:
@@ -193,6 +223,34 @@ class CatalogListView(ListView):
             queryset = self.sort_queryset(queryset, sort)
         return queryset
 
+    def get_filters(self, request):
+        """
+            Получаем выбранные пользователем фильтры.
+
+            Значения фасетов сохраняются в self.selected_facets для подсчёта количества
+            товаров в боковой панели, а весь набор фильтров вместе с сортировкой
+            служит ключом кэша результатов фильтрации.
+
+            Параметры:
+                request (HttpRequest): Объект запроса, содержащий параметры фильтрации.
+
+            Возвращает:
+                dict: Выбранные фильтры и сортировка.
+        """
+        self.selected_facets = {
+            facets.SELLER: request.POST.getlist("seller[]"),
+            facets.MANUFACTURE: request.POST.getlist("manufacture[]"),
+            facets.SPECIFICATION: request.POST.getlist("specification"),
+            facets.TAG: request.POST.getlist("tags"),
+            facets.LIMITED_EDITION: [True] if request.POST.get("limited_edition") else [],
+        }
+        return {
+            **self.selected_facets,
+            "price": request.POST.get("price"),
+            "title": request.POST.get("title"),
+            "sort": self.get_last_sort(request.session),
+        }
+
     def filter_products(self, products, request):
         """
             Фильтруем продукты по выбранным параметрам.
@@ -208,14 +266,9 @@ class CatalogListView(ListView):
             Возвращает:
                 QuerySet: Отфильтрованный набор данных с продуктами.
         """
-        selected_sellers = request.POST.getlist("seller[]")
-        selected_manufactures = request.POST.getlist("manufacture[]")
-        selected_limited_edition = request.POST.get("limited_edition")
-        selected_range_price = request.POST.get("price")
-        selected_title = request.POST.get("title")
-        selected_specifications = request.POST.getlist("specification")
-        selected_tags = request.POST.getlist("tags")
-
+        filters = self.get_filters(request)
+        selected_range_price = filters["price"]
+        selected_title = filters["title"]
 
         # Фильтрация по диапазону цен
         if selected_range_price:
@@ -225,59 +278,52 @@ class CatalogListView(ListView):
             except ValueError:
                 pass  # Игнорируем ошибку, если значения некорректные
 
-        # Фильтрация по названию
+        # Полнотекстовый поиск по названию, описанию, производителю и тегам
         if selected_title:
-            products = products.filter(name__icontains=selected_title)
-
-        # Фильтрация по продавцам
-        if selected_sellers:
-            products = products.filter(prices__seller__id__in=selected_sellers)
-
-        # Фильтрация по производителям
-        if selected_manufactures:
-            products = products.filter(manufacture__in=selected_manufactures)
-
-        # Фильтрация по ограниченным сериям
-        if selected_limited_edition:
-            products = products.filter(limited_edition=True)
-
-        # Фильтрация по характеристикам
-        if selected_specifications:
-            products = products.filter(specifications__value__in=selected_specifications).distinct()
-
-        # Фильтрация по тегам
-        if selected_tags:
-            products = products.filter(tags__id__in=selected_tags).distinct()
-
-        last_sort = self.get_last_sort(self.request.session)
+            found_ids = get_search_backend().search_ids(selected_title, category_id=self.kwargs.get("pk"), limit=None)
+            products = products.filter(pk__in=found_ids)
+            if not filters["sort"]:
+                self.search_ranking = {product_id: position for position, product_id in enumerate(found_ids)}
+
+        # Фильтрация по продавцам, производителям, ограниченным сериям, характеристикам и тегам
+        # пересечением битовых карт индекса фасетов вместо JOIN-ов
+        if any(self.selected_facets.values()):
+            index = CategoryFacetIndex.get(self.kwargs.get("pk"))
+            products = products.filter(pk__in=index.product_ids_for(index.match(self.selected_facets)))
+
+        last_sort = filters["sort"]
         # Сортировка
         if last_sort:
-            products = products.order_by(last_sort)
+            products = products.order_by(last_sort, "pk")
 
         return products
 
-    def clear_cache(self, category_id):
+    def filtered_product_ids(self, request):
         """
-            Метод для очистки кэша по категории.
+            Возвращает упорядоченный список id отфильтрованных товаров.
 
-            Этот метод удаляет кэшированные данные для заданной категории, что
-            позволяет обновить информацию о продуктах.
+            Если задан поиск по названию, а сортировка не выбрана, товары
+            упорядочиваются по релевантности поиска.
 
             Параметры:
-                category_id (int): Идентификатор категории, для которой нужно очистить кэш.
+                request (HttpRequest): Объект запроса, содержащий параметры фильтрации.
 
             Возвращает:
-                None
+                list: Id товаров.
         """
-        cache_key = PRODUCTS_KEY.format(category_id=category_id)
-        cache.delete(cache_key)  # Очистка кэша по ключу
+        self.search_ranking = None
+        product_ids = list(self.filter_products(self.get_queryset(), request).values_list("pk", flat=True))
+        if self.search_ranking is not None:
+            product_ids.sort(key=self.search_ranking.__getitem__)
+        return product_ids
 
     def post(self, request, *args, **kwargs):
         """
             Обработка POST-запроса для фильтрации продуктов.
 
-            Этот метод обрабатывает POST-запросы, применяет фильтры к продуктам
-            и обновляет кэш, если данные были изменены.
+            Упорядоченный список id отфильтрованных товаров берётся из кэша по набору
+            фильтров (и вычисляется только при промахе), а из базы загружаются только
+            товары текущей страницы.
 
             Параметры:
                 request (HttpRequest): Объект запроса, содержащий данные для фильтрации.
@@ -287,20 +333,37 @@ class CatalogListView(ListView):
             Возвращает:
                 HttpResponse: Ответ с отфильтрованными продуктами и контекстом для шаблона.
         """
-        products = self.get_queryset()
-        products = self.filter_products(products, request)
-
-        # очистка кэша после изменения данных
-        category_id = self.kwargs.get("pk")  # Получаем ID категории из URL
-        self.clear_cache(category_id)  # Очищаем кэш для данной категории
-
-        context = self.get_param()
+        category_id = self.kwargs.get("pk")
+        product_ids = CatalogFilterCache.get_product_ids(
+            category_id,
+            self.get_filters(request),
+            lambda: self.filtered_product_ids(request),
+        )
 
-        context["products"] = products
+        paginator = Paginator(product_ids, self.paginate_by)
+        page = paginator.get_page(request.POST.get("page"))
+        products = self.get_queryset().in_bulk(page.object_list)
+        page.object_list = self.with_discounts(products[pk] for pk in page.object_list if pk in products)
+
+        context = self.get_param(self.selected_facets)
+        context.update(
+            {
+                "products": page.object_list,
+                "page_obj": page,
+                "paginator": paginator,
+                "is_paginated": page.has_other_pages(),
+                "filter_params": [
+                    (name, value)
+                    for name, values in request.POST.lists()
+                    if name not in ("csrfmiddlewaretoken", "page")
+                    for value in values
+                ],
+            }
+        )
         return render(request, self.template_name, context)
 
 
-class ProductDetailView(DetailView):
+class ProductDetailView(PageCacheMixin, DetailView):
     """
     Представление для отображения детальной информации о товаре.
 
@@ -308,11 +371,18 @@ class ProductDetailView(DetailView):
         template_name (str): Путь к шаблону, который будет использоваться для отображения страницы продукта.
         model (Product): Модель, используемая для получения информации о товаре.
         context_object_name (str): Имя объекта контекста для передачи в шаблон.
+        page_cache (str): Страница в кэше для анонимных посетителей.
     """
 
     template_name = "catalog/product_detail.html"
     model = Product
     context_object_name = "product"
+    page_cache = "product"
+
+    @classmethod
+    def page_cache_hit(cls, request: HttpRequest, *args, **kwargs) -> None:
+        """Страница отдана из кэша: просмотр анонимного посетителя записывается в сессию"""
+        ViewedSession(request).add(product_id=kwargs["pk"])
 
     def get_queryset(self):
         """
@@ -375,12 +445,7 @@ class ProductDetailView(DetailView):
             Product: Экземпляр модели Product, соответствующий указанному первичному ключу.
         """
         pk = self.kwargs.get("pk")
-        cache_key = f"Product_{pk}"
-        product_data = cache.get(cache_key)
-        if product_data is None:
-            product_data = super().get_object(queryset)
-            cache.set(cache_key, product_data, 240)
-        return product_data
+        return PRODUCT.get_or_set(lambda: super(ProductDetailView, self).get_object(queryset), pk=pk)
 
     def get_context_data(self, **kwargs):
         """
@@ -394,35 +459,13 @@ class ProductDetailView(DetailView):
         """
         context = super().get_context_data(**kwargs)
         pk = self.kwargs.get("pk")
-        sellers_list = cache.get_or_set(
-            f"Seller-{pk}",
-            Seller.objects.prefetch_related(
-                Prefetch(
-                    "price",
-                    queryset=Price.objects.select_related("product")
-                    .filter(Q(product__id=pk))
-                    .only("product__id", "product__name", "seller", "price"),
-                ),
-                "delivery_methods",
-                "payment_methods",
-            )
-            .only(
-                "name",
-                "price",
-                "image",
-            )
-            .filter(Q(price__product__pk=pk))
-            .order_by("price__price"),
-            timeout=240,
-        )
-
-        # Если пользователь авторизован, добавляется запись просмотра в БД
+        # Если пользователь авторизован, просмотр ставится в очередь записи в БД
         if self.request.user.is_authenticated:
-            Viewed.add_viewed_product(product_id=pk, user=self.request.user)
+            Viewed.add_viewed_product(product_id=pk, user=self.request.user, product_name=self.object.name)
         else:
             # иначе, запись о просмотре добавляется в сессию
             viewed = ViewedSession(self.request)
             viewed.add(product_id=pk)
 
-        context["sellers"] = sellers_list
+        context["offer_table"] = get_offer_table(pk)
         return context
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ComparisonConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "comparison"
+
+    def ready(self):
+        """Для работы сигналов"""
+        import comparison.signals
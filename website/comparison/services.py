@@ -269,6 +269,29 @@ class ComparisonServices:
                 return Response(serializer.data, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         return Response(serializer.errors, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @staticmethod
+    def merge_session_comparison(request: HttpRequest, user_id: int) -> int:
+        """
+        Переносит список сравнения анонимного пользователя из сессии в таблицу Comparison
+        одним запросом (товары, которые уже есть в сравнении пользователя, пропускаются)
+        и один раз сбрасывает кеш сравнения пользователя.
+
+        Args:
+            request (HttpRequest): Объект запроса с сессией анонимного пользователя.
+            user_id (int): ID пользователя, который вошёл в систему.
+
+        Returns:
+            int: Количество товаров из сессии, которые существуют в базе.
+        """
+        product_ids = request.session.pop("products_ids", None)
+        if not product_ids:
+            return 0
+        existing_ids = Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True)
+        comparisons = [Comparison(user_id=user_id, product_id=product_id) for product_id in existing_ids]
+        Comparison.objects.bulk_create(comparisons, ignore_conflicts=True)
+        ComparisonServices.delete_cache(auth_flag=True, user_id=user_id)
+        return len(comparisons)
+
     @staticmethod
     def delete_cache(request: HttpRequest | None = None, auth_flag: bool = False, user_id: int | None = None) -> None:
         """
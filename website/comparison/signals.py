@@ -0,0 +1,13 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .services import ComparisonServices
+
+
+@receiver(user_logged_in)
+def merge_anonymous_comparison(sender, request, user, **kwargs):
+    """
+    Переносит список сравнения анонимного пользователя в сравнение вошедшего пользователя
+    """
+    if request is not None and hasattr(request, "session"):
+        ComparisonServices.merge_session_comparison(request, user.pk)
@@ -1,3 +1,37 @@
+from unittest import mock
+
+from catalog.models import Product
+from comparison.models import Comparison
+from comparison.services import ComparisonServices
+from custom_auth.models import CustomUser
 from django.test import TestCase
 
-# Create your tests here.
+
+class ComparisonMergeOnLoginTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        self.user = CustomUser.objects.get(pk=1)
+        self.product_ids = list(Product.objects.values_list("pk", flat=True)[:3])
+        Comparison.objects.create(user=self.user, product_id=self.product_ids[0])
+
+    def test_session_comparison_is_merged_on_login(self):
+        session = self.client.session
+        session["products_ids"] = [*self.product_ids, 0]
+        session.save()
+
+        with mock.patch.object(ComparisonServices, "delete_cache") as delete_cache:
+            self.client.force_login(self.user)
+
+        delete_cache.assert_called_once_with(auth_flag=True, user_id=self.user.pk)
+        self.assertEqual(
+            set(Comparison.objects.filter(user=self.user).values_list("product_id", flat=True)),
+            set(self.product_ids),
+        )
+        self.assertNotIn("products_ids", self.client.session)
+
+    def test_login_without_session_comparison(self):
+        with mock.patch.object(ComparisonServices, "delete_cache") as delete_cache:
+            self.client.force_login(self.user)
+        delete_cache.assert_not_called()
+        self.assertEqual(Comparison.objects.filter(user=self.user).count(), 1)
@@ -7,3 +7,5 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         from catalog import signals
+
+        from . import signals as cache_signals
@@ -0,0 +1,381 @@
+"""
+Реестр кэшируемых данных с инвалидацией по тегам.
+
+Каждая запись кэша объявляется один раз (CacheEntry) с шаблоном ключа и тегами
+зависимостей, например "product:{pk}" или "discount:*". Вместе со значением
+сохраняются номера версий (поколений) её тегов. Сигналы моделей увеличивают версии
+тегов изменившихся объектов, и записи с устаревшими версиями считаются отсутствующими,
+поэтому удаляются ровно те данные, которые зависят от изменившегося объекта.
+
+Тег вида "тип:id" при инвалидации увеличивает и версию "тип:*", поэтому записи,
+которые зависят от всех объектов типа (например, слайдер акций), объявляют тег "тип:*".
+От глобального тега "*" зависят все записи: его инвалидация заменяет cache.clear(),
+не затрагивая сессии и другие данные в кэше.
+"""
+
+import math
+import random
+import time
+from typing import Any
+from typing import Callable
+from typing import Iterable
+
+from django.core.cache import cache
+
+from website.settings import BANNERS_KEY
+from website.settings import CACHE_LOCK_KEY
+from website.settings import CACHE_TAG_KEY
+from website.settings import CATALOG_FILTER_CASHING_TIME
+from website.settings import CATEGORY_CASHING_TIME
+from website.settings import CATEGORY_KEY
+from website.settings import CATEGORY_MENU_KEY
+from website.settings import FACETS_KEY
+from website.settings import FRAGMENT_CACHING_TIME
+from website.settings import FRAGMENT_KEY
+from website.settings import HOT_OFFER_KEY
+from website.settings import OFFER_KEY
+from website.settings import OFFER_TABLE_KEY
+from website.settings import ORDERS_KEY
+from website.settings import PAGE_CACHING_TIME
+from website.settings import PAGE_KEY
+from website.settings import PRODUCT_KEY
+from website.settings import PRODUCTS_KEY
+from website.settings import TOP_PRODUCTS_KEY
+
+GLOBAL_TAG = "*"
+
+registry: dict[str, "CacheEntry"] = {}
+
+
+def tag_key(tag: str) -> str:
+    return CACHE_TAG_KEY.format(tag=tag)
+
+
+def new_version() -> int:
+    """Начальная версия тега. Время в наносекундах не повторяет версии, вытесненные из кэша."""
+    return time.time_ns()
+
+
+def get_tag_versions(tags: Iterable[str]) -> dict[str, int]:
+    """Возвращает текущие версии тегов одним запросом к кэшу, создавая недостающие"""
+
+    tags = list(dict.fromkeys(tags))
+    found = cache.get_many([tag_key(tag) for tag in tags])
+    versions = {}
+    for tag in tags:
+        version = found.get(tag_key(tag))
+        if version is None:
+            cache.add(tag_key(tag), new_version(), timeout=None)
+            version = cache.get(tag_key(tag))
+        versions[tag] = version
+    return versions
+
+
+def expand_tags(tags: Iterable[str]) -> set[str]:
+    """Добавляет к тегам вида "тип:id" тег "тип:*" всех объектов типа"""
+
+    expanded = set()
+    for tag in tags:
+        expanded.add(tag)
+        kind, _, _ = tag.partition(":")
+        if kind and kind != GLOBAL_TAG:
+            expanded.add(f"{kind}:*")
+    return expanded
+
+
+def invalidate_tags(*tags: str) -> None:
+    """Увеличивает версии тегов; все записи, зависящие от них, становятся недействительными"""
+
+    for tag in expand_tags(tags):
+        try:
+            cache.incr(tag_key(tag))
+        except ValueError:
+            cache.set(tag_key(tag), new_version(), timeout=None)
+
+
+def invalidate_all() -> None:
+    """Делает недействительными все записи реестра"""
+    invalidate_tags(GLOBAL_TAG)
+
+
+class CacheEntry:
+    """
+    Объявление кэшируемых данных.
+
+    get_or_set защищает от одновременного пересчёта (cache stampede): пересчитывает
+    значение только процесс, получивший блокировку (cache.add), остальные отдают
+    устаревшее значение, пока оно пересчитывается (stale-while-revalidate), или
+    недолго ждут, если значения ещё нет. Кроме того, значение может быть пересчитано
+    заранее, до истечения срока, с вероятностью, растущей к концу срока и
+    пропорциональной времени вычисления (XFetch).
+
+    Attributes:
+        name: имя записи в реестре
+        key: шаблон ключа, например "Product_{pk}"
+        tags: шаблоны тегов зависимостей, например ("product:{pk}", "seller:*")
+        timeout: время актуальности значения в секундах
+        stale_timeout: сколько секунд после timeout ещё можно отдавать устаревшее значение
+        beta: коэффициент раннего пересчёта XFetch (0 — отключить)
+        lock_timeout: время жизни блокировки пересчёта в секундах
+        lock_wait: сколько секунд ждать значение, пока его вычисляет другой процесс
+    """
+
+    poll_interval = 0.05
+
+    def __init__(
+        self,
+        name: str,
+        key: str,
+        tags: Iterable[str] = (),
+        timeout: int | None = CATEGORY_CASHING_TIME,
+        stale_timeout: int = 60 * 5,
+        beta: float = 1.0,
+        lock_timeout: int = 30,
+        lock_wait: float = 3,
+    ):
+        self.name = name
+        self.key = key
+        self.tags = tuple(tags)
+        self.timeout = timeout
+        self.stale_timeout = stale_timeout
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+
+    def __repr__(self):
+        return f"CacheEntry({self.name!r})"
+
+    def make_key(self, **params) -> str:
+        return self.key.format(**params)
+
+    def make_tags(self, **params) -> list[str]:
+        return [GLOBAL_TAG, *(tag.format(**params) for tag in self.tags)]
+
+    def read(self, **params) -> tuple[dict | None, bool]:
+        """
+        Возвращает сохранённую запись (значение, версии тегов, срок) и признак того,
+        что версии её тегов актуальны. Истечение срока не проверяется.
+        """
+
+        key = self.make_key(**params)
+        tags = self.make_tags(**params)
+        found = cache.get_many([key, *(tag_key(tag) for tag in tags)])
+        return self.check(found, key, tags)
+
+    @staticmethod
+    def check(found: dict, key: str, tags: list[str]) -> tuple[dict | None, bool]:
+        """Разбирает запись key из результата cache.get_many вместе с версиями её тегов"""
+
+        stored = found.get(key)
+        if not isinstance(stored, dict) or "versions" not in stored:
+            return None, False
+        current = all(found.get(tag_key(tag)) == stored["versions"].get(tag) for tag in tags)
+        return stored, current
+
+    @staticmethod
+    def is_expired(stored: dict, now: float) -> bool:
+        return stored["expires"] is not None and stored["expires"] <= now
+
+    def should_refresh(self, stored: dict, now: float) -> bool:
+        """Проверяет, истёк ли срок значения или пора пересчитать его заранее (XFetch)"""
+
+        if stored["expires"] is None:
+            return False
+        early = -stored["delta"] * self.beta * math.log(1.0 - random.random())
+        return now + early >= stored["expires"]
+
+    def lookup(self, **params) -> tuple[bool, Any]:
+        """Возвращает пару (найдено ли актуальное значение, значение)"""
+
+        stored, current = self.read(**params)
+        if stored is None or not current or self.is_expired(stored, time.time()):
+            return False, None
+        return True, stored["value"]
+
+    def lookup_many(self, params_list: list[dict]) -> list[tuple[bool, Any]]:
+        """То же, что lookup, для нескольких наборов параметров одним запросом к кэшу"""
+
+        keys = [self.make_key(**params) for params in params_list]
+        tags = [self.make_tags(**params) for params in params_list]
+        found = cache.get_many(list({*keys, *(tag_key(tag) for entry_tags in tags for tag in entry_tags)}))
+        now = time.time()
+        results = []
+        for key, entry_tags in zip(keys, tags):
+            stored, current = self.check(found, key, entry_tags)
+            if stored is None or not current or self.is_expired(stored, now):
+                results.append((False, None))
+            else:
+                results.append((True, stored["value"]))
+        return results
+
+    def get(self, default=None, **params) -> Any:
+        hit, value = self.lookup(**params)
+        return value if hit else default
+
+    def store(self, value: Any, versions: dict[str, int], delta: float = 0, timeout: int | None = None, **params):
+        timeout = self.timeout if timeout is None else timeout
+        cache.set(
+            self.make_key(**params),
+            {
+                "versions": versions,
+                "value": value,
+                "expires": time.time() + timeout if timeout else None,
+                "delta": delta,
+            },
+            timeout=timeout + self.stale_timeout if timeout else None,
+        )
+
+    def set(self, value: Any, timeout: int | None = None, **params) -> None:
+        self.store(value, get_tag_versions(self.make_tags(**params)), timeout=timeout, **params)
+
+    def compute_and_set(self, compute: Callable[[], Any], **params) -> Any:
+        """
+        Вычисляет и сохраняет значение. Версии тегов читаются до вычисления, чтобы
+        изменение данных во время вычисления не было скрыто новым значением.
+        """
+
+        versions = get_tag_versions(self.make_tags(**params))
+        started = time.monotonic()
+        value = compute()
+        self.store(value, versions, delta=time.monotonic() - started, **params)
+        return value
+
+    def get_or_set(self, compute: Callable[[], Any], **params) -> Any:
+        """Возвращает значение из кэша или вычисляет его, не допуская одновременного пересчёта"""
+
+        stored, current = self.read(**params)
+        if stored is not None and current and not self.should_refresh(stored, time.time()):
+            return stored["value"]
+
+        lock_key = CACHE_LOCK_KEY.format(key=self.make_key(**params))
+        if cache.add(lock_key, 1, timeout=self.lock_timeout):
+            try:
+                return self.compute_and_set(compute, **params)
+            finally:
+                cache.delete(lock_key)
+
+        # значение пересчитывает другой процесс
+        if stored is not None:
+            return stored["value"]
+
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            stored, current = self.read(**params)
+            if stored is not None and current:
+                return stored["value"]
+        return self.compute_and_set(compute, **params)
+
+    def remaining(self, **params) -> float | None:
+        """
+        Возвращает, сколько секунд значение останется актуальным (inf для бессрочных),
+        или None, если значения нет или оно устарело.
+        """
+
+        stored, current = self.read(**params)
+        if stored is None or not current:
+            return None
+        if stored["expires"] is None:
+            return math.inf
+        remaining = stored["expires"] - time.time()
+        return remaining if remaining > 0 else None
+
+    def refresh(self, compute: Callable[[], Any], **params) -> bool:
+        """
+        Пересчитывает значение под блокировкой. Возвращает False, если значение уже
+        пересчитывает другой процесс.
+        """
+
+        lock_key = CACHE_LOCK_KEY.format(key=self.make_key(**params))
+        if not cache.add(lock_key, 1, timeout=self.lock_timeout):
+            return False
+        try:
+            self.compute_and_set(compute, **params)
+        finally:
+            cache.delete(lock_key)
+        return True
+
+    def delete(self, **params) -> None:
+        cache.delete(self.make_key(**params))
+
+
+def register(name: str, key: str, tags: Iterable[str] = (), **options) -> CacheEntry:
+    """Объявляет запись кэша и добавляет её в реестр. options передаются в CacheEntry."""
+
+    if name in registry:
+        raise ValueError(f"Cache entry {name!r} is already registered")
+    entry = CacheEntry(name, key, tags, **options)
+    registry[name] = entry
+    return entry
+
+
+def register_fragment(name: str, tags: Iterable[str] = (), **options) -> CacheEntry:
+    """
+    Объявляет фрагмент шаблона для тега {% cachefragment %}. Ключ фрагмента включает
+    язык и pk объекта, поэтому в шаблонах тегов можно использовать {pk}.
+    """
+
+    options.setdefault("timeout", FRAGMENT_CACHING_TIME)
+    return register(f"fragment_{name}", FRAGMENT_KEY.replace("{name}", name), tags, **options)
+
+
+def get_fragment(name: str) -> CacheEntry:
+    return registry[f"fragment_{name}"]
+
+
+def register_page(name: str, tags: Iterable[str] = (), **options) -> CacheEntry:
+    """
+    Объявляет страницу для AnonymousPageCacheMiddleware. Ключ страницы включает язык
+    и хэш пути с параметрами, в шаблонах тегов доступны аргументы URL, например {pk}.
+    """
+
+    options.setdefault("timeout", PAGE_CACHING_TIME)
+    options.setdefault("stale_timeout", 0)
+    return register(f"page_{name}", PAGE_KEY.replace("{name}", name), tags, **options)
+
+
+def get_page(name: str) -> CacheEntry:
+    return registry[f"page_{name}"]
+
+
+CATEGORY_MENU = register("category_menu", CATEGORY_MENU_KEY, tags=("category:*",))
+BANNERS = register("banners", BANNERS_KEY, tags=("banner:*", "product:*"))
+CATEGORIES = register("categories", CATEGORY_KEY, tags=("category:*", "product:*", "price:*"))
+OFFERS = register("offers", OFFER_KEY, tags=("product:*", "price:*"))
+TOP_PRODUCTS = register("top_products", TOP_PRODUCTS_KEY, tags=("top_products",))
+HOT_OFFERS = register("hot_offers", HOT_OFFER_KEY, tags=("discount:*", "product:*", "price:*"))
+PRODUCT = register("product", PRODUCT_KEY, tags=("product:{pk}",), timeout=240, stale_timeout=60)
+OFFER_TABLE = register(
+    "offer_table",
+    OFFER_TABLE_KEY,
+    tags=("product:{pk}", "seller:*"),
+    timeout=240,
+    stale_timeout=60,
+)
+ORDER = register("order", ORDERS_KEY + "{pk}", tags=("order:{pk}",), timeout=300, stale_timeout=0)
+CATEGORY_FACETS = register(
+    "category_facets",
+    FACETS_KEY,
+    tags=("category:{category_id}", "seller:*", "tag:*", "specification_name:*"),
+)
+CATALOG_FILTER = register(
+    "catalog_filter",
+    PRODUCTS_KEY,
+    tags=("category:{category_id}",),
+    timeout=CATALOG_FILTER_CASHING_TIME,
+    stale_timeout=60,
+)
+
+# Фрагменты шаблонов: не содержат данных пользователя и csrf-токенов
+register_fragment("product_gallery", tags=("product:{pk}",))
+register_fragment("product_specifications", tags=("product:{pk}", "specification_name:*"))
+register_fragment("product_offers", tags=("product:{pk}", "seller:*"))
+register_fragment("catalog_card", tags=("product:{pk}", "category:*"))
+register_fragment("top_product_card", tags=("product:{pk}", "category:*"))
+register_fragment("hot_offer_card", tags=("product:{pk}", "category:*", "discount:*", "price:*"))
+register_fragment("limited_edition_card", tags=("product:{pk}", "category:*"))
+
+# Страницы для анонимных посетителей
+register_page("index", tags=("banner:*", "category:*", "product:*", "price:*", "discount:*", "top_products"))
+register_page("catalog", tags=("category:*", "product:*", "price:*", "seller:*", "tag:*", "specification_name:*"))
+register_page("product", tags=("product:{pk}", "category:*", "seller:*", "specification_name:*"))
@@ -0,0 +1,37 @@
+from core.warmers import FAILED
+from core.warmers import FRESH
+from core.warmers import warm_all
+from django.core.management.base import BaseCommand
+
+from website.settings import CACHE_WARM_AHEAD
+
+
+class Command(BaseCommand):
+    """
+    Прогрев кэша главной страницы, меню категорий и фильтров популярных категорий.
+    Запускается после деплоя; дальше записи обновляет периодическая задача core.tasks.warm_cache.
+    """
+
+    help = "Precompute home page, category menu and top category caches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Recompute entries that are still fresh")
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=CACHE_WARM_AHEAD,
+            help="Recompute entries expiring within this many seconds",
+        )
+
+    def handle(self, *args, **options):
+        total = 0.0
+        for result in warm_all(ahead=options["ahead"], force=options["force"]):
+            total += result.seconds
+            line = f"{result.key}: {result.status} in {result.seconds * 1000:.1f} ms"
+            if result.status == FAILED:
+                self.stdout.write(self.style.ERROR(f"{line} ({result.error})"))
+            elif result.status == FRESH:
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
+        self.stdout.write(self.style.SUCCESS(f"Cache warmed in {total:.2f} s"))
@@ -0,0 +1,69 @@
+from django.http import HttpRequest
+from django.http import HttpResponse
+
+from .cache import get_page
+from .cache import get_tag_versions
+from .page_cache import dump_response
+from .page_cache import load_response
+from .page_cache import page_url
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Отдаёт анонимным посетителям страницы представлений с PageCacheMixin из кэша.
+
+    Страница берётся из кэша, если её теги не инвалидировались, иначе она рендерится
+    представлением и сохраняется с версиями тегов, прочитанными до рендеринга.
+    Запросы авторизованных пользователей, запросы кроме GET/HEAD и запросы с
+    непоказанными сообщениями (django.contrib.messages) обрабатываются как обычно.
+    Должен стоять после AuthenticationMiddleware и LocaleMiddleware.
+
+    Сессия сохраняется только при изменении (SESSION_SAVE_EVERY_REQUEST = False), чтобы
+    страницы из кэша не писали в базу. Сессии авторизованных пользователей сохраняются
+    на каждом запросе, как раньше, поэтому срок их жизни продлевается при активности.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        response = self.get_response(request)
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated and hasattr(request, "session"):
+            request.session.modified = True
+        pending = getattr(request, "_page_cache", None)
+        if pending is not None and self.is_cacheable_response(request, response):
+            entry, versions, params = pending
+            entry.store(dump_response(response), versions, **params)
+            response["X-Page-Cache"] = "miss"
+        return response
+
+    def process_view(self, request: HttpRequest, view_func, view_args, view_kwargs) -> HttpResponse | None:
+        view_class = getattr(view_func, "view_class", None)
+        name = getattr(view_class, "page_cache", None)
+        if name is None or not self.is_cacheable_request(request):
+            return None
+
+        entry = get_page(name)
+        params = {**view_kwargs, "language": request.LANGUAGE_CODE, "url": page_url(request)}
+        hit, stored = entry.lookup(**params)
+        if hit:
+            view_class.page_cache_hit(request, *view_args, **view_kwargs)
+            response = load_response(request, stored)
+            response["X-Page-Cache"] = "hit"
+            return response
+
+        request._page_cache = (entry, get_tag_versions(entry.make_tags(**params)), params)
+        return None
+
+    @staticmethod
+    def is_cacheable_request(request: HttpRequest) -> bool:
+        return (
+            request.method in ("GET", "HEAD")
+            and "messages" not in request.COOKIES
+            and not request.user.is_authenticated
+        )
+
+    @staticmethod
+    def is_cacheable_response(request: HttpRequest, response: HttpResponse) -> bool:
+        return request.method == "GET" and response.status_code == 200 and not response.streaming
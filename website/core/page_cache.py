@@ -0,0 +1,55 @@
+"""
+Кэш страниц для анонимных посетителей.
+
+Страницы представлений с PageCacheMixin сохраняются целиком (AnonymousPageCacheMiddleware)
+и отдаются из кэша без вызова представления и запросов к базе. Актуальность страницы
+определяется версиями тегов реестра кэша (core.cache.register_page). Данные посетителя
+в страницу не попадают: корзина в шапке обновляется скриптом через API, а csrf-токены
+форм подставляются для каждого запроса.
+"""
+
+import hashlib
+import re
+
+from django.http import HttpRequest
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+CSRF_PLACEHOLDER = "__page_cache_csrf_token__"
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+class PageCacheMixin:
+    """
+    Миксин представления, страницы которого кэшируются для анонимных посетителей.
+
+    Attributes:
+        page_cache: имя страницы в реестре кэша (core.cache.register_page)
+    """
+
+    page_cache: str | None = None
+
+    @classmethod
+    def page_cache_hit(cls, request: HttpRequest, *args, **kwargs) -> None:
+        """Вызывается, когда страница отдана из кэша: здесь выполняются побочные действия представления"""
+
+
+def page_url(request: HttpRequest) -> str:
+    """Хэш пути страницы вместе с параметрами запроса"""
+    return hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+
+def dump_response(response: HttpResponse) -> dict:
+    """Сохраняемое представление ответа: csrf-токены заменяются заглушкой"""
+
+    content = response.content.decode(response.charset)
+    return {
+        "content": CSRF_INPUT_RE.sub(rf"\g<1>{CSRF_PLACEHOLDER}\g<2>", content),
+        "content_type": response["Content-Type"],
+    }
+
+
+def load_response(request: HttpRequest, stored: dict) -> HttpResponse:
+    """Собирает ответ из кэша, подставляя csrf-токен текущего посетителя"""
+    content = stored["content"].replace(CSRF_PLACEHOLDER, get_token(request))
+    return HttpResponse(content, content_type=stored["content_type"])
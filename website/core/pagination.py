@@ -0,0 +1,249 @@
+from dataclasses import dataclass
+from typing import Any
+
+from django.core import signing
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import QuerySet
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+CURSOR_SALT = "core.pagination.cursor"
+CURSOR_PARAM = "cursor"
+
+
+def encode_cursor(ordering: str, value: Any, pk: int) -> str:
+    """
+    Возвращает непрозрачный подписанный курсор для позиции (значение ключа сортировки, pk).
+    Значения, которые не являются числами, сохраняются строкой и приводятся обратно
+    полем модели при фильтрации.
+    """
+    if value is not None and not isinstance(value, (int, float)):
+        value = str(value)
+    return signing.dumps({"o": ordering, "v": value, "pk": pk}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor: str | None, ordering: str) -> dict | None:
+    """
+    Проверяет подпись курсора и возвращает его содержимое.
+    Курсор, подписанный для другой сортировки или повреждённый, игнорируется.
+    """
+    if not cursor:
+        return None
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    if not isinstance(data, dict) or data.get("o") != ordering or "pk" not in data:
+        return None
+    return data
+
+
+def approximate_count(queryset: QuerySet, limit: int) -> tuple[int, bool]:
+    """
+    Считает строки выборки, но не больше limit.
+    Возвращает пару (количество, точное ли значение), чтобы вместо COUNT(*) по всей
+    категории можно было показать "более N".
+    """
+    count = queryset.order_by().values("pk")[: limit + 1].count()
+    if count > limit:
+        return limit, False
+    return count, True
+
+
+@dataclass
+class KeysetPage:
+    """
+    Страница keyset-пагинации.
+
+    Attributes:
+        object_list: объекты текущей страницы
+        next_cursor: курсор следующей страницы или None, если страница последняя
+        cursor: курсор, по которому получена текущая страница
+        count: количество объектов (может быть приблизительным)
+        count_is_exact: является ли count точным значением
+    """
+
+    object_list: list
+    next_cursor: str | None = None
+    cursor: str | None = None
+    count: int | None = None
+    count_is_exact: bool = True
+    number: int = 1
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return False
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Пагинация по ключу (seek pagination): следующая страница выбирается условием
+    WHERE (ключ, pk) > (последний ключ, последний pk) вместо OFFSET, поэтому
+    страница N стоит столько же, сколько первая.
+
+    Attributes:
+        queryset: выборка для пагинации (без сортировки)
+        ordering: поле сортировки, например "price" или "-date"; pk добавляется автоматически
+        per_page: размер страницы
+        count_limit: если задан, считается приблизительное количество не больше этого значения
+    """
+
+    def __init__(self, queryset: QuerySet, ordering: str, per_page: int, count_limit: int | None = None):
+        self.queryset = queryset
+        self.ordering = ordering or "pk"
+        self.per_page = per_page
+        self.count_limit = count_limit
+        self.descending = self.ordering.startswith("-")
+        self.field_name = self.ordering.lstrip("-")
+
+    def get_ordered_queryset(self) -> QuerySet:
+        """Возвращает выборку, отсортированную по ключу и pk (NULL-значения ключа в конце)"""
+        key = F(self.field_name)
+        pk_ordering = "-pk" if self.descending else "pk"
+        if self.field_name == "pk":
+            return self.queryset.order_by(pk_ordering)
+        key_ordering = key.desc(nulls_last=True) if self.descending else key.asc(nulls_last=True)
+        return self.queryset.order_by(key_ordering, pk_ordering)
+
+    def get_seek_filter(self, value: Any, pk: int) -> Q:
+        """Возвращает условие выборки строк, которые идут после позиции (value, pk)"""
+        after = "lt" if self.descending else "gt"
+        pk_after = Q(**{f"pk__{after}": pk})
+        if self.field_name == "pk":
+            return pk_after
+        if value is None:
+            return Q(**{f"{self.field_name}__isnull": True}) & pk_after
+        return (
+            Q(**{f"{self.field_name}__{after}": value})
+            | (Q(**{self.field_name: value}) & pk_after)
+            | Q(**{f"{self.field_name}__isnull": True})
+        )
+
+    def page(self, cursor: str | None = None) -> KeysetPage:
+        """Возвращает страницу, начинающуюся после позиции из курсора"""
+        queryset = self.get_ordered_queryset()
+        position = decode_cursor(cursor, self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_seek_filter(position["v"], position["pk"]))
+
+        object_list = list(queryset[: self.per_page + 1])
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[: self.per_page]
+            last = object_list[-1]
+            next_cursor = encode_cursor(self.ordering, getattr(last, self.field_name), last.pk)
+
+        page = KeysetPage(object_list=object_list, next_cursor=next_cursor, cursor=cursor if position else None)
+        if self.count_limit:
+            page.count, page.count_is_exact = approximate_count(self.queryset, self.count_limit)
+        return page
+
+
+class KeysetPaginationMixin:
+    """
+    Миксин для ListView, включающий keyset-пагинацию по запросу.
+    Режим включается параметром ?cursor= (пустое значение — первая страница),
+    без него используется обычная постраничная пагинация Django.
+
+    Attributes:
+        keyset_paginate_by: размер страницы в keyset-режиме (по умолчанию paginate_by)
+        keyset_count_limit: предел приблизительного подсчёта количества объектов
+    """
+
+    keyset_paginate_by = None
+    keyset_count_limit = None
+
+    def get_keyset_ordering(self) -> str:
+        """Возвращает поле сортировки для keyset-пагинации"""
+        return "pk"
+
+    def is_keyset_pagination(self) -> bool:
+        return CURSOR_PARAM in self.request.GET
+
+    def get_paginate_by(self, queryset):
+        if self.is_keyset_pagination() and self.keyset_paginate_by:
+            return self.keyset_paginate_by
+        return super().get_paginate_by(queryset)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["keyset_pagination"] = self.is_keyset_pagination()
+        return context
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.is_keyset_pagination():
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(
+            queryset,
+            ordering=self.get_keyset_ordering(),
+            per_page=page_size,
+            count_limit=self.keyset_count_limit,
+        )
+        page = paginator.page(self.request.GET.get(CURSOR_PARAM))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+class SignedCursorPagination(PageNumberPagination):
+    """
+    Пагинация DRF с опциональным keyset-режимом.
+    Если в запросе есть параметр cursor, страница выбирается по подписанному курсору
+    и в ответе возвращается ссылка next с новым курсором; иначе работает обычная
+    постраничная пагинация. Параметр count_limit включает приблизительный подсчёт.
+    """
+
+    ordering = "-created_at"
+    cursor_query_param = CURSOR_PARAM
+    count_limit_query_param = "count_limit"
+    max_count_limit = 10000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.keyset_page = None
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        count_limit = self.get_count_limit(request)
+        paginator = KeysetPaginator(
+            queryset,
+            ordering=self.ordering,
+            per_page=self.get_page_size(request),
+            count_limit=count_limit,
+        )
+        self.keyset_page = paginator.page(request.query_params.get(self.cursor_query_param))
+        return self.keyset_page.object_list
+
+    def get_count_limit(self, request) -> int | None:
+        try:
+            count_limit = int(request.query_params.get(self.count_limit_query_param, 0))
+        except ValueError:
+            return None
+        return min(count_limit, self.max_count_limit) if count_limit > 0 else None
+
+    def get_paginated_response(self, data):
+        if self.keyset_page is None:
+            return super().get_paginated_response(data)
+
+        next_link = None
+        if self.keyset_page.next_cursor:
+            url = self.request.build_absolute_uri()
+            next_link = replace_query_param(url, self.cursor_query_param, self.keyset_page.next_cursor)
+
+        response = {"next": next_link, "results": data}
+        if self.keyset_page.count is not None:
+            response["count"] = self.keyset_page.count
+            response["count_is_exact"] = self.keyset_page.count_is_exact
+        return Response(response)
@@ -0,0 +1,131 @@
+"""
+Пулы id для случайной выборки товаров.
+
+Пул — заранее собранное множество id (товаров со скидкой, цен товаров ограниченного
+тиража), из которого случайные k элементов выбираются за O(k): в Redis — SRANDMEMBER
+по множеству, без Redis — random.sample по списку в кэше. Пул хранится вместе с версиями
+тегов, от которых зависит его состав, и пересобирается одним запросом к базе при первой
+выборке после изменения скидок, товаров или цен (см. core.cache).
+
+Пулы используются слайдером горячих предложений, предложением дня и пятничной рассылкой скидок.
+"""
+
+import json
+import random
+from functools import lru_cache
+from typing import Callable
+from typing import Iterable
+
+from catalog.models import Price
+from catalog.models import Product
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from website import settings
+
+from .cache import GLOBAL_TAG
+from .cache import get_tag_versions
+from .redis_client import get_redis
+
+DISCOUNTED_PRODUCTS = "discounted_products"
+LIMITED_EDITION_PRICES = "limited_edition_prices"
+
+
+def build_discounted_product_ids() -> Iterable[int]:
+    """id товаров, на которые действует скидка на товар, его категорию или группу"""
+    return (
+        Product.objects.filter(
+            Q(discounts__is_current=True)
+            | Q(category__discounts__is_current=True)
+            | Q(product_groups__discounts__is_current=True)
+        )
+        .values_list("pk", flat=True)
+        .distinct()
+    )
+
+
+def build_limited_edition_price_ids() -> Iterable[int]:
+    """id цен продавцов на товары ограниченного тиража"""
+    return Price.objects.filter(product__limited_edition=True).values_list("pk", flat=True)
+
+
+POOLS: dict[str, tuple[Callable[[], Iterable[int]], tuple[str, ...]]] = {
+    DISCOUNTED_PRODUCTS: (build_discounted_product_ids, ("discount:*", "product:*")),
+    LIMITED_EDITION_PRICES: (build_limited_edition_price_ids, ("product:*", "price:*")),
+}
+
+
+class BaseProductPool:
+    """Базовый класс пула id с именем name"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.build, tags = POOLS[name]
+        self.tags = (GLOBAL_TAG, *tags)
+        self.key = settings.PRODUCT_POOL_KEY.format(name=name)
+
+    def read(self, k: int, versions: dict[str, int]) -> list[int] | None:
+        """Возвращает до k случайных различных id или None, если пул устарел или отсутствует"""
+        raise NotImplementedError
+
+    def store(self, ids: list[int], versions: dict[str, int]) -> None:
+        raise NotImplementedError
+
+    def sample(self, k: int) -> list[int]:
+        """Возвращает до k случайных различных id пула, пересобирая пул, если он устарел"""
+
+        versions = get_tag_versions(self.tags)
+        ids = self.read(k, versions)
+        if ids is None:
+            pool = list(self.build())
+            self.store(pool, versions)
+            ids = random.sample(pool, min(k, len(pool)))
+        return ids
+
+
+class RedisProductPool(BaseProductPool):
+    """Пул в множестве Redis, версии тегов — в отдельном ключе "<ключ пула>:versions" """
+
+    def get_client(self):
+        return get_redis()
+
+    @property
+    def versions_key(self) -> str:
+        return f"{self.key}:versions"
+
+    def read(self, k: int, versions: dict[str, int]) -> list[int] | None:
+        pipeline = self.get_client().pipeline()
+        pipeline.get(self.versions_key)
+        pipeline.srandmember(self.key, k)
+        stored, ids = pipeline.execute()
+        if stored is None or json.loads(stored) != versions:
+            return None
+        return [int(pk) for pk in ids]
+
+    def store(self, ids: list[int], versions: dict[str, int]) -> None:
+        pipeline = self.get_client().pipeline(transaction=True)
+        pipeline.delete(self.key)
+        for start in range(0, len(ids), 1000):
+            pipeline.sadd(self.key, *ids[start : start + 1000])
+        pipeline.set(self.versions_key, json.dumps(versions))
+        pipeline.execute()
+
+
+class LocalProductPool(BaseProductPool):
+    """Пул в виде списка в кэше Django (разработка без Redis, тесты)"""
+
+    def read(self, k: int, versions: dict[str, int]) -> list[int] | None:
+        stored = cache.get(self.key)
+        if not isinstance(stored, dict) or stored["versions"] != versions:
+            return None
+        return random.sample(stored["ids"], min(k, len(stored["ids"])))
+
+    def store(self, ids: list[int], versions: dict[str, int]) -> None:
+        cache.set(self.key, {"ids": ids, "versions": versions}, timeout=None)
+
+
+@lru_cache(maxsize=None)
+def get_product_pool(name: str) -> BaseProductPool:
+    """Возвращает пул name с классом из настройки PRODUCT_POOL_BACKEND"""
+    return import_string(settings.PRODUCT_POOL_BACKEND)(name)
@@ -0,0 +1,20 @@
+"""
+Клиент Redis для структур данных, которых нет в API кэша Django (множества, хэши, списки).
+
+Клиент подключается к тому же серверу и базе, что и кэш по умолчанию (CACHES["default"]:
+LOCATION и OPTIONS), но создаётся пакетом redis напрямую, а не через внутренности
+django.core.cache.backends.redis.RedisCache. Ключи не получают префиксов кэша Django.
+"""
+
+from functools import lru_cache
+
+import redis
+
+from website import settings
+
+
+@lru_cache(maxsize=None)
+def get_redis() -> redis.Redis:
+    """Возвращает общий клиент Redis процесса (с пулом соединений)"""
+    config = settings.CACHES["default"]
+    return redis.Redis.from_url(config["LOCATION"], **config.get("OPTIONS", {}))
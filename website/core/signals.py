@@ -0,0 +1,127 @@
+from catalog.models import Category
+from catalog.models import NameSpecification
+from catalog.models import Price
+from catalog.models import Product
+from catalog.models import ProductImage
+from catalog.models import Seller
+from catalog.models import Specification
+from catalog.models import Tag
+from discount.models import Discount
+from discount.models import ProductGroup
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from order.models import Order
+from order.models import OrderItem
+
+from .cache import invalidate_tags
+from .models import Banner
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_cache_handler(sender, instance: Category, **kwargs):
+    invalidate_tags(f"category:{instance.pk}")
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_cache_handler(sender, instance: Product, **kwargs):
+    invalidate_tags(f"product:{instance.pk}")
+
+
+@receiver(post_save, sender=Price)
+@receiver(post_delete, sender=Price)
+def price_cache_handler(sender, instance: Price, **kwargs):
+    invalidate_tags(f"price:{instance.pk}", f"product:{instance.product_id}", f"seller:{instance.seller_id}")
+
+
+@receiver(post_save, sender=Specification)
+@receiver(post_delete, sender=Specification)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_related_cache_handler(sender, instance: Specification | ProductImage, **kwargs):
+    invalidate_tags(f"product:{instance.product_id}")
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def product_tags_cache_handler(sender, instance: Product | Tag, action: str, reverse: bool, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        invalidate_tags(f"product:{instance.pk}")
+    else:
+        invalidate_tags(f"tag:{instance.pk}", *(f"product:{pk}" for pk in pk_set or ()))
+
+
+@receiver(post_save, sender=Seller)
+@receiver(post_delete, sender=Seller)
+def seller_cache_handler(sender, instance: Seller, **kwargs):
+    invalidate_tags(f"seller:{instance.pk}")
+
+
+@receiver(m2m_changed, sender=Seller.delivery_methods.through)
+@receiver(m2m_changed, sender=Seller.payment_methods.through)
+def seller_methods_cache_handler(sender, instance: Seller, action: str, reverse: bool, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        invalidate_tags(f"seller:{instance.pk}")
+    else:
+        invalidate_tags("seller:*")
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_cache_handler(sender, instance: Tag, **kwargs):
+    invalidate_tags(f"tag:{instance.pk}")
+
+
+@receiver(post_save, sender=NameSpecification)
+@receiver(post_delete, sender=NameSpecification)
+def specification_name_cache_handler(sender, instance: NameSpecification, **kwargs):
+    invalidate_tags(f"specification_name:{instance.pk}")
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def banner_cache_handler(sender, instance: Banner, **kwargs):
+    invalidate_tags(f"banner:{instance.pk}")
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+def discount_cache_handler(sender, instance: Discount, **kwargs):
+    invalidate_tags(f"discount:{instance.pk}")
+
+
+@receiver(m2m_changed, sender=Discount.products.through)
+@receiver(m2m_changed, sender=Discount.categories.through)
+@receiver(m2m_changed, sender=Discount.product_groups.through)
+def discount_relations_cache_handler(sender, action: str, **kwargs):
+    if action.startswith("post_"):
+        invalidate_tags("discount:*")
+
+
+@receiver(post_save, sender=ProductGroup)
+@receiver(post_delete, sender=ProductGroup)
+def product_group_cache_handler(sender, instance: ProductGroup, **kwargs):
+    invalidate_tags("discount:*")
+
+
+@receiver(m2m_changed, sender=ProductGroup.products.through)
+def product_group_products_cache_handler(sender, action: str, **kwargs):
+    if action.startswith("post_"):
+        invalidate_tags("discount:*")
+
+
+@receiver(post_save, sender=Order)
+def order_cache_handler(sender, instance: Order, **kwargs):
+    invalidate_tags(f"order:{instance.pk}")
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def order_item_cache_handler(sender, instance: OrderItem, **kwargs):
+    invalidate_tags(f"order:{instance.order_id}")
@@ -0,0 +1,25 @@
+import logging
+
+from core.warmers import warm_all
+
+from website.celery import app
+
+logger = logging.getLogger(__name__)
+
+
+@app.task
+def warm_cache(force: bool = False) -> dict[str, dict]:
+    """
+    Прогревает кэш главной страницы, меню категорий и фильтров популярных категорий.
+
+    Запускается периодически (CELERY_BEAT_SCHEDULE) и пересчитывает записи заранее,
+    до истечения их срока, поэтому пользователи не попадают на пустой кэш.
+
+    Возвращает:
+        dict: {ключ кэша: {"status": ..., "seconds": ...}}
+    """
+    report = {}
+    for result in warm_all(force=force):
+        logger.info("Cache %s %s in %.3f s %s", result.key, result.status, result.seconds, result.error)
+        report[result.key] = {"status": result.status, "seconds": round(result.seconds, 4)}
+    return report
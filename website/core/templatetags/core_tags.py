@@ -1,9 +1,63 @@
 from catalog.models import Category
+from core.cache import CATEGORY_MENU
+from core.cache import get_fragment
 from django import template
+from django.template.base import FilterExpression
+from django.utils import translation
 
 register = template.Library()
 
 
+def build_category_menu() -> list[Category]:
+    """Корневые категории меню вместе с подкатегориями"""
+    return list(
+        Category.objects.filter(parent_category__isnull=True, archived=False).prefetch_related("sub_categories")
+    )
+
+
 @register.simple_tag()
 def get_categories():
-    return Category.objects.filter(parent_category__isnull=True, archived=False).all()
+    return CATEGORY_MENU.get_or_set(build_category_menu)
+
+
+class CacheFragmentNode(template.Node):
+    def __init__(self, nodelist: template.NodeList, name: str, pk: FilterExpression | None):
+        self.nodelist = nodelist
+        self.entry = get_fragment(name)
+        self.pk = pk
+
+    def render(self, context) -> str:
+        pk = self.pk.resolve(context) if self.pk is not None else ""
+        return self.entry.get_or_set(
+            lambda: self.nodelist.render(context),
+            language=translation.get_language(),
+            pk=pk,
+        )
+
+
+@register.tag("cachefragment")
+def do_cachefragment(parser, token):
+    """
+    Кэширует отрендеренный фрагмент шаблона, объявленный в core.cache (register_fragment).
+    Фрагмент перерисовывается, когда меняется версия любого из его тегов.
+
+    Использование:
+        {% cachefragment "product_gallery" product.pk %} ... {% endcachefragment %}
+    """
+
+    bits = token.split_contents()
+    if len(bits) not in (2, 3):
+        raise template.TemplateSyntaxError(f"{bits[0]!r} tag requires a fragment name and an optional object pk")
+    name = bits[1]
+    if not (name[0] == name[-1] and name[0] in ("'", '"')):
+        raise template.TemplateSyntaxError(f"{bits[0]!r} fragment name must be a quoted string")
+    name = name[1:-1]
+    try:
+        get_fragment(name)
+    except KeyError:
+        raise template.TemplateSyntaxError(f"Unknown cache fragment {name!r}")
+
+    nodelist = parser.parse(("endcachefragment",))
+    parser.delete_first_token()
+    pk = parser.compile_filter(bits[2]) if len(bits) == 3 else None
+    return CacheFragmentNode(nodelist, name, pk)
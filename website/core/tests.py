@@ -1,11 +1,37 @@
+import io
 import os
+import threading
+import time
+from datetime import timedelta
 from http import HTTPStatus
 
+from catalog.models import Price
 from catalog.models import Product, Seller
+from catalog.models import ProductListing
+from catalog.top_products import get_top_product_ids
+from core import cache as cache_registry
+from core import warmers
 from core.models import Banner
+from core.page_cache import CSRF_PLACEHOLDER
+from core.views import IndexView
+from core.pagination import KeysetPaginator
+from core.pagination import approximate_count
+from core.product_pool import DISCOUNTED_PRODUCTS
+from core.product_pool import LIMITED_EDITION_PRICES
+from core.product_pool import get_product_pool
 from custom_auth.models import CustomUser
+from discount.models import Discount
+from django.core.cache import cache
+from django.core.management import call_command
+from django.conf import settings
+from django.db.models import F
+from django.template import Context
+from django.template import Template
+from django.template import TemplateSyntaxError
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
+from django.utils import translation
 
 
 class BannersTestCase(TestCase):
@@ -26,6 +52,7 @@ class BannersTestCase(TestCase):
         for file_path in files_to_remove:
             if os.path.exists(file_path):
                 os.remove(file_path)
+        super().tearDownClass()
 
     def test_get_banners_page(self):
         response = self.client.get(reverse("core:index"))
@@ -43,3 +70,291 @@ class BannersTestCase(TestCase):
                 continue
             self.assertNotContains(response, banner.text)
             self.assertNotContains(response, banner.product.name[:19])
+
+
+class KeysetPaginatorTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def walk(self, queryset, ordering: str, per_page: int) -> list[int]:
+        paginator = KeysetPaginator(queryset, ordering=ordering, per_page=per_page)
+        page = paginator.page()
+        pks = [obj.pk for obj in page]
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            pks.extend(obj.pk for obj in page)
+        return pks
+
+    def test_pages_follow_full_ordering(self):
+        queryset = Product.objects.annotate(price=F("listing__min_price"))
+        for ordering in ("price", "-price", "pk"):
+            expected = list(KeysetPaginator(queryset, ordering, per_page=1).get_ordered_queryset())
+            self.assertEqual(self.walk(queryset, ordering, per_page=3), [obj.pk for obj in expected])
+
+    def test_foreign_cursor_is_ignored(self):
+        queryset = Product.objects.all()
+        page = KeysetPaginator(queryset, "pk", per_page=3).page()
+        restarted = KeysetPaginator(queryset, "-pk", per_page=3).page(page.next_cursor)
+        self.assertIsNone(restarted.cursor)
+        self.assertEqual(restarted.object_list[0].pk, Product.objects.order_by("-pk").first().pk)
+
+    def test_approximate_count(self):
+        self.assertEqual(approximate_count(Product.objects.all(), 3), (3, False))
+        self.assertEqual(approximate_count(Product.objects.all(), 100), (Product.objects.count(), True))
+
+
+class CacheRegistryTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_price_change_evicts_only_its_product(self):
+        price = Price.objects.filter(product_id=1).first()
+        other = Product.objects.exclude(pk=price.product_id).first()
+        cache_registry.PRODUCT.set("first", pk=price.product_id)
+        cache_registry.PRODUCT.set("second", pk=other.pk)
+        cache_registry.OFFERS.set("offers")
+
+        price.price += 1
+        price.save()
+        self.assertIsNone(cache_registry.PRODUCT.get(pk=price.product_id))
+        self.assertEqual(cache_registry.PRODUCT.get(pk=other.pk), "second")
+        self.assertIsNone(cache_registry.OFFERS.get())
+
+    def test_wildcard_tags(self):
+        cache_registry.HOT_OFFERS.set("hot")
+        cache_registry.ORDER.set("order", pk=1)
+        cache_registry.invalidate_tags("discount:5")
+        self.assertIsNone(cache_registry.HOT_OFFERS.get())
+        self.assertEqual(cache_registry.ORDER.get(pk=1), "order")
+
+    def test_invalidate_all_keeps_other_keys(self):
+        cache.set("unrelated", 1)
+        cache_registry.BANNERS.set("banners")
+        cache_registry.invalidate_all()
+        self.assertIsNone(cache_registry.BANNERS.get())
+        self.assertEqual(cache.get("unrelated"), 1)
+        self.assertEqual(cache_registry.BANNERS.get_or_set(lambda: "fresh"), "fresh")
+        self.assertEqual(cache_registry.BANNERS.get(), "fresh")
+
+
+class CacheFragmentTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    template = Template(
+        '{% load core_tags %}{% cachefragment "catalog_card" product.pk %}{{ product.name }}{% endcachefragment %}'
+    )
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, product: Product) -> str:
+        return self.template.render(Context({"product": product}))
+
+    def test_fragment_rendered_until_product_changes(self):
+        product = Product.objects.get(pk=1)
+        self.assertEqual(self.render(product), product.name)
+
+        stale = Product(pk=1, name="other")
+        self.assertEqual(self.render(stale), product.name)
+        with translation.override("ru"):
+            self.assertEqual(self.render(stale), "other")
+
+        product.name = "renamed"
+        product.save()
+        self.assertEqual(self.render(product), "renamed")
+
+    def test_unknown_fragment(self):
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{% load core_tags %}{% cachefragment "unknown" 1 %}{% endcachefragment %}')
+
+
+class AnonymousPageCacheTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        cache.clear()
+        with translation.override("en"):
+            self.url = reverse("catalog:product_detail", kwargs={"pk": 1})
+
+    def test_page_served_from_cache(self):
+        with translation.override("en"):
+            url = reverse("core:index")
+        response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertNotContains(response, CSRF_PLACEHOLDER)
+
+    def test_product_page_hit_records_view(self):
+        self.client.get(self.url)
+        self.client.cookies.pop(settings.SESSION_COOKIE_NAME, None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertContains(response, Product.objects.get(pk=1).name)
+        self.assertNotContains(response, CSRF_PLACEHOLDER)
+        self.assertContains(response, 'name="csrfmiddlewaretoken" value="')
+        self.assertIn("1", self.client.session[settings.VIEWED_SESSION_ID])
+
+    def test_product_change_invalidates_page(self):
+        self.client.get(self.url)
+        product = Product.objects.get(pk=1)
+        product.name = "renamed product"
+        product.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "renamed product")
+
+    def test_authenticated_user_bypasses_cache(self):
+        self.client.get(self.url)
+        user = CustomUser.objects.create_user(username="cached", email="cached@example.com", password="password")
+        self.client.force_login(user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(response.has_header("X-Page-Cache"))
+
+    def test_only_authenticated_sessions_are_saved_every_request(self):
+        with translation.override("en"):
+            url = reverse("core:index")
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+        user = CustomUser.objects.create_user(username="session", email="session@example.com", password="password")
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+
+class CacheStampedeTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.entry = cache_registry.CacheEntry("test", "test_{pk}", tags=("product:{pk}",), timeout=60, lock_wait=2)
+        self.lock_key = cache_registry.CACHE_LOCK_KEY.format(key="test_1")
+
+    def fail_compute(self):
+        raise AssertionError("value must not be recomputed")
+
+    def test_stale_value_served_while_recomputed_elsewhere(self):
+        self.entry.set("old", pk=1)
+        cache_registry.invalidate_tags("product:1")
+        cache.add(self.lock_key, 1)
+        self.assertEqual(self.entry.get_or_set(self.fail_compute, pk=1), "old")
+
+        cache.delete(self.lock_key)
+        self.assertEqual(self.entry.get_or_set(lambda: "new", pk=1), "new")
+        self.assertIsNone(cache.get(self.lock_key))
+
+    def test_waits_for_value_computed_elsewhere(self):
+        cache.add(self.lock_key, 1)
+        timer = threading.Timer(0.1, lambda: self.entry.set("computed", pk=1))
+        timer.start()
+        try:
+            self.assertEqual(self.entry.get_or_set(self.fail_compute, pk=1), "computed")
+        finally:
+            timer.cancel()
+
+    def test_early_refresh_depends_on_compute_time(self):
+        now = time.time()
+        self.assertFalse(self.entry.should_refresh({"expires": now + 30, "delta": 0}, now))
+        self.assertTrue(self.entry.should_refresh({"expires": now + 30, "delta": 10**6}, now))
+        self.assertTrue(self.entry.should_refresh({"expires": now - 1, "delta": 0}, now))
+        self.assertFalse(self.entry.should_refresh({"expires": None, "delta": 10**6}, now))
+
+
+class CacheWarmerTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_warm_then_fresh(self):
+        results = warmers.warm_all()
+        self.assertTrue(results)
+        self.assertEqual({result.status for result in results}, {warmers.WARMED})
+        self.assertIn(cache_registry.CATEGORY_MENU.make_key(), {result.key for result in results})
+        self.assertIsNotNone(cache_registry.CATEGORY_MENU.get())
+
+        self.assertEqual({result.status for result in warmers.warm_all()}, {warmers.FRESH})
+        self.assertEqual({result.status for result in warmers.warm_all(ahead=10**9)}, {warmers.WARMED})
+
+    def test_command_reports_timing(self):
+        out = io.StringIO()
+        call_command("warm_cache", stdout=out)
+        self.assertIn(f"{cache_registry.BANNERS.make_key()}: warmed in", out.getvalue())
+
+
+class TopProductsTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.top_ids = get_top_product_ids()
+
+    def expected_ids(self) -> list[int]:
+        return list(
+            Product.objects.filter(archived=False)
+            .order_by("sorting_index", "-listing__sold_total", "pk")
+            .values_list("pk", flat=True)[:8]
+        )
+
+    def test_top_products_follow_listing(self):
+        self.assertEqual(self.top_ids, self.expected_ids())
+        with self.assertNumQueries(1):
+            products = IndexView().get_top_products()
+        self.assertEqual([product.pk for product in products], self.top_ids)
+
+    def test_only_relevant_changes_reset_ranking(self):
+        outsider = Product.objects.filter(archived=False).exclude(pk__in=self.top_ids).order_by("pk").first()
+        price = outsider.prices.first()
+        price.price += 1
+        price.save()
+        self.assertIsNotNone(cache_registry.TOP_PRODUCTS.get())
+
+        price.sold_quantity = ProductListing.objects.get(product_id=self.top_ids[-1]).sold_total + 1000
+        price.save()
+        self.assertIsNone(cache_registry.TOP_PRODUCTS.get())
+        self.assertIn(outsider.pk, get_top_product_ids())
+        self.assertEqual(get_top_product_ids(), self.expected_ids())
+
+
+class ProductPoolTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        cache.clear()
+        Product.objects.filter(pk__in=[1, 2, 3]).update(limited_edition=True)
+        self.price_ids = set(Price.objects.filter(product_id__in=[1, 2, 3]).values_list("pk", flat=True))
+        self.pool = get_product_pool(LIMITED_EDITION_PRICES)
+
+    def test_sample_is_distinct_subset(self):
+        self.assertEqual(set(self.pool.sample(len(self.price_ids) + 5)), self.price_ids)
+        ids = self.pool.sample(2)
+        self.assertEqual(len(set(ids)), 2)
+        self.assertLessEqual(set(ids), self.price_ids)
+        daily_offer = IndexView.build_daily_offer_and_limited_editions()["daily_offer"]
+        self.assertIn(daily_offer.pk, self.price_ids)
+
+    def test_warm_sample_runs_no_queries(self):
+        self.pool.sample(1)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.pool.sample(2)), 2)
+
+    def test_pool_is_rebuilt_after_discount_changes(self):
+        self.assertEqual(get_product_pool(DISCOUNTED_PRODUCTS).sample(3), [])
+        discount = Discount.objects.create(
+            name="hot",
+            kind=Discount.PRODUCT,
+            method=Discount.PERCENT,
+            percent=10,
+            end_date=timezone.now().date() + timedelta(days=1),
+        )
+        discount.products.add(1)
+        products = Discount.get_discounted_products(3)
+        self.assertEqual([product.pk for product in products], [1])
+        self.assertEqual(products[0].price, Price.objects.filter(product_id=1).order_by("price").first().price)
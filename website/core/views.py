@@ -3,31 +3,30 @@ import datetime
 from catalog.models import Category
 from catalog.models import Price
 from catalog.models import Product
+from catalog.top_products import get_top_product_ids
 from discount.models import Discount
 
-from django.core.cache import cache
 from django.db import DatabaseError
 from django.db.models import Count
+from django.db.models import F
 from django.db.models import Min
-from django.db.models import OuterRef
 from django.db.models import Q
-from django.db.models import Subquery
-from django.db.models import Sum
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import TemplateView
 from rest_framework.exceptions import ValidationError
 
-from website.settings import BANNERS_KEY
-from website.settings import CATEGORY_CASHING_TIME
-from website.settings import CATEGORY_KEY
-from website.settings import HOT_OFFER_KEY
-from website.settings import OFFER_KEY
-
+from .cache import BANNERS
+from .cache import CATEGORIES
+from .cache import HOT_OFFERS
+from .cache import OFFERS
 from .models import Banner
+from .page_cache import PageCacheMixin
+from .product_pool import LIMITED_EDITION_PRICES
+from .product_pool import get_product_pool
 
 
-class IndexView(TemplateView):
+class IndexView(PageCacheMixin, TemplateView):
     """
     View для отображения главной страницы.
 
@@ -37,12 +36,14 @@ class IndexView(TemplateView):
 
     Атрибуты:
         template_name (str): Путь к шаблону, который будет использован для рендеринга страницы.
+        page_cache (str): Страница в кэше для анонимных посетителей.
 
     Возвращает:
         HttpResponse: Рендерит главную страницу с контекстом, содержащим категории и баннеры.
     """
 
     template_name = "core/main_page.html"
+    page_cache = "index"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -57,16 +58,7 @@ class IndexView(TemplateView):
 
     def get_categories(self):
         """Получает случайные 3 случайные категории из кэша или базы данных."""
-        categories = cache.get(CATEGORY_KEY)
-        if categories is None:
-            categories = (
-                Category.objects.filter(archived=False)
-                .annotate(products_count=Count("products", filter=Q(products__archived=False)))
-                .filter(products_count__gt=0)
-                .order_by("?")[:3]
-                .prefetch_related("products")
-            )
-            cache.set(CATEGORY_KEY, categories, timeout=CATEGORY_CASHING_TIME)
+        categories = CATEGORIES.get_or_set(self.build_categories)
 
         favorite_categories = []
 
@@ -87,68 +79,84 @@ class IndexView(TemplateView):
                     )
         return favorite_categories
 
+    @staticmethod
+    def build_categories():
+        """Выбирает 3 случайные не архивные категории, в которых есть товары"""
+        return list(
+            Category.objects.filter(archived=False)
+            .annotate(products_count=Count("products", filter=Q(products__archived=False)))
+            .filter(products_count__gt=0)
+            .order_by("?")[:3]
+            .prefetch_related("products")
+        )
+
     def get_banners(self):
         """Получает 3 случайных баннеров из кэша или базы данных."""
-        random_banners = cache.get(BANNERS_KEY)
-        if random_banners is None:
-            try:
-                random_banners = (
-                    Banner.objects.select_related("product")
-                    .filter(Q(active=True) & Q(deadline_data__gt=timezone.now().date()))
-                    .order_by("?")[:3]
-                    .only("product__name", "product__preview", "product__short_description", "text")
-                )
-                cache.set(BANNERS_KEY, random_banners, timeout=CATEGORY_CASHING_TIME)
-            except DatabaseError:
-                raise ValidationError(_("Error receiving data for banners"))
-            except Exception as e:
-                raise ValidationError(_(f"Unexpected error in receiving banners:{e}"))
-        return random_banners
+        return BANNERS.get_or_set(self.build_banners)
+
+    @staticmethod
+    def build_banners():
+        """Выбирает 3 случайных активных баннера"""
+        try:
+            return list(
+                Banner.objects.select_related("product")
+                .filter(Q(active=True) & Q(deadline_data__gt=timezone.now().date()))
+                .order_by("?")[:3]
+                .only("product__name", "product__preview", "product__short_description", "text")
+            )
+        except DatabaseError:
+            raise ValidationError(_("Error receiving data for banners"))
+        except Exception as e:
+            raise ValidationError(_(f"Unexpected error in receiving banners:{e}"))
 
     def get_top_products(self):
-        """Получает топ-товары из базы данных.(первые 8 товаров по индексу сортировки)"""
-        price_subquery = Price.objects.filter(product=OuterRef("pk")).values("pk")
-        top_products = (
-            Product.objects.filter(archived=False)
+        """
+        Получает топ-товары (первые 8 товаров по индексу сортировки и продажам).
+        Рейтинг берётся из кэша, а товары загружаются по id вместе с ценой из витрины каталога.
+        """
+        top_product_ids = get_top_product_ids()
+        products = (
+            Product.objects.filter(pk__in=top_product_ids)
+            .select_related("category")
             .annotate(
-                price=Min("prices__price"),
-                total_sold=Sum("prices__sold_quantity"),
-                price_pk=Subquery(price_subquery),
+                price=F("listing__min_price"),
+                total_sold=F("listing__sold_total"),
+                price_pk=F("listing__price_pk"),
             )
-            .order_by("sorting_index", "-total_sold")[:8]
+            .in_bulk()
         )
-        return top_products
+        return [products[pk] for pk in top_product_ids if pk in products]
 
     def get_daily_offer_and_limited_editions(self):
         """Получает случайный товар с ограниченным тиражом для блока 'Предложение дня'
         и оставшиеся 15 предложений для слайдера Ограниченный тираж
         """
-        offers = cache.get(OFFER_KEY)
-        if offers is None:
-            limited_edition_products = Price.objects.select_related("product").filter(product__limited_edition=True)
-            if limited_edition_products.exists():
-                daily_offer = limited_edition_products.order_by("?").first()
-                daily_offer_product = daily_offer.product
-                daily_offer_product_with_new_price = daily_offer_product.prices.order_by("price").first()
-                daily_offer_new_price = daily_offer_product_with_new_price.price
-
-                last_limited_editions_products = limited_edition_products.exclude(id=daily_offer.id)[:16]
-                today = datetime.datetime.now() + datetime.timedelta(days=2)
-                today_formatted = today.strftime("%d.%m.%Y %H:%M")
-                offers = {
-                    "daily_offer": daily_offer,
-                    "daily_offer_new_price": daily_offer_new_price,
-                    "last_limited_editions_products": last_limited_editions_products,
-                    "today": today_formatted,
-                }
-            cache.set(OFFER_KEY, offers, timeout=CATEGORY_CASHING_TIME)
-        return offers
+        return OFFERS.get_or_set(self.build_daily_offer_and_limited_editions)
+
+    @staticmethod
+    def build_daily_offer_and_limited_editions():
+        """Выбирает предложение дня и товары для слайдера ограниченного тиража"""
+        limited_edition_products = Price.objects.select_related("product").filter(product__limited_edition=True)
+        daily_offer_ids = get_product_pool(LIMITED_EDITION_PRICES).sample(1)
+        daily_offer = limited_edition_products.filter(pk__in=daily_offer_ids).first()
+        if daily_offer is None:
+            return None
+
+        daily_offer_product = daily_offer.product
+        daily_offer_product_with_new_price = daily_offer_product.prices.order_by("price").first()
+        daily_offer_new_price = daily_offer_product_with_new_price.price
+
+        last_limited_editions_products = list(limited_edition_products.exclude(id=daily_offer.id)[:16])
+        today = datetime.datetime.now() + datetime.timedelta(days=2)
+        today_formatted = today.strftime("%d.%m.%Y %H:%M")
+        return {
+            "daily_offer": daily_offer,
+            "daily_offer_new_price": daily_offer_new_price,
+            "last_limited_editions_products": last_limited_editions_products,
+            "today": today_formatted,
+        }
 
     def get_hot_offers(self):
         """В слайдер с горячими предложениями попадает до девяти случайных товаров,
         на которые действует какая-нибудь акция"""
-        hot_offers = cache.get(HOT_OFFER_KEY)
-        if hot_offers is None:
-            hot_offers = Discount.get_discounted_products(amount=8)
-        cache.set(HOT_OFFER_KEY, hot_offers, timeout=CATEGORY_CASHING_TIME)
-        return hot_offers
+        return HOT_OFFERS.get_or_set(lambda: Discount.get_discounted_products(amount=8))
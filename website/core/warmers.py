@@ -0,0 +1,114 @@
+"""
+Прогрев кэша главной страницы, меню категорий и индексов фильтров популярных категорий.
+
+Используется периодической задачей core.tasks.warm_cache и командой warm_cache,
+которую запускают после деплоя.
+"""
+
+import time
+from dataclasses import dataclass
+from functools import partial
+from typing import Any
+from typing import Callable
+
+from catalog.facets import CategoryFacetIndex
+from catalog.models import Category
+from discount.models import Discount
+from django.db.models import Count
+from django.db.models import Q
+
+from website.settings import CACHE_WARM_AHEAD
+from website.settings import CACHE_WARM_TOP_CATEGORIES
+
+from .cache import BANNERS
+from .cache import CATEGORIES
+from .cache import CATEGORY_FACETS
+from .cache import CATEGORY_MENU
+from .cache import HOT_OFFERS
+from .cache import OFFERS
+from .cache import CacheEntry
+from .templatetags.core_tags import build_category_menu
+from .views import IndexView
+
+WARMED = "warmed"
+FRESH = "fresh"
+LOCKED = "locked"
+FAILED = "failed"
+
+
+@dataclass
+class Warmer:
+    """
+    Запись кэша, которую нужно прогреть.
+
+    Attributes:
+        entry: запись реестра кэша
+        compute: функция вычисления значения
+        params: параметры ключа записи
+    """
+
+    entry: CacheEntry
+    compute: Callable[[], Any]
+    params: dict
+
+    @property
+    def key(self) -> str:
+        return self.entry.make_key(**self.params)
+
+
+@dataclass
+class WarmResult:
+    key: str
+    status: str
+    seconds: float
+    error: str = ""
+
+
+def get_top_category_ids(limit: int = CACHE_WARM_TOP_CATEGORIES) -> list[int]:
+    """Возвращает id не архивных категорий с наибольшим количеством товаров"""
+    return list(
+        Category.objects.filter(archived=False)
+        .annotate(products_count=Count("products", filter=Q(products__archived=False)))
+        .filter(products_count__gt=0)
+        .order_by("-products_count", "pk")
+        .values_list("pk", flat=True)[:limit]
+    )
+
+
+def get_warmers() -> list[Warmer]:
+    """Возвращает список прогреваемых записей"""
+
+    warmers = [
+        Warmer(CATEGORY_MENU, build_category_menu, {}),
+        Warmer(CATEGORIES, IndexView.build_categories, {}),
+        Warmer(BANNERS, IndexView.build_banners, {}),
+        Warmer(OFFERS, IndexView.build_daily_offer_and_limited_editions, {}),
+        Warmer(HOT_OFFERS, partial(Discount.get_discounted_products, amount=8), {}),
+    ]
+    for category_id in get_top_category_ids():
+        warmers.append(
+            Warmer(CATEGORY_FACETS, partial(CategoryFacetIndex.build, category_id), {"category_id": category_id})
+        )
+    return warmers
+
+
+def warm(warmer: Warmer, ahead: float = CACHE_WARM_AHEAD, force: bool = False) -> WarmResult:
+    """
+    Пересчитывает запись, если её нет, она устарела или истекает менее чем через
+    ahead секунд. Возвращает результат с временем пересчёта.
+    """
+
+    started = time.monotonic()
+    remaining = warmer.entry.remaining(**warmer.params)
+    if not force and remaining is not None and remaining > ahead:
+        return WarmResult(warmer.key, FRESH, time.monotonic() - started)
+
+    try:
+        refreshed = warmer.entry.refresh(warmer.compute, **warmer.params)
+    except Exception as error:
+        return WarmResult(warmer.key, FAILED, time.monotonic() - started, str(error))
+    return WarmResult(warmer.key, WARMED if refreshed else LOCKED, time.monotonic() - started)
+
+
+def warm_all(ahead: float = CACHE_WARM_AHEAD, force: bool = False) -> list[WarmResult]:
+    return [warm(warmer, ahead=ahead, force=force) for warmer in get_warmers()]
@@ -1,4 +1,6 @@
 from catalog.models import Viewed
+from core import cache as cache_registry
+from core.pagination import KeysetPaginationMixin
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate
@@ -10,7 +12,6 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.views import LogoutView
-from django.core.cache import cache
 from django.db.models import Prefetch
 from django.http import HttpRequest
 from django.http import HttpResponse
@@ -251,7 +252,7 @@ class PersonalCabinet(LoginRequiredMixin, DetailView):
         return queryset
 
 
-class ProfileOrdersView(LoginRequiredMixin, ListView):
+class ProfileOrdersView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """
     CBV для отображения заказов профиля.
     Доступно только аутентифицированным пользователям.
@@ -260,11 +261,17 @@ class ProfileOrdersView(LoginRequiredMixin, ListView):
 
     Атрибуты:
         template_name - шаблон для отображения заказов профиля пользователя
+        keyset_paginate_by - размер страницы при постраничном просмотре по курсору (?cursor=)
 
     """
 
     template_name = "custom_auth/profile_orders.html"
     context_object_name = "orders"
+    keyset_paginate_by = 10
+
+    def get_keyset_ordering(self):
+        """Заказы листаются от новых к старым"""
+        return "-created_at"
 
     def get_queryset(self):
         """
@@ -304,6 +311,7 @@ class ProfileOrdersView(LoginRequiredMixin, ListView):
             .only(
                 "delivery_price",
                 "paid_status",
+                "created_at",
             )
         )
         return user_orders
@@ -443,19 +451,19 @@ class ResetCashView(AdminRequiredMixin, View):
         button_names = request.POST.dict()
 
         if "reset_all" in button_names:
-            cache.clear()
+            cache_registry.invalidate_all()
             context["result"] = _("The cache of all services has been successfully reset!")
         if "banners" in button_names:
-            cache.delete(settings.BANNERS_KEY)
+            cache_registry.BANNERS.delete()
             context["result"] = _("The cache of the banner service has been successfully reset!")
         if "category" in button_names:
-            cache.delete(settings.CATEGORY_KEY)
+            cache_registry.CATEGORIES.delete()
             context["result"] = _("The category menu cache has been successfully reset!")
         if "daily_offer" in button_names:
-            cache.delete(settings.OFFER_KEY)
+            cache_registry.OFFERS.delete()
             context["result"] = _("The cache of the day's offer service has been successfully reset!")
         if "hot_offer" in button_names:
-            cache.delete(settings.HOT_OFFER_KEY)
+            cache_registry.HOT_OFFERS.delete()
             context["result"] = _("The cache of the hot offers service has been successfully reset!")
 
         return render(request, self.template_name, context=context)
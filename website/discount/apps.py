@@ -8,3 +8,7 @@ class DiscountConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "discount"
+
+    def ready(self):
+        """Для работы сигналов"""
+        import discount.signals
@@ -0,0 +1,18 @@
+from discount.models import EffectivePrice
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Полный пересчёт цен со скидкой EffectivePrice.
+    Запускается после деплоя/миграций; дальше цены поддерживаются сигналами и задачами.
+    """
+
+    help = "Rebuild the effective (discounted) prices of all products"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Products per batch")
+
+    def handle(self, *args, **options):
+        total = EffectivePrice.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Effective prices rebuilt for {total} prices"))
@@ -0,0 +1,16 @@
+from discount.sweeper import sweep
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Приводит флаг Discount.is_current в соответствие с сегодняшним днём.
+    Запускается после деплоя/миграций, до rebuild_effective_prices; дальше флаг
+    поддерживается сохранением скидок и задачей sweep_discounts.
+    """
+
+    help = "Mark the discounts that are active today"
+
+    def handle(self, *args, **options):
+        changed = sweep()
+        self.stdout.write(self.style.SUCCESS(f"Discounts switched: {len(changed)}"))
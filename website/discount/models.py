@@ -1,6 +1,7 @@
+from datetime import date
 from decimal import Decimal
-from random import choices
 from typing import Dict
+from typing import Iterable
 from typing import List
 from typing import Optional
 from typing import Sequence
@@ -8,6 +9,9 @@ from typing import Sequence
 from catalog.models import Category
 from catalog.models import Price
 from catalog.models import Product
+from catalog.models import Seller
+from core.product_pool import DISCOUNTED_PRODUCTS
+from core.product_pool import get_product_pool
 from django.db import models
 from django.db.models import Max
 from django.db.models import Min
@@ -18,6 +22,8 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from pytils.translit import slugify
 
+CENT = Decimal("0.01")
+
 
 class ProductGroup(models.Model):
     """
@@ -83,6 +89,9 @@ class Discount(models.Model):
         end_date: дата окончания действия скидки
         is_active: статус актуальности скидки
         archived: механизм мягкого удаления скидки
+        is_current: скидка действует сегодня (активна, не в архиве и сегодня в периоде действия).
+            Поле вычисляется при сохранении и переключается планировщиком (discount.sweeper)
+            на границах периодов действия, поэтому запросы не проверяют даты
         products: связь многие-ко-многим с продуктами, к которым применима скидка. Связь используется,
             если выбран вид скидки "Скидка на товар"
         categories: связь многие-ко-многим с категориями товаров, к которым применима скидка. Связь
@@ -190,6 +199,7 @@ class Discount(models.Model):
     end_date = models.DateField(verbose_name=_("End Date"))
     is_active = models.BooleanField(default=True, verbose_name=_("Is active?"))
     archived = models.BooleanField(default=False, verbose_name=_("Archived status"))
+    is_current = models.BooleanField(default=False, db_index=True, editable=False, verbose_name=_("Is current?"))
 
     products = models.ManyToManyField(
         Product,
@@ -232,8 +242,16 @@ class Discount(models.Model):
         if not self.slug or self.name != Discount.objects.filter(pk=self.pk).first().name:
             self.slug = slugify(self.name)
 
+        self.is_current = self.is_current_on(timezone.now().date())
         super().save(*args, **kwargs)
 
+    def is_current_on(self, day: date) -> bool:
+        """Действует ли скидка в день day"""
+
+        start_date = self._meta.get_field("start_date").to_python(self.start_date)
+        end_date = self._meta.get_field("end_date").to_python(self.end_date)
+        return self.is_active and not self.archived and start_date <= day <= end_date
+
     def get_absolute_url(self):
         return reverse("discount:discount-detail", kwargs={"slug": self.slug})
 
@@ -244,36 +262,11 @@ class Discount(models.Model):
         Используется во избежание дублирования кода в методах cls.get_discounts и cls.get_priority_discount
         """
 
-        today = timezone.now().date()
-
         if isinstance(products, Product):
             products = [products]
 
         return (
-            Discount.objects.filter(
-                Q(
-                    products__in=products,
-                    categories__products__in=products,
-                    is_active=True,
-                    archived=False,
-                    start_date__lte=today,
-                    end_date__gte=today,
-                )
-                | Q(
-                    products__in=products,
-                    is_active=True,
-                    archived=False,
-                    start_date__lte=today,
-                    end_date__gte=today,
-                )
-                | Q(
-                    categories__products__in=products,
-                    is_active=True,
-                    archived=False,
-                    start_date__lte=today,
-                    end_date__gte=today,
-                )
-            )
+            Discount.objects.filter(Q(products__in=products) | Q(categories__products__in=products), is_current=True)
             .distinct()
             .order_by(
                 "-priority",
@@ -287,6 +280,7 @@ class Discount(models.Model):
                 "end_date",
                 "is_active",
                 "archived",
+                "is_current",
                 "quantity_l",
                 "quantity_g",
                 "total_cost_l",
@@ -330,21 +324,11 @@ class Discount(models.Model):
             Discount: приоритетная скидка или None
         """
 
-        if isinstance(products, Product):
-            return cls.__get_discounts_queryset(products).first()
-
-        priority_discount: Discount = cls.__get_discounts_queryset(products).first()
-
-        if priority_discount:
-            discounted_products = priority_discount.products.all()
-            discounted_categories = Category.objects.filter(
-                id__in=priority_discount.categories.values_list("id", flat=True)
-            )
-            products_from_discounted_categories = Product.objects.filter(category__in=discounted_categories)
-            products_from_priority_discount = set(discounted_products.union(products_from_discounted_categories))
+        from .rules import get_discount_rules
 
-            if set(products).issubset(products_from_priority_discount):
-                return priority_discount
+        if isinstance(products, Product):
+            products = [products]
+        return get_discount_rules().priority_discount(list(products))
 
     @classmethod
     def get_discounted_price(
@@ -364,6 +348,14 @@ class Discount(models.Model):
         """
 
         if price is None:
+            price = (
+                EffectivePrice.objects.filter(product=product)
+                .order_by("-base_price")
+                .values_list("base_price", flat=True)
+                .first()
+            )
+        if price is None:
+            # строки EffectivePrice ещё не рассчитаны (rebuild_effective_prices)
             price = Price.objects.filter(product=product).aggregate(Max("price"))["price__max"] or 0
 
         cart_elem = {
@@ -375,18 +367,53 @@ class Discount(models.Model):
             cart_elem.update(discounted_price=price, is_discounted=False)
             return cart_elem
 
-        if discount.method == Discount.PERCENT:
-            cart_elem.update(discounted_price=price - (price * discount.percent / 100))
-            return cart_elem
+        cart_elem.update(discounted_price=discount.apply(price))
+        return cart_elem
 
-        if discount.method == Discount.SUMM:
-            discounted_price = price - discount.price
-            cart_elem.update(discounted_price=discounted_price if discounted_price > 0 else 1)
-            return cart_elem
+    @classmethod
+    def get_priority_discounts_bulk(
+        cls, product_ids: Iterable[int]
+    ) -> Dict[int, Dict[str, Optional["Discount"] | Decimal | bool]]:
+        """
+        Возвращает приоритетную скидку и цену со скидкой для каждого из товаров одним запросом.
+        Цены берутся из рассчитанных заранее строк EffectivePrice: для товара выбирается предложение
+        продавца с самой низкой ценой со скидкой. Подходит для страниц со списками товаров,
+        где расчёт скидки для каждой карточки через get_priority_discount дал бы запрос на карточку.
 
-        if discount.method == Discount.FIXED:
-            cart_elem.update(discounted_price=discount.price)
-            return cart_elem
+        Attributes:
+            product_ids: id товаров
+
+        Returns:
+            Dict: словарь id товара → {'discount': Discount | None, 'price': Decimal,
+                'discounted_price': Decimal, 'is_discounted': bool}. Товары без предложений
+                продавцов в словарь не попадают.
+        """
+
+        return {
+            product_id: {
+                "discount": effective.discount,
+                "price": effective.base_price,
+                "discounted_price": effective.discounted_price,
+                "is_discounted": effective.discount_id is not None,
+            }
+            for product_id, effective in EffectivePrice.for_products(product_ids).items()
+        }
+
+    def apply(self, price: Decimal) -> Decimal:
+        """
+        Рассчитывает цену со скидкой в зависимости от механизма скидки
+        """
+
+        if self.method == Discount.PERCENT:
+            return price - (price * self.percent / 100)
+
+        if self.method == Discount.SUMM:
+            discounted_price = price - self.price
+            return discounted_price if discounted_price > 0 else Decimal(1)
+
+        if self.method == Discount.FIXED:
+            return self.price
+        return price
 
     @classmethod
     def get_cart_discount(cls, cart: List[Dict[str, Product | Decimal]]) -> List[Dict[str, Product | Decimal | bool]]:
@@ -394,6 +421,7 @@ class Discount(models.Model):
         Метод ищет приоритетную скидку на корзину или набор/группу на основе коллекции позиций корзины.
         Если такая скидка не найдена, то ищет приоритетную скидку на список товаров из корзины.
         Если и такая скидка не найдена, то ищет приоритетную скидку для каждого товара по отдельности.
+        Скидки берутся из индекса в памяти (discount.rules), запросы к базе не выполняются.
 
         Attributes:
             cart: коллекция позиций корзины вида {'product': Product, 'price': Decimal}
@@ -403,57 +431,23 @@ class Discount(models.Model):
                 [{'product': Product, 'price': Decimal, 'discounted_price': Decimal, is_discounted: bool}, ...]
         """
 
-        today = timezone.now().date()
-        products = [elem["product"] for elem in cart]
+        from .rules import get_discount_rules
 
-        cart_priority_discount: Discount = (
-            Discount.objects.filter(
-                Q(
-                    quantity_l__lte=len(cart),
-                    quantity_g__gte=len(cart),
-                    total_cost_l__lte=sum([elem["price"] for elem in cart if elem["price"]]),
-                    is_active=True,
-                    archived=False,
-                    start_date__lte=today,
-                    end_date__gte=today,
-                )
-                | Q(
-                    product_groups__products__in=products,
-                    is_active=True,
-                    archived=False,
-                    start_date__lte=today,
-                    end_date__gte=today,
-                )
-            )
-            .order_by(
-                "-priority",
-                "-start_date",
-            )
-            .defer("name", "priority", "description", "start_date", "end_date", "is_active", "archived")
-            .first()
-        )
+        rules = get_discount_rules()
+        products = [elem["product"] for elem in cart]
+        total_cost = sum([elem["price"] for elem in cart if elem["price"]])
 
+        cart_priority_discount = rules.cart_discount(products, total_cost)
         if cart_priority_discount:
-            # расчёт скидки если применяется скидка на корзину
-            if cart_priority_discount.kind == Discount.CART:
+            # расчёт скидки если применяется скидка на корзину или на наборы/группу, в которые входят все товары
+            if cart_priority_discount.kind == Discount.CART or (
+                cart_priority_discount.kind == Discount.SET and rules.set_covers(cart_priority_discount, products)
+            ):
                 return [
                     cls.get_discounted_price(elem["product"], cart_priority_discount, elem["price"]) for elem in cart
                 ]
 
-            # проверка на наличие всех указанных продуктов в группах, на которые действует скидка
-            if cart_priority_discount.kind == Discount.SET:
-                products_from_discounted_groups = Product.objects.filter(
-                    product_groups__in=cart_priority_discount.product_groups.all()
-                ).all()
-
-                # расчёт скидки если применяется скидка на наборы/группу
-                if set(products).issubset(set(products_from_discounted_groups)):
-                    return [
-                        cls.get_discounted_price(elem["product"], cart_priority_discount, elem["price"])
-                        for elem in cart
-                    ]
-
-        products_priority_discount = cls.get_priority_discount(products)
+        products_priority_discount = rules.priority_discount(products)
         # расчёт скидки, если применяется скидка на список товаров и/или категории
         if products_priority_discount:
             return [
@@ -462,61 +456,170 @@ class Discount(models.Model):
 
         # поиск скидки на каждый товар и расчёт цены со скидкой
         return [
-            cls.get_discounted_price(elem["product"], cls.get_priority_discount(elem["product"]), elem["price"])
+            cls.get_discounted_price(elem["product"], rules.priority_discount([elem["product"]]), elem["price"])
             for elem in cart
         ]
 
     @classmethod
     def get_discounted_products(cls, amount: int) -> List[Product]:
         """
-        Возвращает список случайных товаров,
-        на которые действует какая-нибудь скидка
+        Возвращает список случайных различных товаров (не больше amount),
+        на которые действует какая-нибудь скидка. Товары выбираются из пула
+        товаров со скидкой (core.product_pool), поэтому выборка не просматривает каталог.
         :param amount: количество случайных товаров в списке
         """
 
-        today = timezone.now().date()
-        discounted_products = (
-            Product.objects.filter(
-                Q(
-                    discounts__is_active=True,
-                    discounts__archived=False,
-                    discounts__isnull=False,
-                    discounts__start_date__lte=today,
-                    discounts__end_date__gte=today,
-                    category__discounts__is_active=True,
-                    category__discounts__archived=False,
-                    category__discounts__isnull=False,
-                    category__discounts__start_date__lte=today,
-                    category__discounts__end_date__gte=today,
-                )
-                | Q(
-                    discounts__is_active=True,
-                    discounts__archived=False,
-                    discounts__isnull=False,
-                    discounts__start_date__lte=today,
-                    discounts__end_date__gte=today,
-                )
-                | Q(
-                    category__discounts__is_active=True,
-                    category__discounts__archived=False,
-                    category__discounts__isnull=False,
-                    category__discounts__start_date__lte=today,
-                    category__discounts__end_date__gte=today,
-                )
-                | Q(
-                    product_groups__discounts__is_active=True,
-                    product_groups__discounts__archived=False,
-                    product_groups__discounts__isnull=False,
-                    product_groups__discounts__start_date__lte=today,
-                    product_groups__discounts__end_date__gte=today,
-                )
-            )
+        product_ids = get_product_pool(DISCOUNTED_PRODUCTS).sample(amount)
+        products = (
+            Product.objects.filter(pk__in=product_ids)
             .annotate(
                 price=Min("prices__price"),
+                discounted_price=Min("prices__effective__discounted_price"),
             )
-            .all()
+            .in_bulk()
         )
-        try:
-            return choices(discounted_products, k=amount)
-        except IndexError:
-            return []
+        return [products[pk] for pk in product_ids if pk in products]
+
+
+class EffectivePrice(models.Model):
+    """
+    Цена предложения продавца с учётом приоритетной скидки на товар (одна строка на цену Price).
+    Скидки на товар и его категорию применяются заранее, поэтому страницы читают готовую цену
+    вместо расчёта скидок. Скидки на корзину и наборы зависят от состава корзины и здесь не учитываются.
+
+    Строки пересчитываются при изменении цен и товаров (discount.signals), после изменения скидок
+    (задача refresh_effective_prices) и по окончании срока действия (discount.sweeper).
+
+    Attributes:
+        price: цена продавца, для которой рассчитана строка
+        product: товар (копия Price.product)
+        seller: продавец (копия Price.seller)
+        base_price: цена без скидки
+        discounted_price: цена с учётом скидки
+        discount: приоритетная скидка, которая действует на товар, или None
+        valid_from: день, в который рассчитана цена
+        valid_until: первый день, когда скидка товара может смениться, или None
+    """
+
+    price = models.OneToOneField(
+        Price,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="effective",
+        verbose_name=_("Price"),
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="effective_prices",
+        verbose_name=_("Product"),
+    )
+    seller = models.ForeignKey(
+        Seller,
+        on_delete=models.CASCADE,
+        related_name="effective_prices",
+        verbose_name=_("Seller"),
+    )
+    base_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("Price"))
+    discounted_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("Discounted price"))
+    discount = models.ForeignKey(
+        Discount,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="effective_prices",
+        verbose_name=_("Discount"),
+    )
+    valid_from = models.DateField(verbose_name=_("Start Date"))
+    valid_until = models.DateField(null=True, blank=True, verbose_name=_("End Date"))
+
+    class Meta:
+        verbose_name = _("Effective price")
+        verbose_name_plural = _("Effective prices")
+        indexes = [
+            models.Index(fields=["product", "discounted_price"], name="effective_product_price_idx"),
+            models.Index(fields=["valid_until"], name="effective_valid_until_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"EffectivePrice(price_id={self.price_id}, discounted_price={self.discounted_price})"
+
+    @classmethod
+    def refresh(cls, product_ids: Iterable[int]) -> int:
+        """
+        Пересчитывает строки для цен указанных товаров по индексу скидок (discount.rules).
+        Возвращает количество пересчитанных цен.
+        """
+        from .rules import get_discount_rules
+
+        product_ids = set(product_ids)
+        if not product_ids:
+            return 0
+
+        rules = get_discount_rules()
+        prices = (
+            Price.objects.filter(product_id__in=product_ids)
+            .select_related("product")
+            .only("pk", "price", "seller_id", "product__id", "product__category_id")
+        )
+        rows = []
+        for price in prices:
+            discount = rules.priority_discount([price.product])
+            rows.append(
+                cls(
+                    price_id=price.pk,
+                    product_id=price.product_id,
+                    seller_id=price.seller_id,
+                    base_price=price.price,
+                    discounted_price=(discount.apply(price.price) if discount else price.price).quantize(CENT),
+                    discount=discount,
+                    valid_from=rules.day,
+                    valid_until=rules.next_change(price.product, discount),
+                )
+            )
+        cls.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["price"],
+            update_fields=[
+                "product",
+                "seller",
+                "base_price",
+                "discounted_price",
+                "discount",
+                "valid_from",
+                "valid_until",
+            ],
+        )
+        return len(rows)
+
+    @classmethod
+    def rebuild(cls, batch_size: int = 1000) -> int:
+        """
+        Пересчитывает цены всех товаров пачками. Возвращает количество пересчитанных цен.
+        """
+
+        product_ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+        return sum(
+            cls.refresh(product_ids[start : start + batch_size]) for start in range(0, len(product_ids), batch_size)
+        )
+
+    @classmethod
+    def refresh_expired(cls) -> int:
+        """Пересчитывает цены товаров, у которых наступил день смены скидки"""
+
+        today = timezone.now().date()
+        return cls.refresh(cls.objects.filter(valid_until__lte=today).values_list("product_id", flat=True).distinct())
+
+    @classmethod
+    def for_products(cls, product_ids: Iterable[int]) -> dict[int, "EffectivePrice"]:
+        """Возвращает самую низкую цену со скидкой для каждого из товаров одним запросом"""
+
+        best = {}
+        for effective in (
+            cls.objects.filter(product_id__in=set(product_ids))
+            .select_related("discount")
+            .order_by("product_id", "discounted_price", "price_id")
+        ):
+            best.setdefault(effective.product_id, effective)
+        return best
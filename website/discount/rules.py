@@ -0,0 +1,193 @@
+"""
+Индекс действующих скидок в памяти процесса.
+
+Действующие сегодня скидки (Discount.is_current) загружаются несколькими запросами и раскладываются по
+словарям: id товара → скидки, id категории → скидки, id группы → скидки, а скидки на
+корзину с порогами количества и стоимости — отдельным списком. Скидки в каждом списке
+упорядочены по приоритету, поэтому расчёт скидок корзины выполняется без запросов к базе.
+
+Индекс перестраивается, когда меняется версия тега "discount:*" (сигналы скидок и
+групп товаров, core.signals) или наступает новый день. Проверка версии — один запрос к кэшу.
+Для ещё не начавшихся скидок индекс хранит ближайшие даты начала по товарам и категориям,
+чтобы знать, до какого дня действует рассчитанная цена товара (next_change).
+"""
+
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import date
+from datetime import timedelta
+from decimal import Decimal
+from typing import Iterable
+from typing import Optional
+
+from catalog.models import Product
+from core.cache import GLOBAL_TAG
+from core.cache import get_tag_versions
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Discount
+from .models import ProductGroup
+
+RULES_TAGS = (GLOBAL_TAG, "discount:*")
+
+
+def priority_key(discount: Discount) -> tuple:
+    """Порядок скидок: сначала более приоритетные, затем начавшиеся позже"""
+    return -discount.priority, -discount.start_date.toordinal(), discount.pk
+
+
+@dataclass
+class DiscountRules:
+    """Скидки, действующие в день day, разложенные по товарам, категориям и группам"""
+
+    day: date
+    versions: dict[str, int]
+    by_product: dict[int, list[Discount]] = field(default_factory=dict)
+    by_category: dict[int, list[Discount]] = field(default_factory=dict)
+    by_group: dict[int, list[Discount]] = field(default_factory=dict)
+    thresholds: list[Discount] = field(default_factory=list)
+    product_groups: dict[int, set[int]] = field(default_factory=dict)
+    discount_products: dict[int, set[int]] = field(default_factory=dict)
+    discount_categories: dict[int, set[int]] = field(default_factory=dict)
+    discount_group_products: dict[int, set[int]] = field(default_factory=dict)
+    product_starts: dict[int, date] = field(default_factory=dict)
+    category_starts: dict[int, date] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, day: date, versions: dict[str, int]) -> "DiscountRules":
+        rules = cls(day=day, versions=versions)
+        discounts = {}
+        upcoming = {}
+        for discount in Discount.objects.filter(
+            Q(is_current=True) | Q(is_active=True, archived=False, start_date__gt=day)
+        ).defer("description"):
+            if discount.is_current:
+                discounts[discount.pk] = discount
+            else:
+                upcoming[discount.pk] = discount
+        relations = (
+            (Discount.products.through, "product_id", rules.by_product, rules.discount_products, rules.product_starts),
+            (
+                Discount.categories.through,
+                "category_id",
+                rules.by_category,
+                rules.discount_categories,
+                rules.category_starts,
+            ),
+        )
+        for through, column, index, members, starts in relations:
+            for discount_id, related_id in through.objects.filter(discount_id__in=[*discounts, *upcoming]).values_list(
+                "discount_id", column
+            ):
+                if discount_id in upcoming:
+                    start_date = upcoming[discount_id].start_date
+                    starts[related_id] = min(start_date, starts.get(related_id, start_date))
+                    continue
+                index.setdefault(related_id, []).append(discounts[discount_id])
+                members.setdefault(discount_id, set()).add(related_id)
+
+        discount_groups = {}
+        for discount_id, group_id in Discount.product_groups.through.objects.filter(
+            discount_id__in=discounts
+        ).values_list("discount_id", "productgroup_id"):
+            rules.by_group.setdefault(group_id, []).append(discounts[discount_id])
+            discount_groups.setdefault(discount_id, set()).add(group_id)
+        group_products = {}
+        for group_id, product_id in ProductGroup.products.through.objects.filter(
+            productgroup_id__in=rules.by_group
+        ).values_list("productgroup_id", "product_id"):
+            group_products.setdefault(group_id, set()).add(product_id)
+            rules.product_groups.setdefault(product_id, set()).add(group_id)
+        for discount_id, group_ids in discount_groups.items():
+            rules.discount_group_products[discount_id] = set().union(
+                *(group_products.get(group_id, ()) for group_id in group_ids)
+            )
+
+        rules.thresholds = [
+            discount
+            for discount in discounts.values()
+            if discount.quantity_l is not None and discount.quantity_g is not None
+        ]
+        for index in (rules.by_product, rules.by_category, rules.by_group):
+            for related in index.values():
+                related.sort(key=priority_key)
+        rules.thresholds.sort(key=priority_key)
+        return rules
+
+    @staticmethod
+    def first(candidates: Iterable[Discount]) -> Optional[Discount]:
+        return min(candidates, key=priority_key, default=None)
+
+    def covers(self, discount: Discount, product: Product) -> bool:
+        """Действует ли скидка на товар сама или через категорию товара"""
+        return product.pk in self.discount_products.get(discount.pk, ()) or product.category_id in (
+            self.discount_categories.get(discount.pk, ())
+        )
+
+    def product_discounts(self, product: Product) -> list[Discount]:
+        return [*self.by_product.get(product.pk, ()), *self.by_category.get(product.category_id, ())]
+
+    def priority_discount(self, products: list[Product]) -> Optional[Discount]:
+        """
+        Приоритетная скидка на товары или их категории, которая действует на все товары из списка
+        """
+        discount = self.first(discount for product in products for discount in self.product_discounts(product))
+        if discount is not None and all(self.covers(discount, product) for product in products):
+            return discount
+        return None
+
+    def next_change(self, product: Product, discount: Optional[Discount]) -> Optional[date]:
+        """
+        Первый день, когда приоритетная скидка товара может смениться: после окончания
+        действующей скидки discount или в день начала скидки на товар или его категорию
+        """
+        boundaries = [
+            boundary
+            for boundary in (
+                discount.end_date + timedelta(days=1) if discount is not None else None,
+                self.product_starts.get(product.pk),
+                self.category_starts.get(product.category_id),
+            )
+            if boundary is not None
+        ]
+        return min(boundaries, default=None)
+
+    def cart_discount(self, products: list[Product], total_cost: Decimal) -> Optional[Discount]:
+        """
+        Приоритетная скидка, подходящая по порогам корзины (количество позиций и стоимость)
+        или по группе, в которой состоит хотя бы один товар корзины
+        """
+        count = len(products)
+        by_threshold = (
+            discount
+            for discount in self.thresholds
+            if discount.quantity_l <= count <= discount.quantity_g and discount.total_cost_l <= total_cost
+        )
+        by_group = (
+            discount
+            for product in products
+            for group_id in self.product_groups.get(product.pk, ())
+            for discount in self.by_group[group_id]
+        )
+        return self.first([*by_threshold, *by_group])
+
+    def set_covers(self, discount: Discount, products: list[Product]) -> bool:
+        """Состоят ли все товары в группах скидки на наборы"""
+        members = self.discount_group_products.get(discount.pk, ())
+        return all(product.pk in members for product in products)
+
+
+_rules: DiscountRules | None = None
+
+
+def get_discount_rules() -> DiscountRules:
+    """Возвращает индекс скидок процесса, перестраивая его после изменения скидок или смены дня"""
+
+    global _rules
+    versions = get_tag_versions(RULES_TAGS)
+    today = timezone.now().date()
+    rules = _rules
+    if rules is None or rules.day != today or rules.versions != versions:
+        rules = _rules = DiscountRules.build(today, versions)
+    return rules
@@ -0,0 +1,44 @@
+from catalog.models import Price
+from catalog.models import Product
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Discount
+from .models import EffectivePrice
+from .tasks import refresh_effective_prices
+from .tasks import schedule_next_sweep
+
+
+@receiver(post_save, sender=Price)
+def price_effective_post_save_handler(sender, instance: Price, **kwargs):
+    """Пересчитывает цены со скидкой товара при изменении цены продавца"""
+    EffectivePrice.refresh([instance.product_id])
+
+
+@receiver(post_save, sender=Product)
+def product_effective_post_save_handler(sender, instance: Product, **kwargs):
+    """Скидки на категорию зависят от категории товара"""
+    EffectivePrice.refresh([instance.pk])
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+def discount_effective_handler(sender, **kwargs):
+    """Пересчитывает цены со скидкой в фоне после коммита изменений скидки"""
+    transaction.on_commit(refresh_effective_prices.delay)
+
+
+@receiver(post_save, sender=Discount)
+def discount_sweep_handler(sender, **kwargs):
+    """Период действия скидки мог сдвинуть ближайшую границу, на которую запланировано переключение скидок"""
+    transaction.on_commit(schedule_next_sweep)
+
+
+@receiver(m2m_changed, sender=Discount.products.through)
+@receiver(m2m_changed, sender=Discount.categories.through)
+def discount_relations_effective_handler(sender, action: str, **kwargs):
+    if action.startswith("post_"):
+        transaction.on_commit(refresh_effective_prices.delay)
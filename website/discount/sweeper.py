@@ -0,0 +1,75 @@
+"""
+Переключение действующих скидок на границах периодов действия.
+
+Действует ли скидка сегодня, хранится в поле Discount.is_current, поэтому запросы
+к скидкам не проверяют даты. Поле вычисляется при сохранении скидки, а когда наступает
+день начала скидки или день после её окончания, sweep переключает его у изменившихся
+скидок. После этого сбрасываются кэши, зависящие от скидок (теги "discount:<id>" и "discount:*"),
+и пересчитываются цены со скидкой только тех товаров, у которых наступил день смены скидки.
+Кэши, зависящие от цен со скидкой (тег "price:*"), сбрасываются уже после пересчёта, чтобы
+запрос между сбросом и пересчётом не сохранил в кэш старые цены.
+Если ни одна скидка не изменилась, кэши не сбрасываются.
+
+Периоды скидок задаются датами, а «сегодня» — timezone.now().date(), поэтому граница —
+полночь UTC дня начала или дня после окончания скидки (boundary_moment).
+"""
+
+import datetime
+
+from core.cache import invalidate_tags
+from django.db.models import Min
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Discount
+from .models import EffectivePrice
+
+
+def current_discount_ids(day: datetime.date) -> set[int]:
+    """id скидок, которые действуют в день day"""
+    return set(
+        Discount.objects.filter(is_active=True, archived=False, start_date__lte=day, end_date__gte=day).values_list(
+            "pk", flat=True
+        )
+    )
+
+
+def next_boundary(day: datetime.date) -> datetime.date | None:
+    """Ближайший после day день, в который какая-нибудь скидка начнёт или перестанет действовать"""
+
+    boundaries = Discount.objects.filter(is_active=True, archived=False).aggregate(
+        start=Min("start_date", filter=Q(start_date__gt=day)),
+        end=Min("end_date", filter=Q(start_date__lte=day, end_date__gte=day)),
+    )
+    if boundaries["end"] is not None:
+        boundaries["end"] += datetime.timedelta(days=1)
+    return min((boundary for boundary in boundaries.values() if boundary is not None), default=None)
+
+
+def boundary_moment(day: datetime.date) -> datetime.datetime:
+    """Момент, с которого timezone.now().date() возвращает day"""
+    return datetime.datetime.combine(day, datetime.time.min, tzinfo=datetime.timezone.utc)
+
+
+def sweep(day: datetime.date | None = None) -> set[int]:
+    """
+    Приводит Discount.is_current в соответствие с днём day (по умолчанию сегодня).
+    Возвращает id скидок, которые начали или перестали действовать.
+    """
+
+    day = day or timezone.now().date()
+    current = current_discount_ids(day)
+    flagged = set(Discount.objects.filter(is_current=True).values_list("pk", flat=True))
+    started = current - flagged
+    ended = flagged - current
+    if started:
+        Discount.objects.filter(pk__in=started).update(is_current=True)
+    if ended:
+        Discount.objects.filter(pk__in=ended).update(is_current=False)
+
+    changed = started | ended
+    if changed:
+        invalidate_tags(*(f"discount:{pk}" for pk in changed))
+        EffectivePrice.refresh_expired()
+        invalidate_tags("price:*")
+    return changed
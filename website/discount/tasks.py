@@ -2,16 +2,24 @@ import os
 
 from datetime import datetime
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import EmailMultiAlternatives
 from django.db.models import QuerySet
 from django.template.loader import render_to_string
+from django.utils import timezone
 from django.utils.html import strip_tags
 from email.mime.image import MIMEImage
 
 from catalog.models import Product
+from core.cache import invalidate_tags
 from custom_auth.models import CustomUser
 from discount.models import Discount
+from discount.models import EffectivePrice
+from discount.sweeper import boundary_moment
+from discount.sweeper import next_boundary
+from discount.sweeper import sweep
 from website.celery import app
+from website.settings import DISCOUNT_SWEEP_KEY
 from website.settings import EMAIL_HOST_USER
 from website.settings import HTTP_PROTOCOL
 from website.settings import SERVER_DOMAIN
@@ -116,3 +124,42 @@ def attach_images(email, products: set[Product], cid: str = "image"):
 
         except Exception as error:
             print(f"Произошла ошибка | Error: {error}")
+
+
+@app.task
+def refresh_effective_prices() -> int:
+    """
+    Пересчитывает цены со скидкой всех товаров после изменения скидок.
+
+    Возвращает:
+        int: количество пересчитанных цен
+    """
+    refreshed = EffectivePrice.rebuild()
+    invalidate_tags("price:*")
+    return refreshed
+
+
+@app.task
+def sweep_discounts() -> list[int]:
+    """
+    Переключает действующие скидки на границе периода их действия и планирует следующий запуск.
+    Кроме запусков на границах, выполняется раз в час (CELERY_BEAT_SCHEDULE) на случай потери задачи.
+
+    Возвращает:
+        list[int]: id скидок, которые начали или перестали действовать
+    """
+    changed = sweep()
+    schedule_next_sweep()
+    return sorted(changed)
+
+
+def schedule_next_sweep() -> None:
+    """Планирует запуск sweep_discounts на ближайшую границу периода действия скидок"""
+
+    boundary = next_boundary(timezone.now().date())
+    if boundary is None:
+        return
+    moment = boundary_moment(boundary)
+    timeout = max(int((moment - timezone.now()).total_seconds()), 0) + 60 * 60
+    if cache.add(DISCOUNT_SWEEP_KEY.format(day=boundary.isoformat()), True, timeout=timeout):
+        sweep_discounts.apply_async(eta=moment)
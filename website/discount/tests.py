@@ -1,3 +1,247 @@
+import io
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from catalog.models import Price
+from catalog.models import Product
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import Context
+from django.template import Template
 from django.test import TestCase
+from django.utils import timezone
+
+from . import rules
+from .models import Discount
+from .models import EffectivePrice
+from .models import ProductGroup
+from .sweeper import boundary_moment
+from .sweeper import next_boundary
+from .sweeper import sweep
+from .tasks import refresh_effective_prices
+from .tasks import schedule_next_sweep
+from .tasks import sweep_discounts
+
+
+class DiscountRulesTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        patcher = mock.patch.object(rules, "_rules", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.products = Product.objects.in_bulk()
+        self.category_discount = self.create_discount("category", Discount.PRODUCT, Discount.MIDDLE, percent=10)
+        self.category_discount.categories.add(self.products[1].category)
+        self.product_discount = self.create_discount("product", Discount.PRODUCT, Discount.HIGH, method=Discount.FIXED)
+        self.product_discount.products.add(self.products[7])
+
+    @staticmethod
+    def create_discount(name: str, kind: str, priority: int, method: str = Discount.PERCENT, **fields) -> Discount:
+        return Discount.objects.create(
+            name=name,
+            kind=kind,
+            method=method,
+            priority=priority,
+            price=Decimal("5.00"),
+            end_date=timezone.now().date() + timedelta(days=1),
+            **fields,
+        )
+
+    def make_cart(self, *product_ids: int) -> list[dict]:
+        return [{"product": self.products[pk], "price": Decimal("100.00")} for pk in product_ids]
+
+    def test_discounts_per_product(self):
+        self.assertEqual(Discount.get_priority_discount(self.products[1]), self.category_discount)
+        self.assertIsNone(Discount.get_priority_discount([self.products[1], self.products[7]]))
+
+        result = Discount.get_cart_discount(self.make_cart(1, 7))
+        self.assertEqual(result[0]["discounted_price"], Decimal("90.00"))
+        self.assertEqual(result[1]["discounted_price"], Decimal("5.00"))
+
+    def test_cart_is_priced_without_queries(self):
+        Discount.get_cart_discount(self.make_cart(1))
+        with self.assertNumQueries(0):
+            Discount.get_cart_discount(self.make_cart(1, 2, 7, 8))
+
+    def test_rules_are_reloaded_on_changes(self):
+        self.assertIsNone(Discount.get_priority_discount([self.products[1], self.products[7]]))
+        self.product_discount.products.add(self.products[1])
+        self.assertEqual(Discount.get_priority_discount([self.products[1], self.products[7]]), self.product_discount)
+
+        self.product_discount.is_active = False
+        self.product_discount.save()
+        self.assertIsNone(Discount.get_priority_discount(self.products[7]))
+
+    def test_set_and_cart_discounts(self):
+        group = ProductGroup.objects.create(name="group")
+        group.products.add(self.products[2], self.products[3])
+        set_discount = self.create_discount("set", Discount.SET, Discount.THE_HIGHEST, percent=50)
+        set_discount.product_groups.add(group)
+        cart_discount = self.create_discount(
+            "cart", Discount.CART, Discount.LOW, percent=20, quantity_l=3, quantity_g=5, total_cost_l=Decimal("250")
+        )
+
+        result = Discount.get_cart_discount(self.make_cart(2, 3))
+        self.assertEqual([elem["discounted_price"] for elem in result], [Decimal("50.00")] * 2)
+
+        result = Discount.get_cart_discount(self.make_cart(2, 1))
+        self.assertEqual([elem["discounted_price"] for elem in result], [Decimal("90.00")] * 2)
+
+        result = Discount.get_cart_discount(self.make_cart(8, 9, 10))
+        self.assertEqual([elem["discounted_price"] for elem in result], [Decimal("80.00")] * 3)
+        self.assertEqual(rules.get_discount_rules().cart_discount([self.products[8]] * 3, Decimal(300)), cart_discount)
+
+
+class EffectivePriceTestCase(TestCase):
+    fixtures = ["custom_auth-fixtures.json", "catalog-fixtures.json"]
+
+    def setUp(self):
+        patcher = mock.patch.object(rules, "_rules", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.today = timezone.now().date()
+        self.price = Price.objects.filter(product_id=1).first()
+
+    def create_discount(self, start_date, end_date) -> Discount:
+        discount = Discount.objects.create(
+            name=f"discount {start_date}",
+            kind=Discount.PRODUCT,
+            method=Discount.PERCENT,
+            percent=Decimal(25),
+            start_date=start_date,
+            end_date=end_date,
+        )
+        discount.products.add(self.price.product)
+        return discount
+
+    def test_rows_follow_discounts_and_prices(self):
+        discount = self.create_discount(self.today, self.today + timedelta(days=3))
+        upcoming = self.create_discount(self.today + timedelta(days=2), self.today + timedelta(days=9))
+        EffectivePrice.rebuild()
+
+        effective = EffectivePrice.objects.get(price=self.price)
+        self.assertEqual(effective.discount, discount)
+        self.assertEqual(effective.discounted_price, (self.price.price * Decimal("0.75")).quantize(Decimal("0.01")))
+        self.assertEqual(effective.valid_until, upcoming.start_date)
+
+        self.price.price = Decimal("200.00")
+        self.price.save()
+        effective.refresh_from_db()
+        self.assertEqual(effective.base_price, Decimal("200.00"))
+        self.assertEqual(effective.discounted_price, Decimal("150.00"))
+        cheapest = min(row.discounted_price for row in EffectivePrice.objects.filter(product_id=1))
+        self.assertEqual(EffectivePrice.for_products([1])[1].discounted_price, cheapest)
+
+    def test_bulk_discounts_in_single_query(self):
+        discount = self.create_discount(self.today, self.today + timedelta(days=3))
+        EffectivePrice.rebuild()
+
+        with self.assertNumQueries(1):
+            result = Discount.get_priority_discounts_bulk([1, 2, 3])
+            self.assertEqual(result[1]["discount"], discount)
+        self.assertTrue(result[1]["is_discounted"])
+        self.assertEqual(result[1]["discounted_price"], EffectivePrice.for_products([1])[1].discounted_price)
+        self.assertEqual(
+            result[1]["discounted_price"], (result[1]["price"] * Decimal("0.75")).quantize(Decimal("0.01"))
+        )
+        self.assertIsNone(result[2]["discount"])
+        self.assertEqual(result[2]["discounted_price"], result[2]["price"])
+
+    def test_discounted_price_without_effective_rows(self):
+        discount = self.create_discount(self.today, self.today + timedelta(days=3))
+        EffectivePrice.objects.all().delete()
+        max_price = max(price.price for price in Price.objects.filter(product=self.price.product))
+
+        result = Discount.get_discounted_price(self.price.product, discount)
+        self.assertEqual(result["price"], max_price)
+        self.assertEqual(result["discounted_price"], max_price * Decimal("0.75"))
+
+    def test_expired_rows_are_refreshed_by_sweep(self):
+        discount = self.create_discount(self.today - timedelta(days=5), self.today - timedelta(days=1))
+        Discount.objects.filter(pk=discount.pk).update(is_current=True)
+        EffectivePrice.rebuild()
+        EffectivePrice.objects.filter(price=self.price).update(discounted_price=Decimal("1.00"), valid_until=self.today)
+
+        self.assertEqual(sweep_discounts.run(), [discount.pk])
+        effective = EffectivePrice.objects.get(price=self.price)
+        self.assertIsNone(effective.discount)
+        self.assertEqual(effective.discounted_price, self.price.price)
+        self.assertIsNone(effective.valid_until)
+
+    def test_hot_offer_card_follows_refreshed_prices(self):
+        template = Template(
+            '{% load core_tags %}{% cachefragment "hot_offer_card" product.pk %}'
+            "{{ product.discounted_price }}{% endcachefragment %}"
+        )
+        product = self.price.product
+        product.discounted_price = self.price.price
+        self.assertEqual(template.render(Context({"product": product})), str(self.price.price))
+
+        product.discounted_price = Decimal("1.00")
+        refresh_effective_prices.run()
+        self.assertEqual(template.render(Context({"product": product})), "1.00")
+
+    def test_discount_changes_schedule_refresh(self):
+        cache.clear()
+        with (
+            mock.patch.object(refresh_effective_prices, "delay") as delay,
+            mock.patch.object(sweep_discounts, "apply_async") as apply_async,
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.create_discount(self.today, self.today + timedelta(days=1))
+        delay.assert_called()
+        apply_async.assert_called_once()
+
+
+class DiscountSweeperTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+        self.current = Discount.objects.create(
+            name="current", kind=Discount.PRODUCT, method=Discount.PERCENT, end_date=self.today + timedelta(days=2)
+        )
+        self.upcoming = Discount.objects.create(
+            name="upcoming",
+            kind=Discount.PRODUCT,
+            method=Discount.PERCENT,
+            start_date=self.today + timedelta(days=1),
+            end_date=self.today + timedelta(days=5),
+        )
+
+    def test_flag_is_set_on_save(self):
+        self.assertTrue(self.current.is_current)
+        self.assertFalse(self.upcoming.is_current)
+        self.assertEqual(list(Discount.objects.filter(is_current=True)), [self.current])
+
+    def test_sweep_flips_only_changed_discounts(self):
+        Discount.objects.filter(pk=self.current.pk).update(is_current=False)
+        Discount.objects.filter(pk=self.upcoming.pk).update(is_current=True)
+        with (
+            mock.patch("discount.sweeper.invalidate_tags") as invalidate_tags,
+            mock.patch.object(EffectivePrice, "refresh_expired", side_effect=lambda: invalidate_tags("refreshed")),
+        ):
+            self.assertEqual(sweep(), {self.current.pk, self.upcoming.pk})
+            self.assertEqual(invalidate_tags.call_count, 3)
+            self.assertEqual(invalidate_tags.call_args_list[1:], [mock.call("refreshed"), mock.call("price:*")])
+            invalidate_tags.reset_mock()
+
+            self.assertEqual(sweep(), set())
+            invalidate_tags.assert_not_called()
+        self.assertEqual(list(Discount.objects.filter(is_current=True)), [self.current])
+
+    def test_command_marks_existing_discounts(self):
+        Discount.objects.update(is_current=False)
+        call_command("sweep_discounts", stdout=io.StringIO())
+        self.assertEqual(list(Discount.objects.filter(is_current=True)), [self.current])
+
+    def test_next_sweep_is_scheduled_once_at_boundary(self):
+        self.assertEqual(next_boundary(self.today), self.upcoming.start_date)
+        self.assertEqual(next_boundary(self.upcoming.start_date), self.current.end_date + timedelta(days=1))
 
-# Create your tests here.
+        with mock.patch.object(sweep_discounts, "apply_async") as apply_async:
+            schedule_next_sweep()
+            schedule_next_sweep()
+        apply_async.assert_called_once_with(eta=boundary_moment(self.upcoming.start_date))
+        self.assertEqual(boundary_moment(self.today).date(), timezone.now().date())
@@ -3,12 +3,10 @@ import logging
 from cart.cart import Cart
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.db import transaction
-from django.db.models import Q
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render
 from django.urls import reverse_lazy
-from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import CreateView
 from django.views.generic import DetailView
@@ -213,9 +211,7 @@ logger = logging.getLogger(__name__)
 class ActiveDiscountsView(ListView):
     """
     Представление для  получения и отображения списка активных скидок.
-    Активные скидки определяются как те, которые имеют значение active=True
-    и находятся в пределах заданного временного интервала (между start_date и
-    end_date, если они указаны)
+    Активные скидки — те, которые действуют сегодня (Discount.is_current)
     """
 
     model = Discount
@@ -223,17 +219,9 @@ class ActiveDiscountsView(ListView):
     context_object_name = "discounts"
 
     def get_queryset(self):
-        """Получает QuerySet активных скидок.
-        Метод фильтрует скидки по следующим критериям:
-        - Скидка должна быть активной (active=True).
-        - Дата начала скидки должна быть либо не указана, либо меньше или равна текущей дате.
-        - Дата окончания скидки должна быть либо не указана, либо больше или равна текущей дате."""
+        """Получает QuerySet скидок, которые действуют сегодня"""
         try:
-            return (
-                Discount.objects.filter(active=True)
-                .filter(Q(start_date__isnull=True) | Q(start_date__lte=timezone.now()))
-                .filter(Q(end_date__isnull=True) | Q(end_date__gte=timezone.now()))
-            )
+            return Discount.objects.filter(is_current=True)
         except Exception as e:
             logger.error("Ошибка при получении скидок: %s", e, exc_info=True)
             return Discount.objects.none()
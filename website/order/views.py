@@ -1,7 +1,7 @@
 from typing import Any
 
 from cart.cart import Cart
-from django.core.cache import cache
+from core.cache import ORDER
 from django.core.exceptions import PermissionDenied
 from django.db.models import Count
 from django.db.models import Prefetch
@@ -19,8 +19,6 @@ from django.views.generic import DetailView
 from order import utils
 from order.forms import OrderForm
 
-from website.settings import ORDERS_KEY
-
 from .models import Order
 from .models import OrderItem
 from .utils import create_errors_list
@@ -147,7 +145,7 @@ class OrderDetailView(DetailView):
             нужные поля и избегая ненужных запросов к базе данных.
         """
         pk = self.kwargs["pk"]
-        order = cache.get(f"{ORDERS_KEY}{pk}")
+        order = ORDER.get(pk=pk)
         if order is None:
             order = get_object_or_404(
                 Order.objects.select_related(
@@ -197,7 +195,7 @@ class OrderDetailView(DetailView):
                 ),
                 pk=pk,
             )
-            cache.set(f"{ORDERS_KEY}{pk}", order, timeout=300)
+            ORDER.set(order, pk=pk)
         if order.user.pk == self.request.user.pk or self.request.user.is_staff:
             return order
         else:
@@ -2,7 +2,7 @@ from datetime import datetime
 from decimal import Decimal
 
 import stripe
-from django.core.cache import cache
+from core.cache import invalidate_tags
 from django.db import transaction
 from django.db.models import Prefetch
 from django.http import HttpRequest
@@ -12,8 +12,6 @@ from order.models import Order
 from order.models import OrderItem
 from stripe.checkout import Session
 
-from website.settings import ORDERS_KEY
-
 """
 Функции для работы с оплатой заказов через Stripe.
 
@@ -222,7 +220,7 @@ def change_order_payment_status(session: Session) -> None:
             order.status = Order.PROCESSING
             order.save()
             order.order_items.update(payment_status=True, receipt_url=current_receipt_url)
-            cache.delete(f"{ORDERS_KEY}{order_id}")
+            invalidate_tags(f"order:{order_id}")
 
 
 def change_certain_items_payment_status(session: Session) -> None:
@@ -276,7 +274,7 @@ def change_certain_items_payment_status(session: Session) -> None:
             order.paid_status = Order.PAID if current_payment_status else Order.PARTLY_PAID
             order.status = Order.PROCESSING
             order.save()
-            cache.delete(f"{ORDERS_KEY}{order_id}")
+            invalidate_tags(f"order:{order_id}")
 
 
 def create_recipes_url_for_db(session: Session) -> str:
@@ -1,5 +1,6 @@
 import bleach
 from catalog.models import Review
+from core.pagination import SignedCursorPagination
 from drf_spectacular.utils import extend_schema
 from rest_framework import status
 from rest_framework.exceptions import PermissionDenied
@@ -22,10 +23,12 @@ class ReviewListSet(ListAPIView):
     Атрибуты:
         serializer_class (Serializer): Сериализатор для представления отзывов.
         permission_classes (tuple): Классы разрешений, определяющие доступ.
+        pagination_class (Pagination): Постраничная пагинация с режимом курсора (?cursor=).
     """
 
     serializer_class = serializers.ReviewListSerializer
     permission_classes = (AllowAny,)
+    pagination_class = SignedCursorPagination
 
     def get_queryset(self):
         """
@@ -10,7 +10,7 @@ app = Celery("website")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
-app.conf.beat_schedule = {
+app.conf.beat_schedule.update({
     "send_three_random_discount_category_friday": {
         "task": "discount.tasks.send_three_random_discount_category_friday",
         "schedule": crontab(minute="0", hour="14", day_of_week="5"),
@@ -23,4 +23,4 @@ app.conf.beat_schedule = {
         "task": "custom_auth.tasks.send_user_happy_birthday",
         "schedule": crontab(minute="0", hour="0"),
     }
-}
+})
@@ -126,6 +126,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.locale.LocaleMiddleware",
+    "core.middleware.AnonymousPageCacheMiddleware",
 ]
 
 ROOT_URLCONF = "website.urls"
@@ -183,6 +184,61 @@ else:
         }
     }
 
+# Корзина: строки в хэше Redis (атомарные изменения строк), без Redis — в сессии
+CART_STORAGE_BACKEND = (
+    "cart.storage.RedisCartStorage"
+    if USE_REDIS
+    else "cart.storage.SessionCartStorage"
+)
+
+# Поиск товаров: на PostgreSQL — tsvector/GIN с триграммами, иначе — индекс в памяти процесса
+SEARCH_BACKEND = (
+    "catalog.search.backends.PostgresSearchBackend"
+    if USE_POSTGRES
+    else "catalog.search.backends.InMemorySearchBackend"
+)
+SEARCH_TEXT_CONFIG = "simple"
+SEARCH_INDEX_VERSION_KEY = "search_index_version"
+SUGGEST_INDEX_KEY = "suggest_index"
+SUGGEST_INDEX_VERSION_KEY = "suggest_index_version"
+
+if USE_POSTGRES:
+    INSTALLED_APPS.append("django.contrib.postgres")
+
+# Счётчик просмотров товаров: буфер в Redis или в памяти процесса, сбрасывается в Product.views
+VIEW_COUNTER_BACKEND = (
+    "catalog.counters.RedisViewCounter"
+    if USE_REDIS
+    else "catalog.counters.LocalViewCounter"
+)
+VIEW_COUNTER_KEY = "product_views"
+
+# История просмотров: очередь отложенной записи в Viewed и последние просмотры пользователя в кэше
+VIEWED_QUEUE_BACKEND = (
+    "catalog.history.RedisViewedQueue"
+    if USE_REDIS
+    else "catalog.history.LocalViewedQueue"
+)
+VIEWED_QUEUE_KEY = "viewed_queue"
+VIEWED_RECENT_KEY = "viewed_{user_id}"
+VIEWED_RECENT_LIMIT = 20
+VIEWED_RECENT_TIMEOUT = 60 * 60 * 24
+# Отметка об удалении товара из истории: отложенная запись отбрасывает более ранние просмотры.
+# Должна жить дольше интервала записи очереди (задача flush_viewed_history)
+VIEWED_REMOVED_KEY = "viewed_removed_{user_id}_{product_id}"
+VIEWED_REMOVED_TIMEOUT = 60 * 60
+# Блокировка записи очереди: одновременно очередь записывает только один процесс
+VIEWED_FLUSH_LOCK_KEY = "viewed_queue_flush_lock"
+VIEWED_FLUSH_LOCK_TIMEOUT = 60
+
+# Пулы id для случайной выборки товаров (горячие предложения, предложение дня, рассылка скидок)
+PRODUCT_POOL_BACKEND = (
+    "core.product_pool.RedisProductPool"
+    if USE_REDIS
+    else "core.product_pool.LocalProductPool"
+)
+PRODUCT_POOL_KEY = "product_pool_{name}"
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -255,11 +311,14 @@ EMAIL_HOST_USER = str(os.getenv("EMAIL_USER"))
 EMAIL_HOST_PASSWORD = str(os.getenv("EMAIL_PASSWORD"))
 
 # Session settings
-SESSION_ENGINE = "django.contrib.sessions.backends.db"
+# Сессии читаются из кэша, в базу пишутся только при изменении
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
 # Время жизни сессии (2 недели)
 SESSION_COOKIE_AGE = 1209600
-# Обновляем таймер каждый заход пользователя на сайт
-SESSION_SAVE_EVERY_REQUEST = True
+# Сессии анонимных посетителей сохраняются при изменении (корзина, сравнение, просмотры), а не на каждом
+# запросе, чтобы страницы из кэша не записывали сессию в базу. Сессии авторизованных пользователей
+# сохраняются на каждом запросе (core.middleware.AnonymousPageCacheMiddleware)
+SESSION_SAVE_EVERY_REQUEST = False
 
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -297,13 +356,36 @@ BANNERS_KEY = "banners"
 user_comparison_key = "user_comparison_"
 anonymous_comparison_key = "anonymous_user_comparison_"
 CART_SESSION_ID = "cart"
+CART_ID_SESSION_KEY = "cart_id"
+CART_KEY = "cart_{owner}"
+CART_TIMEOUT = 60 * 60 * 24 * 30
 VIEWED_SESSION_ID = "viewed"
 CATEGORY_CASHING_TIME = 60 * 60 * 24
 CATEGORY_KEY = "categories"
-PRODUCTS_KEY = "category_{category_id}"
+CATEGORY_MENU_KEY = "category_menu"
+PRODUCTS_KEY = "category_{category_id}_{signature}"
+CATALOG_FILTER_CASHING_TIME = 60 * 10
+FACETS_KEY = "facets_{category_id}"
 OFFER_KEY = "offers"
 HOT_OFFER_KEY = "hot_offer"
+TOP_PRODUCTS_KEY = "top_products"
+TOP_PRODUCTS_SIZE = 8
 ORDERS_KEY = "Order-"
+PRODUCT_KEY = "Product_{pk}"
+OFFER_TABLE_KEY = "Offers_{pk}"
+CACHE_TAG_KEY = "tag_{tag}"
+CACHE_LOCK_KEY = "lock_{key}"
+
+# Кэш фрагментов шаблонов ({% cachefragment %}), актуальность определяется версиями тегов
+FRAGMENT_KEY = "fragment_{name}_{language}_{pk}"
+FRAGMENT_CACHING_TIME = 60 * 60
+
+# Кэш страниц для анонимных посетителей (core.middleware.AnonymousPageCacheMiddleware)
+PAGE_KEY = "page_{name}_{language}_{url}"
+PAGE_CACHING_TIME = 60 * 5
+
+# Планировщик скидок (discount.sweeper): отметка о том, что запуск на границе периода скидок уже запланирован
+DISCOUNT_SWEEP_KEY = "discount_sweep_{day}"
 
 # Stripe variables
 SECRET_KEY_STRIPE = os.getenv("STRIPE_SECRET_KEY", None)
@@ -318,5 +400,24 @@ CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 
 CELERY_BEAT_SCHEDULE = {
-
+    "warm_cache": {
+        "task": "core.tasks.warm_cache",
+        "schedule": 60 * 15,
+    },
+    "flush_product_views": {
+        "task": "catalog.tasks.flush_product_views",
+        "schedule": 60,
+    },
+    "flush_viewed_history": {
+        "task": "catalog.tasks.flush_viewed_history",
+        "schedule": 30,
+    },
+    "sweep_discounts": {
+        "task": "discount.tasks.sweep_discounts",
+        "schedule": 60 * 60,
+    },
 }
+
+# Прогрев кэша: записи, которым осталось жить меньше CACHE_WARM_AHEAD секунд, пересчитываются заранее
+CACHE_WARM_AHEAD = 60 * 60
+CACHE_WARM_TOP_CATEGORIES = 10
@@ -45,6 +45,7 @@ urlpatterns = i18n_patterns(
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/swagger/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     path("api/v1/", include("review.urls")),
+    path("api/search/", include("catalog.search.urls")),
     # path('sentry-debug/', trigger_error),
 ) + debug_toolbar_urls()
 